@@ -1,25 +1,221 @@
 import argparse
+import glob
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 from PIL import Image
 from io_scene_lithtech.dtx import DTX
 
-parser = argparse.ArgumentParser(
-    prog='ConvertTex',
-    description='Converts DTX files to whatever pillow supports')
+# Remembers the size and mtime of each converted DTX, so unchanged files are skipped next run.
+# It lives with the images: in the output directory, or next to the images when they're written beside each DTX.
+STATE_FILE = '.convert_tex.json'
 
-parser.add_argument('dtx_file')
-parser.add_argument('img_file', default=None)
+# Seconds between state saves while converting
+STATE_SAVE_INTERVAL = 1.0
 
-args = parser.parse_args()
 
-if not args.img_file:
-    args.img_file = f'{args.dtx_file.rsplit('.')[0]}.png'
+def find_dtx_files(inputs: list[str]) -> list[str]:
+    files = []
+    for path in inputs:
+        if os.path.isdir(path):
+            for root, _dirs, filenames in os.walk(path):
+                files += [os.path.join(root, filename) for filename in filenames if filename.lower().endswith('.dtx')]
+        elif glob.has_magic(path):
+            files += glob.glob(path, recursive=True)
+        else:
+            files.append(path)
 
-def convert(dtx_file: str, img_file: str):
-    print(f'Reading {dtx_file}')
-    print('Decoding DTX...')
+    # Keep the order stable, and drop any repeats
+    return sorted(set(os.path.abspath(file) for file in files))
+
+
+def output_path(dtx_file: str, input_root: str | None, output_dir: str | None, img_format: str) -> str:
+    img_file = f'{os.path.splitext(dtx_file)[0]}.{img_format}'
+    if output_dir is None:
+        return img_file
+
+    # Mirror the folder structure under the output directory
+    relative = os.path.relpath(img_file, input_root) if input_root else os.path.basename(img_file)
+    return os.path.join(output_dir, relative)
+
+
+def source_stamp(dtx_file: str) -> list[int]:
+    stat = os.stat(dtx_file)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def load_state(path: str) -> dict:
+    try:
+        with open(path, 'r') as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(path: str, state: dict):
+    # Write to a temporary file first, so an interrupted save never loses the old state
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(temp_path, 'w') as fh:
+        json.dump(state, fh, indent=1)
+    os.replace(temp_path, path)
+
+
+def state_path_for(img_file: str, output_dir: str | None) -> str:
+    return os.path.join(output_dir or os.path.dirname(img_file), STATE_FILE)
+
+
+def convert(dtx_file: str, img_file: str, img_format: str):
+    start = time.perf_counter()
     dtx_obj = DTX(dtx_file)
-    img_obj: Image = Image.frombytes('RGBA', (dtx_obj.width, dtx_obj.height), dtx_obj.pixels)
-    img_obj.save(img_file, 'png')
+    pixels = dtx_obj.pixels
+    decoded = time.perf_counter()
+
+    img_obj: Image = Image.frombytes('RGBA', (dtx_obj.width, dtx_obj.height), pixels)
+    os.makedirs(os.path.dirname(img_file) or '.', exist_ok=True)
+    img_obj.save(img_file, img_format)
+    encoded = time.perf_counter()
+
+    return decoded - start, encoded - decoded
+
+
+def convert_all(jobs: list[tuple[str, str]], img_format: str, workers: int | None, on_result):
+    '''
+    Converts jobs across a process pool, calling on_result(dtx_file, img_file, times, error) as each one finishes.
+    A crashed worker breaks the whole pool and fails every unfinished job with it,
+    so those are retried one process per file to find the one that actually crashed.
+    '''
+    retry = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(convert, dtx_file, img_file, img_format): (dtx_file, img_file) for dtx_file, img_file in jobs}
+        for future in as_completed(futures):
+            dtx_file, img_file = futures[future]
+            try:
+                times = future.result()
+            except BrokenProcessPool:
+                retry.append((dtx_file, img_file))
+                continue
+            except Exception as e:
+                on_result(dtx_file, img_file, None, e)
+                continue
+            on_result(dtx_file, img_file, times, None)
+    # End With
+
+    if len(retry) > 0:
+        print(f'A worker crashed, retrying {len(retry)} files one at a time')
+
+    for dtx_file, img_file in sorted(retry):
+        try:
+            with ProcessPoolExecutor(max_workers=1) as pool:
+                times = pool.submit(convert, dtx_file, img_file, img_format).result()
+        except BrokenProcessPool:
+            on_result(dtx_file, img_file, None, Exception('worker process crashed'))
+            continue
+        except Exception as e:
+            on_result(dtx_file, img_file, None, e)
+            continue
+        on_result(dtx_file, img_file, times, None)
+    # End For
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog='ConvertTex',
+        description='Converts DTX files to whatever pillow supports')
+
+    parser.add_argument('inputs', nargs='+', help='DTX files, folders or globs (a single DTX can be followed by the image file to write)')
+    parser.add_argument('-o', '--output-dir', default=None, help='Where to write images (default: next to each DTX)')
+    parser.add_argument('-f', '--format', default='png', help='Image format/extension (default: png)')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='Worker processes (default: cpu count)')
+    parser.add_argument('--force', action='store_true', help='Convert even if the DTX is unchanged since the last run')
+
+    args = parser.parse_args()
+
+    # Old usage: convert_tex.py file.dtx file.png
+    explicit_output = None
+    if len(args.inputs) == 2 and args.inputs[0].lower().endswith('.dtx') and not args.inputs[1].lower().endswith('.dtx') \
+            and not os.path.isdir(args.inputs[1]):
+        explicit_output = args.inputs.pop()
+
+    dtx_files = find_dtx_files(args.inputs)
+    if len(dtx_files) == 0:
+        print('No DTX files found')
+        return
+
+    input_root = None
+    if args.output_dir is not None:
+        input_root = os.path.commonpath([os.path.dirname(file) for file in dtx_files])
+
+    # State file path -> state, loaded as needed
+    states = {}
+
+    def state_for(img_file):
+        state_path = state_path_for(img_file, args.output_dir)
+        if state_path not in states:
+            states[state_path] = load_state(state_path)
+        return state_path, states[state_path]
+
+    jobs = []
+    skipped = 0
+    for dtx_file in dtx_files:
+        img_file = explicit_output or output_path(dtx_file, input_root, args.output_dir, args.format)
+        _, state = state_for(img_file)
+        stamp = state.get(dtx_file)
+        if not args.force and stamp is not None and stamp['source'] == source_stamp(dtx_file) and stamp['output'] == img_file \
+                and os.path.exists(img_file):
+            skipped += 1
+            continue
+        jobs.append((dtx_file, img_file))
+    # End For
+
+    print(f'Converting {len(jobs)} files ({skipped} unchanged, skipped)')
+
+    start = time.perf_counter()
+    failed = 0
+    decode_total = 0.0
+    encode_total = 0.0
+
+    # Saved as files finish, so an interrupted run only redoes what was in flight
+    dirty = set()
+    last_save = time.perf_counter()
+
+    def save_states():
+        nonlocal last_save
+        for state_path in dirty:
+            save_state(state_path, states[state_path])
+        dirty.clear()
+        last_save = time.perf_counter()
+
+    def on_result(dtx_file, img_file, times, error):
+        nonlocal failed, decode_total, encode_total
+        if error is not None:
+            failed += 1
+            print(f'FAILED {dtx_file}: {error}')
+            return
+
+        decode_time, encode_time = times
+        decode_total += decode_time
+        encode_total += encode_time
+
+        state_path, state = state_for(img_file)
+        state[dtx_file] = {'source': source_stamp(dtx_file), 'output': img_file}
+        dirty.add(state_path)
+        if time.perf_counter() - last_save >= STATE_SAVE_INTERVAL:
+            save_states()
+
+        print(f'{decode_time * 1000:8.1f}ms decode {encode_time * 1000:8.1f}ms encode  {dtx_file} -> {img_file}')
+
+    try:
+        convert_all(jobs, args.format, args.workers, on_result)
+    finally:
+        save_states()
+
+    converted = len(jobs) - failed
+    print(f'Converted {converted}, skipped {skipped}, failed {failed} in {time.perf_counter() - start:.2f}s '
+          f'(decode {decode_total:.2f}s, encode {encode_total:.2f}s across workers)')
 
 
-convert(args.dtx_file, args.img_file)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
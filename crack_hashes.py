@@ -0,0 +1,198 @@
+import argparse
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from io_scene_lithtech.hash_ps2 import HashLookUp, HASH_LOOKUP, HASH_MASK
+
+'''
+Dictionary attack for hashed PS2 LTB names (animations and sockets)
+
+Candidates are built from base words (wordlists, names harvested from PC ABC/LTB files of the same game, and the
+datamined HASH_LOOKUP names), plus every prefix and numbered suffix combination of them (Idle_0..N, Fire1..N, ...)
+Found names are written out as a wordlist that PS2LTBModelReader can load through `hash_wordlists`.
+'''
+
+# Candidate words per job sent to the pool
+CHUNK_SIZE = 2000
+
+# Set up per worker process by `_init_worker`
+_hasher = None
+_targets = None
+_prefixes = None
+_max_number = None
+
+
+def parse_hash(value: str) -> int:
+    return int(value, 0) & HASH_MASK
+
+
+def read_wordlist(path: str) -> list[str]:
+    words = []
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        for line in f:
+            line = line.strip()
+            if line == '' or line.startswith('#') or line.startswith('['):
+                continue
+            words.append(line)
+    return words
+
+
+def harvest_model_names(path: str) -> list[str]:
+    # Imported here so wordlist-only runs don't need the model readers
+    from io_scene_lithtech.reader_abc_pc import ABCModelReader
+    from io_scene_lithtech.reader_abc_v6_pc import ABCV6ModelReader
+    from io_scene_lithtech.reader_ltb_pc import PCLTBModelReader
+
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.ltb':
+        readers = [PCLTBModelReader]
+    elif extension == '.abc':
+        readers = [ABCModelReader, ABCV6ModelReader]
+    else:
+        return []
+
+    model = None
+    for reader in readers:
+        try:
+            model = reader().from_file(path)
+            break
+        except Exception:
+            continue
+
+    if model is None:
+        print(f'Could not read {path}, skipping')
+        return []
+
+    names = []
+    names += [node.name for node in model.nodes]
+    names += [animation.name for animation in model.animations]
+    names += [socket.name for socket in model.sockets]
+    names += [piece.name for piece in model.pieces]
+    names += [child_model.name for child_model in model.child_models]
+    return names
+
+
+def model_files(paths: list[str]) -> list[str]:
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _dirs, filenames in os.walk(path):
+                files += [os.path.join(root, filename) for filename in filenames if filename.lower().endswith(('.abc', '.ltb'))]
+        else:
+            files.append(path)
+    return files
+
+
+def base_words(words: list[str]) -> list[str]:
+    # Strip any trailing numbering (Idle_1, Fire2), since the suffixes put it back on
+    # Hashes are case insensitive, so only keep the first spelling of each word
+    seen = set()
+    bases = []
+    for word in words:
+        for base in (word, re.sub(r'_?\d+$', '', word)):
+            if base == '' or base.upper() in seen:
+                continue
+            seen.add(base.upper())
+            bases.append(base)
+    return bases
+
+
+def _init_worker(magic_number, targets, prefixes, max_number):
+    global _hasher, _targets, _prefixes, _max_number
+    _hasher = HashLookUp(magic_number)
+    _targets = targets
+    _prefixes = prefixes
+    _max_number = max_number
+
+
+def _candidates(word):
+    suffixes = [''] + [f'{number}' for number in range(_max_number + 1)] + [f'_{number}' for number in range(_max_number + 1)]
+    for prefix in _prefixes:
+        for suffix in suffixes:
+            yield f'{prefix}{word}{suffix}'
+
+
+def _search_chunk(words):
+    found = []
+    for word in words:
+        for candidate in _candidates(word):
+            hash_value = _hasher.hash(candidate) & HASH_MASK
+            if hash_value in _targets:
+                found.append((hash_value, candidate))
+    return found
+
+
+def search(magic_number: int, targets: set[int], words: list[str], prefixes: list[str], max_number: int, workers: int) -> dict[int, list[str]]:
+    results = {}
+    chunks = [words[i:i + CHUNK_SIZE] for i in range(0, len(words), CHUNK_SIZE)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(magic_number, targets, prefixes, max_number)) as pool:
+        for found in pool.map(_search_chunk, chunks):
+            for hash_value, name in found:
+                results.setdefault(hash_value, [])
+                if name not in results[hash_value]:
+                    results[hash_value].append(name)
+    return results
+
+
+def write_results(path: str, category: str, magic_number: int, results: dict[int, list[str]]):
+    # Appending lets multiple runs (and categories) build up the same lookup file
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(f'# Magic number {magic_number}\n')
+        f.write(f'[{category}]\n')
+        for hash_value in sorted(results):
+            f.write(f'# 0x{hash_value:08X}\n')
+            for name in results[hash_value]:
+                f.write(f'{name}\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog='CrackHashes',
+        description='Searches for the names behind hashed PS2 LTB animation and socket names')
+
+    parser.add_argument('hashes', nargs='+', type=parse_hash, help='Unresolved hashes (decimal or 0x hex)')
+    parser.add_argument('-m', '--magic', type=lambda value: int(value, 0), required=True, help='Hash magic number from the PS2 LTB piece header')
+    parser.add_argument('-c', '--category', default='animations', choices=list(HASH_LOOKUP.keys()))
+    parser.add_argument('-w', '--wordlist', action='append', default=[], help='Wordlist, one name per line (repeatable)')
+    parser.add_argument('-i', '--models', action='append', default=[], help='PC ABC/LTB file or folder to harvest names from (repeatable)')
+    parser.add_argument('-p', '--prefix', action='append', default=None, help='Prefixes to try (repeatable, default: none and Alt)')
+    parser.add_argument('-n', '--max-number', type=int, default=20, help='Try numbered suffixes from 0 to N (default: 20)')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='Worker processes (default: cpu count)')
+    parser.add_argument('-o', '--output', default='hash_lookup.txt', help='Lookup file the found names are appended to')
+
+    args = parser.parse_args()
+
+    prefixes = args.prefix if args.prefix is not None else ['', 'Alt']
+    targets = set(args.hashes)
+
+    words = []
+    for category_words in HASH_LOOKUP.values():
+        words += category_words
+    for path in args.wordlist:
+        words += read_wordlist(path)
+    for path in model_files(args.models):
+        words += harvest_model_names(path)
+
+    words = base_words(words)
+
+    candidate_count = len(words) * len(prefixes) * (1 + 2 * (args.max_number + 1))
+    print(f'Searching {len(targets)} hashes with {candidate_count} candidates...')
+
+    start = time.perf_counter()
+    results = search(args.magic, targets, words, prefixes, args.max_number, args.workers)
+    print(f'Finished in {time.perf_counter() - start:.2f}s')
+
+    for hash_value in sorted(targets):
+        names = results.get(hash_value)
+        print(f'0x{hash_value:08X}: {", ".join(names) if names else "-"}')
+
+    if len(results) > 0:
+        write_results(args.output, args.category, args.magic, results)
+        print(f'Found {len(results)}/{len(targets)}, written to {args.output}')
+    else:
+        print('Nothing found')
+
+
+if __name__ == "__main__":
+    main()
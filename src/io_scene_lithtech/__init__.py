@@ -1,28 +1,56 @@
-import bpy
+# fake-bpy-module (a dependency, for editor completion) can be imported outside of Blender too,
+# so check for something only the real bpy has. binary_path is '' when Blender is built as a python module.
+def _in_blender():
+    try:
+        import bpy
+        import bpy.app
+        return getattr(bpy.app, 'binary_path', None) is not None
+    except Exception:
+        return False
+
+
+if _in_blender():
+    import bpy
+else:
+    # Outside of Blender only the readers, writers and tools can be used (see cli.py)
+    bpy = None
+
+from . import vector_math
 from . import hash_ps2
 from . import s3tc
 from . import dtx
+from . import arch02
 from . import abc
-from . import builder
+from . import cache
 from . import reader_abc_pc
 from . import reader_ltb_ps2
 from . import writer_abc_pc
 from . import writer_lta_pc
-from . import importer
-from . import exporter
-from . import converter
+from . import stubber
 
-if "bpy" in locals():
+if bpy is not None:
+    from . import builder
+    from . import importer
+    from . import exporter
+    from . import converter
+
+if bpy is not None and "bpy" in locals():
     import importlib
 
+    if "vector_math" in locals():
+        importlib.reload(vector_math)
     if "hash_ps2" in locals():
         importlib.reload(hash_ps2)
     if "s3tc" in locals():
         importlib.reload(s3tc)
     if "dxt" in locals():
         importlib.reload(dtx)
+    if "arch02" in locals():
+        importlib.reload(arch02)
     if "abc" in locals():
         importlib.reload(abc)
+    if "cache" in locals():
+        importlib.reload(cache)
     if "builder" in locals():
         importlib.reload(builder)
     if "reader_abc_pc" in locals():
@@ -33,6 +61,8 @@ if "bpy" in locals():
         importlib.reload(writer_abc_pc)
     if "writer_lta_pc" in locals():
         importlib.reload(writer_lta_pc)
+    if "stubber" in locals():
+        importlib.reload(stubber)
     if "importer" in locals():
         importlib.reload(importer)
     if "exporter" in locals():
@@ -40,16 +70,17 @@ if "bpy" in locals():
     if "converter" in locals():
         importlib.reload(converter)
 
-from bpy.utils import register_class, unregister_class
+if bpy is not None:
+    from bpy.utils import register_class, unregister_class
 
-classes = (
-    importer.ImportOperatorABC,
-    importer.ImportOperatorLTB,
-    exporter.ExportOperatorABC,
-    exporter.ExportOperatorLTA,
-    converter.ConvertPCLTBToLTA,
-    converter.ConvertPS2LTBToLTA,
-)
+    classes = (
+        importer.ImportOperatorABC,
+        importer.ImportOperatorLTB,
+        exporter.ExportOperatorABC,
+        exporter.ExportOperatorLTA,
+        converter.ConvertPCLTBToLTA,
+        converter.ConvertPS2LTBToLTA,
+    )
 
 
 def register():
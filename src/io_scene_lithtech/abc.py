@@ -1,4 +1,5 @@
-from mathutils import Vector, Quaternion, Matrix
+import numpy as np
+from .vector_math import Vector, Quaternion, Matrix
 
 '''
 REFERENCE LIST:
@@ -99,6 +100,159 @@ class LOD(object):
         return [self.vertices[vertex.vertex_index] for vertex in self.faces[face_index].vertices]
 
 
+'''
+Array backed LOD. The geometry is kept in flat numpy arrays straight from the file,
+and the Face/FaceVertex/Vertex/Weight objects are only built the first time something asks for
+`faces` or `vertices`. Once built, those lists are what's used; the arrays aren't kept in sync.
+'''
+class ArrayLOD(LOD):
+
+    @property
+    def faces(self):
+        if self._faces is None:
+            self._faces = self._build_faces()
+        return self._faces
+
+    @faces.setter
+    def faces(self, faces):
+        self._faces = faces
+
+    @property
+    def vertices(self):
+        if self._vertices is None:
+            self._vertices = self._build_vertices()
+        return self._vertices
+
+    @vertices.setter
+    def vertices(self, vertices):
+        self._vertices = vertices
+
+    def __init__(self):
+        super().__init__()
+        self._faces = None
+        self._vertices = None
+
+        # (face_count, 3)
+        self.face_vertex_indices = np.zeros((0, 3), dtype=np.uint16)
+        # (face_count, 3, 2)
+        self.face_texcoords = np.zeros((0, 3, 2), dtype=np.float32)
+
+        # (vertex_count, 3)
+        self.locations = np.zeros((0, 3), dtype=np.float32)
+        self.normals = np.zeros((0, 3), dtype=np.float32)
+        # (vertex_count,)
+        self.sublod_vertex_indices = np.zeros(0, dtype=np.uint16)
+
+        # Weights are flattened, vertex i owns weights[weight_offsets[i]:weight_offsets[i + 1]]
+        self.weight_offsets = np.zeros(1, dtype=np.int64)
+        self.weight_node_indices = np.zeros(0, dtype=np.uint32)
+        # (weight_count, 3)
+        self.weight_locations = np.zeros((0, 3), dtype=np.float32)
+        self.weight_biases = np.zeros(0, dtype=np.float32)
+
+        # LTB specific, these are left as None if the mesh doesn't have them
+        # (vertex_count,)
+        self.colours = None
+        # (vertex_count, 3)
+        self.basis_s = None
+        self.basis_t = None
+        # (face_count, 3, 3, 2) for UV sets 2-4
+        self.face_extra_texcoords = None
+
+    # Returns an ArrayLOD with the same geometry as `lod`.
+    # Array LODs that haven't built their objects yet are returned as-is, otherwise the arrays are filled from the objects.
+    @classmethod
+    def from_lod(cls, lod):
+        if isinstance(lod, ArrayLOD) and lod._faces is None and lod._vertices is None:
+            return lod
+
+        array_lod = cls()
+        for key, value in lod.__dict__.items():
+            if key not in ('faces', 'vertices', '_faces', '_vertices') and not isinstance(getattr(cls, key, None), property):
+                setattr(array_lod, key, value)
+
+        faces = lod.faces
+        vertices = lod.vertices
+
+        # uint16 like the LTB files, unless there's too many vertices for that
+        index_dtype = np.uint16 if len(vertices) <= 0x10000 else np.uint32
+
+        array_lod.face_vertex_indices = np.array([[face_vertex.vertex_index for face_vertex in face.vertices] for face in faces], dtype=index_dtype).reshape(-1, 3)
+        array_lod.face_texcoords = np.array([[face_vertex.texcoord.xy for face_vertex in face.vertices] for face in faces], dtype=np.float32).reshape(-1, 3, 2)
+
+        # Extra UV sets default to zero, so only keep them if they're used
+        extra_texcoords = np.array([[[texcoord.xy for texcoord in face_vertex.extra_texcoords] for face_vertex in face.vertices] for face in faces], dtype=np.float32).reshape(-1, 3, 3, 2)
+        array_lod.face_extra_texcoords = extra_texcoords if extra_texcoords.any() else None
+
+        array_lod.locations = np.array([vertex.location for vertex in vertices], dtype=np.float32).reshape(-1, 3)
+        array_lod.normals = np.array([vertex.normal for vertex in vertices], dtype=np.float32).reshape(-1, 3)
+        array_lod.sublod_vertex_indices = np.array([vertex.sublod_vertex_index for vertex in vertices], dtype=index_dtype)
+
+        weights = [weight for vertex in vertices for weight in vertex.weights]
+        array_lod.weight_offsets = np.concatenate(([0], np.cumsum([len(vertex.weights) for vertex in vertices], dtype=np.int64))).astype(np.int64)
+        array_lod.weight_node_indices = np.array([weight.node_index for weight in weights], dtype=np.uint32)
+        array_lod.weight_locations = np.array([weight.location for weight in weights], dtype=np.float32).reshape(-1, 3)
+        array_lod.weight_biases = np.array([weight.bias for weight in weights], dtype=np.float32)
+
+        colours = np.array([vertex.colour for vertex in vertices], dtype=np.int64)
+        array_lod.colours = colours if colours.any() else None
+
+        if len(vertices) > 0 and all(hasattr(vertex, 's') for vertex in vertices):
+            array_lod.basis_s = np.array([vertex.s for vertex in vertices], dtype=np.float32).reshape(-1, 3)
+            array_lod.basis_t = np.array([vertex.t for vertex in vertices], dtype=np.float32).reshape(-1, 3)
+
+        return array_lod
+
+    def _build_faces(self):
+        faces = []
+        for vertex_indices, texcoords in zip(self.face_vertex_indices.tolist(), self.face_texcoords.tolist()):
+            face = Face()
+            for vertex_index, texcoord in zip(vertex_indices, texcoords):
+                face_vertex = FaceVertex()
+                face_vertex.texcoord.xy = texcoord
+                face_vertex.vertex_index = vertex_index
+                face.vertices.append(face_vertex)
+            faces.append(face)
+
+        if self.face_extra_texcoords is not None:
+            for face, extra_texcoords in zip(faces, self.face_extra_texcoords.tolist()):
+                for face_vertex, texcoords in zip(face.vertices, extra_texcoords):
+                    for extra_texcoord, texcoord in zip(face_vertex.extra_texcoords, texcoords):
+                        extra_texcoord.xy = texcoord
+
+        return faces
+
+    def _build_vertices(self):
+        weights = []
+        for node_index, location, bias in zip(self.weight_node_indices.tolist(), self.weight_locations.tolist(), self.weight_biases.tolist()):
+            weight = Weight()
+            weight.node_index = node_index
+            weight.location = Vector(location)
+            weight.bias = bias
+            weights.append(weight)
+
+        vertices = []
+        offsets = self.weight_offsets.tolist()
+        for i, (location, normal, sublod_vertex_index) in enumerate(zip(self.locations.tolist(), self.normals.tolist(), self.sublod_vertex_indices.tolist())):
+            vertex = Vertex()
+            vertex.sublod_vertex_index = sublod_vertex_index
+            vertex.weights = weights[offsets[i]:offsets[i + 1]]
+            vertex.location = Vector(location)
+            vertex.normal = Vector(normal)
+            vertices.append(vertex)
+
+        if self.colours is not None:
+            for vertex, colour in zip(vertices, self.colours.tolist()):
+                vertex.colour = colour
+
+        if self.basis_s is not None:
+            for vertex, s, t in zip(vertices, self.basis_s.tolist(), self.basis_t.tolist()):
+                vertex.s = Vector(s)
+                vertex.t = Vector(t)
+
+        return vertices
+
+
 class Piece(object):
 
     @property
@@ -193,6 +347,26 @@ class Animation(object):
             self.time = 0
             self.string = ''
 
+    @property
+    def node_keyframe_transforms(self):
+        if self._node_keyframe_transforms is None:
+            self._node_keyframe_transforms = self._build_node_keyframe_transforms()
+        return self._node_keyframe_transforms
+
+    @node_keyframe_transforms.setter
+    def node_keyframe_transforms(self, node_keyframe_transforms):
+        self._node_keyframe_transforms = node_keyframe_transforms
+
+    @property
+    def node_keyframe_array(self):
+        return self._node_keyframe_array
+
+    @node_keyframe_array.setter
+    def node_keyframe_array(self, node_keyframe_array):
+        self._node_keyframe_array = node_keyframe_array
+        # The transform objects are built from the array the first time they're asked for
+        self._node_keyframe_transforms = None if node_keyframe_array is not None else []
+
     def __init__(self):
         self.extents = Vector()
         self.name = ''
@@ -215,6 +389,36 @@ class Animation(object):
         # LTB specific
         self.compression_type = 0
         self.is_vertex_animation = 0
+        # Compressed animations keep their decoded keys as a (node, keyframe, 7) array,
+        # location xyz followed by rotation wxyz
+        self._node_keyframe_array = None
+
+    def _build_node_keyframe_transforms(self):
+        node_transforms = []
+        for keyframes in self._node_keyframe_array.tolist():
+            transforms = []
+            for keyframe in keyframes:
+                transform = Animation.Keyframe.Transform()
+                transform.location = Vector(keyframe[0:3])
+                transform.rotation = Quaternion(keyframe[3:7])
+                transforms.append(transform)
+            node_transforms.append(transforms)
+        return node_transforms
+
+    # Returns the keys as a (node, keyframe, 7) array, location xyz followed by rotation wxyz.
+    # Once the transform objects are built they're what's used, so the array is rebuilt from them.
+    # Returns None if the nodes don't all have the same number of keyframes.
+    def get_node_keyframe_array(self):
+        if self._node_keyframe_transforms is None:
+            return self._node_keyframe_array
+
+        transforms = self._node_keyframe_transforms
+        keyframe_counts = set(len(node_transforms) for node_transforms in transforms)
+        if len(keyframe_counts) > 1:
+            return None
+
+        keyframe_count = keyframe_counts.pop() if keyframe_counts else 0
+        return np.array([[list(transform.location) + list(transform.rotation) for transform in node_transforms] for node_transforms in transforms], dtype=np.float32).reshape(len(transforms), keyframe_count, 7)
 
 
 class AnimBinding(object):
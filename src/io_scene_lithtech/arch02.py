@@ -0,0 +1,461 @@
+#
+# Arch 02 Archives
+# Created by HeyThereCoffeee
+# Special thanks to thecanonmaster
+# https://github.com/thecanonmaster/ArchExtractor
+#
+
+import io
+import os
+import shutil
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .io import unpack
+
+# Amount of compressed data fed to the decompressor at a time
+READ_SIZE = 64 * 1024
+
+# Uncompressed files are split into pieces this big for parallel extraction
+PARALLEL_COPY_SIZE = 4 * 1024 * 1024
+
+#
+# Helpers
+#
+
+# Big-Endian unpack
+def bunpack(fmt, f):
+    fmt = ">%s" % fmt
+    return unpack(fmt, f)
+
+def read_string(length, f):
+    return f.read(length).decode('ascii')
+
+# Archive paths are case insensitive and may use either slash
+def normalize_path(path):
+    return path.replace('\\', '/').strip('/').lower()
+
+
+'''
+ArchiveFile
+Read-only stream of a single file inside an Arch02.
+Compressed files are stored as a run of raw deflate chunks, these are decompressed as they're read.
+Seeking forward skips through the data, seeking backwards starts the stream over.
+'''
+class ArchiveFile(io.RawIOBase):
+    def __init__(self, archive_path, file_info):
+        self.name = file_info.path
+        self._file_info = file_info
+        self._fp = open(archive_path, 'rb')
+        self._restart()
+
+    def _restart(self):
+        self._position = 0
+        self._pending = memoryview(b'')
+        self._blocks = self._iter_blocks()
+
+    # Yields the file's (decompressed) data in blocks
+    def _iter_blocks(self):
+        file_info = self._file_info
+
+        # No compression? That's okay, just read the file as-is.
+        if file_info.compression == 0:
+            self._fp.seek(file_info.file_offset)
+            remaining = file_info.uncompressed_size
+            while remaining > 0:
+                data = self._fp.read(min(READ_SIZE, remaining))
+                if not data:
+                    break
+                remaining -= len(data)
+                yield data
+            return
+
+        for chunk in plan_chunks(self._fp, file_info):
+            self._fp.seek(chunk.data_offset)
+
+            # Data needs to be deflated (not standard decompress!)
+            decompressor = zlib.decompressobj(wbits=-zlib.MAX_WBITS)
+            remaining = chunk.compressed_size
+            while remaining > 0:
+                data = self._fp.read(min(READ_SIZE, remaining))
+                if not data:
+                    break
+                remaining -= len(data)
+
+                try:
+                    block = decompressor.decompress(data)
+                except zlib.error as e:
+                    raise Exception("Error decompressing %s: %s" % (file_info.path, e))
+
+                if block:
+                    yield block
+            # End While
+
+            block = decompressor.flush()
+            if block:
+                yield block
+        # End For
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        while len(self._pending) == 0:
+            block = next(self._blocks, None)
+            if block is None:
+                return 0
+            self._pending = memoryview(block)
+
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        self._position += size
+        return size
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self._file_info.uncompressed_size
+
+        if offset < self._position:
+            self._restart()
+
+        # Skip ahead
+        while self._position < offset:
+            if self.read(min(READ_SIZE, offset - self._position)) == b'':
+                break
+
+        return self._position
+
+    def tell(self):
+        return self._position
+
+    def close(self):
+        if not self.closed:
+            self._fp.close()
+        super().close()
+
+
+class ChunkInfo(object):
+    def __init__(self, data_offset, compressed_size, uncompressed_size):
+        self.data_offset = data_offset
+        self.compressed_size = compressed_size
+        self.uncompressed_size = uncompressed_size
+
+
+# Walks the chunk headers of a compressed file, without reading the chunk data
+# Each chunk is: compressed size, uncompressed size, raw deflate data, then padding up to 4 bytes
+def plan_chunks(f, file_info):
+    chunks = []
+    end = file_info.file_offset + file_info.compressed_size
+    total_uncompressed = 0
+
+    f.seek(file_info.file_offset)
+    while f.tell() < end and total_uncompressed < file_info.uncompressed_size:
+        size_compressed = bunpack('I', f)[0]
+        size_uncompressed = bunpack('I', f)[0]
+
+        chunks.append(ChunkInfo(f.tell(), size_compressed, size_uncompressed))
+        total_uncompressed += size_uncompressed
+
+        # Skip the data, and fix the offset
+        position = f.tell() + size_compressed
+        position += (4 - position % 4) % 4
+        f.seek(position)
+    # End While
+
+    return chunks
+
+
+#
+# Arch Class
+#
+class Arch02(object):
+    def __init__(self):
+        self.header = None
+        self.string_table = None
+        self.files = []
+        self.directories = []
+
+        self.archive_name = ""
+        self.archive_path = ""
+        self.binary_position = 0
+
+        # Normalized path -> FileInfo
+        self.index = {}
+
+    ###################################################################################
+    # Start of class zone
+    ###################################################################################
+
+    class Header(object):
+        def __init__(self):
+            self.tag = ""
+            self.version = -1
+            self.string_table_count = 0
+            self.directory_count = 0
+            self.file_count = 0
+            self.unk_1 = 0
+            self.unk_2 = 0
+            self.unk_3 = 0
+            self.hash = ''
+
+        def read(self, f):
+            self.tag = read_string(4, f)
+            self.version = bunpack('I', f)[0]
+            self.string_table_count = bunpack('I', f)[0]
+            self.directory_count = bunpack('I', f)[0]
+            self.file_count = bunpack('I', f)[0]
+            self.unk_1 = bunpack('I', f)[0]
+            self.unk_2 = bunpack('I', f)[0]
+            self.unk_3 = bunpack('I', f)[0]
+            self.hash = bunpack('16B', f)
+
+    class StringTable(object):
+        def __init__(self):
+            self.table = ""
+
+        def read(self, length, f):
+            self.table = read_string(length, f)
+
+        def get_string(self, offset):
+            # Okay we need to find the next null character now!
+            null_terminator = self.table.find('\x00', offset)
+
+            # Make sure we actually ran through the string
+            assert(null_terminator != -1)
+
+            return self.table[offset:null_terminator]
+
+    class FileInfo(object):
+        def __init__(self, string_table):
+            self.name = ""
+            self.name_offset = 0
+            self.file_offset = 0
+            self.compressed_size = 0
+            self.uncompressed_size = 0
+            self.compression = -1
+
+            # Path within the archive, filled in once we know the directory
+            self.path = ""
+
+            self.string_table = string_table
+
+        def read(self, f):
+            self.name_offset = bunpack('I', f)[0]
+            self.file_offset = bunpack('Q', f)[0]
+            self.compressed_size = bunpack('Q', f)[0]
+            self.uncompressed_size = bunpack('Q', f)[0]
+            self.compression = bunpack('I', f)[0]
+
+            # Grab the name from the string table
+            self.name = self.string_table.get_string(self.name_offset)
+
+    class DirectoryInfo(object):
+        def __init__(self, string_table):
+            self.name = ""
+            self.name_offset = 0
+            self.first_sub_index = 0
+            self.next_index = 0
+            self.file_count = 0
+
+            self.string_table = string_table
+
+        def read(self, f):
+            self.name_offset = bunpack('I', f)[0]
+            self.first_sub_index = bunpack('I', f)[0]
+            self.next_index = bunpack('I', f)[0]
+            self.file_count = bunpack('I', f)[0]
+
+            # Grab the name from the string table
+            self.name = self.string_table.get_string(self.name_offset)
+
+    ###################################################################################
+    # End of class zone
+    ###################################################################################
+
+    #
+    # Random access
+    #
+    def get_file_info(self, path):
+        file_info = self.index.get(normalize_path(path))
+        if file_info is None:
+            raise FileNotFoundError("%s is not in %s" % (path, self.archive_name))
+        return file_info
+
+    def __contains__(self, path):
+        return normalize_path(path) in self.index
+
+    def list_files(self):
+        return [file.path for file in self.files]
+
+    # Returns a buffered, read-only file object for a file in the archive.
+    # These can be passed to the model readers (and DTX) in place of a path.
+    def open(self, path):
+        return io.BufferedReader(ArchiveFile(self.archive_path, self.get_file_info(path)), READ_SIZE)
+
+    def read_file(self, path):
+        with self.open(path) as f:
+            return f.read()
+
+    #
+    # Extract the files/folders from the archive
+    # With parallel set, chunks are decompressed across a thread pool (zlib releases the GIL)
+    #
+    def extract(self, out_folder = './out', parallel = False, workers = None):
+        print("Extracting %s to %s" % (self.archive_name, out_folder))
+
+        # Create the output folder if needed
+        if not os.path.isdir(out_folder):
+            print("Could not find %s, creating it now..." % out_folder)
+            os.makedirs(out_folder)
+
+        # Now create the folders
+        for directory in self.directories:
+            directory_path = os.path.join(out_folder, *directory.name.replace('\\', '/').split('/'))
+            if not os.path.isdir(directory_path):
+                os.makedirs(directory_path)
+
+        if parallel:
+            errors = self._extract_parallel(out_folder, workers)
+        else:
+            errors = self._extract_serial(out_folder)
+
+        if len(errors) > 0:
+            print("Couldn't decompress the %d files" % len(errors))
+            print(errors)
+
+        print("Finished!")
+
+    def _extract_serial(self, out_folder):
+        errors = []
+
+        for file in self.files:
+            file_path = os.path.join(out_folder, *file.path.split('/'))
+
+            with io.BufferedReader(ArchiveFile(self.archive_path, file), READ_SIZE) as in_f, open(file_path, 'wb') as out_f:
+                try:
+                    shutil.copyfileobj(in_f, out_f, READ_SIZE)
+                except Exception as e:
+                    errors.append(file_path)
+                    print(e)
+        # End For
+
+        return errors
+
+    def _extract_parallel(self, out_folder, workers):
+        # Plan every chunk up front: where it's read from, and where it goes in the output file
+        jobs = []
+        with open(self.archive_path, 'rb') as f:
+            for file in self.files:
+                file_path = os.path.join(out_folder, *file.path.split('/'))
+
+                # Preallocate the output, so each chunk can be written in place
+                with open(file_path, 'wb') as out_f:
+                    out_f.truncate(file.uncompressed_size)
+
+                if file.compression == 0:
+                    # Stored files are just copied over, a piece at a time
+                    for offset in range(0, file.uncompressed_size, PARALLEL_COPY_SIZE):
+                        size = min(PARALLEL_COPY_SIZE, file.uncompressed_size - offset)
+                        jobs.append((file_path, offset, ChunkInfo(file.file_offset + offset, size, size), False))
+                    continue
+
+                output_offset = 0
+                for chunk in plan_chunks(f, file):
+                    jobs.append((file_path, output_offset, chunk, True))
+                    output_offset += chunk.uncompressed_size
+            # End For
+
+        print("Planned %d chunks across %d files" % (len(jobs), len(self.files)))
+
+        # Each thread keeps its own handle to the archive
+        local = threading.local()
+
+        def extract_chunk(job):
+            file_path, output_offset, chunk, compressed = job
+
+            if not hasattr(local, 'archive_fp'):
+                local.archive_fp = open(self.archive_path, 'rb')
+                handles.append(local.archive_fp)
+
+            local.archive_fp.seek(chunk.data_offset)
+            data = local.archive_fp.read(chunk.compressed_size)
+
+            if compressed:
+                # Data needs to be deflated (not standard decompress!)
+                data = zlib.decompress(data, wbits=-zlib.MAX_WBITS)
+                if len(data) != chunk.uncompressed_size:
+                    raise Exception("Chunk decompressed to %d bytes, expected %d" % (len(data), chunk.uncompressed_size))
+
+            with open(file_path, 'r+b') as out_f:
+                out_f.seek(output_offset)
+                out_f.write(data)
+
+        handles = []
+        errors = []
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = { pool.submit(extract_chunk, job): job[0] for job in jobs }
+                for future in as_completed(futures):
+                    try:
+                        future.result()
+                    except Exception as e:
+                        file_path = futures[future]
+                        if file_path not in errors:
+                            errors.append(file_path)
+                        print("Error extracting %s: %s" % (file_path, e))
+                # End For
+        finally:
+            for handle in handles:
+                handle.close()
+
+        return errors
+
+    #
+    # Actually read the archive
+    #
+    def read(self, path = "./Layer.Arch02"):
+
+        self.archive_path = path
+        self.archive_name = os.path.basename(path)
+
+        with open(path, 'rb') as f:
+            self.header = self.Header()
+            self.header.read(f)
+
+            self.string_table = self.StringTable()
+            self.string_table.read(self.header.string_table_count, f)
+
+            self.files = []
+            for _ in range(self.header.file_count):
+                file = self.FileInfo(self.string_table)
+                file.read(f)
+                self.files.append(file)
+
+            self.directories = []
+            for _ in range(self.header.directory_count):
+                directory = self.DirectoryInfo(self.string_table)
+                directory.read(f)
+                self.directories.append(directory)
+
+            self.binary_position = f.tell()
+
+        # Files are stored in directory order, so we can build out their paths
+        self.index = {}
+        total_files_processed = 0
+        for directory in self.directories:
+            for file in self.files[total_files_processed:total_files_processed + directory.file_count]:
+                file.path = '/'.join([directory.name.replace('\\', '/').strip('/'), file.name]).lstrip('/')
+                self.index[normalize_path(file.path)] = file
+            # Okay remember how many files we've processed so far...
+            total_files_processed += directory.file_count
+        # End For
+
+        print("Finished reading archive headers")
+        return self
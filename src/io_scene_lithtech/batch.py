@@ -0,0 +1,434 @@
+'''
+Batch conversion, for converting whole game directories at once.
+
+    python -m io_scene_lithtech.batch Game/Models -o out -j 8 --report report.json
+
+Each file is converted in a worker process (see cli.convert), so a model that crashes or hangs the reader only fails that file.
+Workers that go over the timeout are killed and replaced.
+
+With --manifest, outputs whose source, options and reader/writer code haven't changed since the last run are skipped
+(see manifest.py.)
+'''
+import argparse
+import json
+import multiprocessing
+import multiprocessing.connection
+import os
+import sys
+import time
+import traceback
+
+from .cli import READERS, OUTPUT_FORMATS, convert, default_version, writer_type
+from .cache import hash_file
+from .manifest import ConversionManifest, DEFAULT_MANIFEST_NAME, class_name, file_stat
+from .utils import ABCVersion, LTAVersion
+
+STATUS_OK = 'ok'
+STATUS_ERROR = 'error'
+STATUS_TIMEOUT = 'timeout'
+STATUS_CRASHED = 'crashed'
+STATUS_SKIPPED = 'skipped'
+
+
+class BatchJob(object):
+    def __init__(self, input_path, output_path):
+        self.input_path = input_path
+        self.output_path = output_path
+
+
+class BatchOptions(object):
+    def __init__(self):
+        self.reader = 'auto'
+        self.output_format = 'lta'
+        self.version = None
+        self.use_cache = False
+        self.workers = None
+        # In seconds, None to wait forever
+        self.timeout = 120.0
+        # Readers and writers print a lot, which is mostly noise when converting thousands of files
+        self.verbose = False
+
+
+def find_models(path, extensions=('.ltb',)):
+    '''
+    Yields every model file under path (or path itself, if it's a file), in a stable order.
+    '''
+    if os.path.isfile(path):
+        yield path
+        return
+
+    for root, directories, files in os.walk(path):
+        directories.sort()
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() in extensions:
+                yield os.path.join(root, name)
+        # End For
+    # End For
+
+
+def output_path_for(input_path, input_root, output_directory, output_format):
+    '''
+    Without an output directory the file is written next to the input (like the converter operators do),
+    otherwise the input's folder layout is mirrored under output_directory.
+    '''
+    name = os.path.splitext(input_path)[0] + '.' + output_format
+    if output_directory is None:
+        return name
+
+    if os.path.isfile(input_root):
+        return os.path.join(output_directory, os.path.basename(name))
+    return os.path.join(output_directory, os.path.relpath(name, input_root))
+
+
+def find_output_collisions(jobs):
+    '''
+    Returns (output path, [input paths]) for every output more than one job would write.
+    Paths are compared case-insensitively, since a.ltb and a.LTB end up as the same a.lta on most file systems.
+    '''
+    inputs_by_output = {}
+    for job in jobs:
+        key = os.path.normcase(os.path.abspath(job.output_path)).casefold()
+        inputs_by_output.setdefault(key, (job.output_path, []))[1].append(job.input_path)
+    # End For
+
+    return [(output_path, input_paths) for output_path, input_paths in inputs_by_output.values() if len(input_paths) > 1]
+
+
+def partial_path(output_path):
+    return output_path + '.part'
+
+
+def remove_partial(output_path):
+    try:
+        os.remove(partial_path(output_path))
+    except OSError:
+        pass
+
+
+def run_job(job, options):
+    '''
+    Converts a single file and returns its entry for the report. Exceptions are caught here so they end up in the report.
+    '''
+    result = {
+        'input': job.input_path,
+        'output': job.output_path,
+        'status': STATUS_OK,
+        'seconds': 0.0,
+        'error': None,
+    }
+
+    # Written under a temporary name first, so a killed worker never leaves a half written model behind
+    temp_path = partial_path(job.output_path)
+
+    start = time.perf_counter()
+    try:
+        # Stat and hash the source before reading, so a file that changes mid conversion
+        # doesn't match its manifest entry and is converted again next time
+        source_stat = file_stat(job.input_path)
+        source_hash = hash_file(job.input_path)
+
+        if options.verbose:
+            _, reader_type = convert(job.input_path, temp_path, options.reader, options.output_format, options.version,
+                                     options.use_cache)
+        else:
+            with open(os.devnull, 'w') as devnull:
+                stdout = sys.stdout
+                sys.stdout = devnull
+                try:
+                    _, reader_type = convert(job.input_path, temp_path, options.reader, options.output_format, options.version,
+                                             options.use_cache)
+                finally:
+                    sys.stdout = stdout
+        os.replace(temp_path, job.output_path)
+
+        # For the manifest
+        version = options.version if options.version is not None else default_version(options.output_format, reader_type)
+        result['version'] = version
+        result['reader'] = class_name(reader_type)
+        result['writer'] = class_name(writer_type(options.output_format, version))
+        result['source_stat'] = source_stat
+        result['source_hash'] = source_hash
+        result['output_stat'] = file_stat(job.output_path)
+        result['output_hash'] = hash_file(job.output_path)
+    except Exception as e:
+        result['status'] = STATUS_ERROR
+        result['error'] = str(e)
+        result['traceback'] = traceback.format_exc()
+        remove_partial(job.output_path)
+    result['seconds'] = time.perf_counter() - start
+
+    return result
+
+
+def _worker_main(connection, options):
+    while True:
+        try:
+            job = connection.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+        connection.send(run_job(job, options))
+    # End While
+
+
+class _Worker(object):
+    '''
+    A worker process that converts one job at a time. Jobs and results are sent over a pipe.
+    '''
+    def __init__(self, context, options):
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_connection, options), daemon=True)
+        self.process.start()
+        child_connection.close()
+
+        self.index = None
+        self.job = None
+        self.start = None
+        self.deadline = None
+
+    def send(self, index, job, timeout):
+        self.index = index
+        self.job = job
+        self.start = time.perf_counter()
+        self.deadline = self.start + timeout if timeout is not None else None
+        self.connection.send(job)
+
+    def finish(self):
+        index = self.index
+        self.index = None
+        self.job = None
+        self.start = None
+        self.deadline = None
+        return index
+
+    def stop(self):
+        try:
+            self.connection.send(None)
+        except OSError:
+            pass
+        self.process.join(timeout=5)
+        self.kill()
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+
+def _failed_result(worker, status, error):
+    remove_partial(worker.job.output_path)
+    return {
+        'input': worker.job.input_path,
+        'output': worker.job.output_path,
+        'status': status,
+        'seconds': time.perf_counter() - worker.start,
+        'error': error,
+    }
+
+
+def run_batch(jobs, options, on_result=None):
+    '''
+    Runs jobs across options.workers processes, and returns their results in the same order as jobs.
+    on_result(index, result) is called as each one finishes.
+    '''
+    results = [None] * len(jobs)
+    if len(jobs) == 0:
+        return results
+
+    worker_count = options.workers if options.workers is not None else os.cpu_count() or 1
+    worker_count = max(1, min(worker_count, len(jobs)))
+
+    context = multiprocessing.get_context()
+    workers = [_Worker(context, options) for _ in range(worker_count)]
+    pending = list(reversed(range(len(jobs))))
+
+    def record(worker, result):
+        index = worker.finish()
+        results[index] = result
+        if on_result is not None:
+            on_result(index, result)
+
+    try:
+        while pending or any(worker.job is not None for worker in workers):
+            for worker in workers:
+                if worker.job is None and pending:
+                    index = pending.pop()
+                    worker.send(index, jobs[index], options.timeout)
+            # End For
+
+            busy = [worker for worker in workers if worker.job is not None]
+            deadlines = [worker.deadline for worker in busy if worker.deadline is not None]
+            wait_time = max(0.0, min(deadlines) - time.perf_counter()) if deadlines else None
+
+            ready = multiprocessing.connection.wait(
+                [worker.connection for worker in busy] + [worker.process.sentinel for worker in busy], timeout=wait_time)
+
+            for i, worker in enumerate(workers):
+                if worker.job is None:
+                    continue
+
+                if worker.connection in ready or worker.process.sentinel in ready:
+                    try:
+                        record(worker, worker.connection.recv())
+                        continue
+                    except (EOFError, OSError):
+                        # The worker died without sending a result (segfault, out of memory, etc.)
+                        worker.process.join(timeout=5)
+                        record(worker, _failed_result(worker, STATUS_CRASHED,
+                                                      'Worker exited with code %s' % worker.process.exitcode))
+                elif worker.deadline is not None and time.perf_counter() >= worker.deadline:
+                    record(worker, _failed_result(worker, STATUS_TIMEOUT, 'Timed out after %gs' % options.timeout))
+                else:
+                    continue
+
+                # Replace it, the old one is either dead or stuck
+                worker.kill()
+                workers[i] = _Worker(context, options)
+            # End For
+        # End While
+    finally:
+        for worker in workers:
+            worker.stop()
+        # End For
+
+    return results
+
+
+def make_report(results, seconds, options):
+    counts = { status: 0 for status in (STATUS_OK, STATUS_SKIPPED, STATUS_ERROR, STATUS_TIMEOUT, STATUS_CRASHED) }
+    for result in results:
+        counts[result['status']] += 1
+    # End For
+
+    return {
+        'seconds': seconds,
+        'workers': options.workers if options.workers is not None else os.cpu_count(),
+        'timeout': options.timeout,
+        'total': len(results),
+        'counts': counts,
+        'files': results,
+    }
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(
+        prog='lithtech-batch',
+        description='Converts every LTB model under one or more directories')
+
+    parser.add_argument('inputs', nargs='+', help='Files or directories to convert')
+    parser.add_argument('-o', '--output', default=None,
+                        help='Output directory, the input folder layout is kept (default: next to each input)')
+    parser.add_argument('-f', '--format', choices=sorted(set(OUTPUT_FORMATS.values())), default='lta', help='Output format')
+    parser.add_argument('-v', '--version', default=None,
+                        help=f'Output version, one of {", ".join(v.value for v in LTAVersion)} or {", ".join(v.value for v in ABCVersion)}')
+    parser.add_argument('-r', '--reader', choices=['auto'] + list(READERS.keys()), default='auto',
+                        help='Reader to use (default: from the input extension)')
+    parser.add_argument('-e', '--extension', action='append', default=None,
+                        help='Input file extension to look for, can be given more than once (default: .ltb)')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='Number of worker processes (default: CPU count)')
+    parser.add_argument('-t', '--timeout', type=float, default=120.0, help='Seconds allowed per file, 0 for no limit')
+    parser.add_argument('--report', default=None, help='Write a JSON report of timings and errors here')
+    parser.add_argument('-m', '--manifest', nargs='?', default=None, const='',
+                        help=f'Skip outputs that are up to date according to this manifest, and update it '
+                             f'(default: {DEFAULT_MANIFEST_NAME} in the output directory)')
+    parser.add_argument('--force', action='store_true', help='Convert everything, even if the manifest says it\'s up to date')
+    parser.add_argument('--cache', action='store_true', help='Use the parse cache')
+    parser.add_argument('--verbose', action='store_true', help='Show reader and writer output')
+
+    args = parser.parse_args(argv)
+
+    options = BatchOptions()
+    options.reader = args.reader
+    options.output_format = args.format
+    options.version = args.version
+    options.use_cache = args.cache
+    options.workers = args.workers
+    options.timeout = args.timeout if args.timeout > 0 else None
+    options.verbose = args.verbose
+
+    extensions = tuple('.' + extension.lower().lstrip('.') for extension in (args.extension or ['ltb']))
+
+    jobs = []
+    for input_root in args.inputs:
+        if not os.path.exists(input_root):
+            print(f'ERROR: {input_root} does not exist', file=sys.stderr)
+            return 1
+        for input_path in find_models(input_root, extensions):
+            jobs.append(BatchJob(input_path, output_path_for(input_path, input_root, args.output, options.output_format)))
+        # End For
+    # End For
+
+    collisions = find_output_collisions(jobs)
+    if collisions:
+        for output_path, input_paths in collisions:
+            print(f'ERROR: {", ".join(input_paths)} would all be written to {output_path}', file=sys.stderr)
+        print('Convert the colliding inputs separately, or give each one its own --output directory', file=sys.stderr)
+        return 1
+
+    manifest = None
+    if args.manifest is not None:
+        manifest_path = args.manifest
+        if manifest_path == '':
+            if args.output is None:
+                print('ERROR: --manifest needs a path when there\'s no --output directory', file=sys.stderr)
+                return 1
+            manifest_path = os.path.join(args.output, DEFAULT_MANIFEST_NAME)
+        manifest = ConversionManifest(manifest_path).load()
+
+    start = time.perf_counter()
+
+    results = [None] * len(jobs)
+    pending = []
+    for index, job in enumerate(jobs):
+        if manifest is not None and not args.force and manifest.is_up_to_date(job, options):
+            results[index] = {
+                'input': job.input_path,
+                'output': job.output_path,
+                'status': STATUS_SKIPPED,
+                'seconds': 0.0,
+                'error': None,
+            }
+        else:
+            pending.append(index)
+    # End For
+
+    print(f'Converting {len(pending)} files' + (f' ({len(jobs) - len(pending)} up to date)' if len(pending) < len(jobs) else ''))
+
+    def on_result(pending_index, result):
+        index = pending[pending_index]
+        results[index] = result
+
+        if manifest is not None:
+            if result['status'] == STATUS_OK:
+                manifest.record(jobs[index], options, result)
+            else:
+                manifest.forget(jobs[index])
+
+        line = f'[{pending_index + 1}/{len(pending)}] {result["status"]} {result["input"]} ({result["seconds"]:.2f}s)'
+        if result['error'] is not None:
+            line += f': {result["error"]}'
+        print(line)
+
+    try:
+        run_batch([jobs[index] for index in pending], options, on_result)
+    finally:
+        # Even if interrupted, so finished files aren't converted again
+        if manifest is not None:
+            manifest.save()
+
+    report = make_report(results, time.perf_counter() - start, options)
+
+    print(f'Finished in {report["seconds"]:.2f}s: ' + ', '.join(f'{count} {status}' for status, count in report['counts'].items()))
+
+    if args.report is not None:
+        os.makedirs(os.path.dirname(args.report) or '.', exist_ok=True)
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    return 0 if report['counts'][STATUS_OK] + report['counts'][STATUS_SKIPPED] == len(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
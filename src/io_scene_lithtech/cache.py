@@ -0,0 +1,368 @@
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+from .vector_math import Vector, Quaternion, Matrix
+from . import abc
+
+'''
+Parse Cache
+Parsed models are stored on disk keyed by the file's content hash, the reader and the reader's version (a hash of its code),
+so re-importing the same file skips the reader entirely.
+
+Each entry is a single .npz: geometry and animation keys go in as arrays, everything else is a small json blob (`__meta__`)
+that describes the abc.Model object tree and points at those arrays.
+The cache is bounded by size, least recently used entries are removed first.
+'''
+
+# Bump this if the entry layout changes
+CACHE_FORMAT_VERSION = 1
+
+DEFAULT_MAX_SIZE = 512 * 1024 * 1024
+
+# Temporary files older than this (in seconds) were left behind by a crashed process
+STALE_TEMP_AGE = 60 * 60
+
+# Package modules that change what the readers (and writers) produce, on top of their own module.
+# The shim is included even when the real mathutils is used, it's just a few more bytes to hash.
+CODE_INPUTS = ('abc', 'io', 'hash_ps2', 'vector_math', 'mathutils_shim', 'utils')
+
+# Attributes rebuilt on load, rather than stored
+SKIPPED_ATTRIBUTES = {
+    abc.Node: ('parent', 'children'),
+    abc.ArrayLOD: ('_faces', '_vertices'),
+}
+
+
+def default_cache_directory():
+    if sys.platform == 'win32':
+        base = os.environ.get('LOCALAPPDATA', os.path.expanduser('~'))
+    else:
+        base = os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.path.join(base, 'io_scene_lithtech', 'models')
+
+
+def hash_file(path):
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+# Hash of the source of these package modules (by name, like 'reader_ltb_pc'),
+# so anything made by older code can be told apart
+_code_versions = {}
+
+def code_version(*module_names):
+    version = _code_versions.get(module_names)
+    if version is None:
+        package_directory = os.path.dirname(os.path.abspath(__file__))
+        hasher = hashlib.sha256()
+        for module_name in module_names:
+            hasher.update(module_name.encode())
+            try:
+                with open(os.path.join(package_directory, module_name + '.py'), 'rb') as f:
+                    hasher.update(f.read())
+            except OSError:
+                hasher.update(b'missing')
+        version = hasher.hexdigest()
+        _code_versions[module_names] = version
+    return version
+
+
+def module_name(cls):
+    return cls.__module__.rsplit('.', 1)[-1]
+
+
+# Hash of the reader's code (and the code it produces models with),
+# so entries made by older readers are never used
+def reader_version(reader):
+    return code_version(module_name(type(reader)), *CODE_INPUTS, 'cache')
+
+
+def _resolve_class(name):
+    value = abc
+    for part in name.split('.'):
+        value = getattr(value, part)
+    return value
+
+
+class _Encoder(object):
+    def __init__(self):
+        self.arrays = {}
+
+    def array(self, value):
+        key = 'a%d' % len(self.arrays)
+        self.arrays[key] = value
+        return { '__array__': key }
+
+    def encode(self, value):
+        if value is None or isinstance(value, (bool, int, float, str)):
+            return value
+        if isinstance(value, np.ndarray):
+            return self.array(value)
+        if isinstance(value, np.generic):
+            return value.item()
+        if isinstance(value, bytes):
+            return { '__bytes__': self.array(np.frombuffer(value, dtype=np.uint8)) }
+        if isinstance(value, Vector):
+            return { '__vector__': list(value) }
+        if isinstance(value, Quaternion):
+            return { '__quaternion__': list(value) }
+        if isinstance(value, Matrix):
+            return { '__matrix__': [list(row) for row in value] }
+        if isinstance(value, list):
+            return [self.encode(item) for item in value]
+        if isinstance(value, tuple):
+            return { '__tuple__': [self.encode(item) for item in value] }
+        if isinstance(value, dict):
+            return { '__dict__': [[self.encode(key), self.encode(item)] for key, item in value.items()] }
+        if isinstance(value, abc.LOD):
+            return self.encode_object(abc.ArrayLOD.from_lod(value))
+        if isinstance(value, abc.Animation):
+            return self.encode_animation(value)
+        if type(value).__module__ == abc.__name__:
+            return self.encode_object(value)
+
+        raise Exception('Cannot cache a %s' % type(value).__name__)
+
+    def encode_object(self, value, attributes=None):
+        if attributes is None:
+            attributes = value.__dict__
+        skipped = SKIPPED_ATTRIBUTES.get(type(value), ())
+        return {
+            '__object__': type(value).__qualname__,
+            'attributes': { key: self.encode(item) for key, item in attributes.items() if key not in skipped },
+        }
+
+    # Keyframe transforms are stored as a (node, keyframe, 7) array, like compressed LTB animations
+    def encode_animation(self, animation):
+        attributes = dict(animation.__dict__)
+
+        keyframes = animation.get_node_keyframe_array()
+        if keyframes is not None and len(keyframes) > 0:
+            attributes['_node_keyframe_array'] = keyframes.astype(np.float32)
+            attributes['_node_keyframe_transforms'] = None
+
+        return self.encode_object(animation, attributes)
+
+
+class _Decoder(object):
+    def __init__(self, arrays):
+        self.arrays = arrays
+
+    def decode(self, value):
+        if isinstance(value, list):
+            return [self.decode(item) for item in value]
+        if not isinstance(value, dict):
+            return value
+
+        if '__array__' in value:
+            return self.arrays[value['__array__']]
+        if '__bytes__' in value:
+            return self.decode(value['__bytes__']).tobytes()
+        if '__vector__' in value:
+            return Vector(value['__vector__'])
+        if '__quaternion__' in value:
+            return Quaternion(value['__quaternion__'])
+        if '__matrix__' in value:
+            return Matrix(value['__matrix__'])
+        if '__tuple__' in value:
+            return tuple(self.decode(item) for item in value['__tuple__'])
+        if '__dict__' in value:
+            return { self.decode(key): self.decode(item) for key, item in value['__dict__'] }
+        if '__object__' in value:
+            cls = _resolve_class(value['__object__'])
+            obj = cls.__new__(cls)
+            obj.__dict__.update({ key: self.decode(item) for key, item in value['attributes'].items() })
+
+            if isinstance(obj, abc.ArrayLOD):
+                obj._faces = None
+                obj._vertices = None
+            return obj
+
+        raise Exception('Unknown cache entry %s' % list(value.keys()))
+
+
+class ParseCache(object):
+    def __init__(self, directory=None, max_size=DEFAULT_MAX_SIZE):
+        self.directory = directory if directory is not None else default_cache_directory()
+        self.max_size = max_size
+
+        # (path, size, mtime) -> content hash, so we only hash a file once per session
+        self._file_hashes = {}
+
+    def _file_hash(self, path):
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        file_hash = self._file_hashes.get(key)
+        if file_hash is None:
+            file_hash = hash_file(path)
+            self._file_hashes[key] = file_hash
+        return file_hash
+
+    def entry_path(self, reader, path):
+        # Reader options (like the PS2 vertex merge epsilon) change the model too.
+        # Only the ones the reader declares, anything else it sets while parsing would make every key unique
+        options = getattr(reader, 'cache_options', lambda: ())()
+
+        # And so do any other files the reader loads (like PS2 hash wordlists), by their contents rather than path
+        input_hashes = []
+        for input_path in getattr(reader, 'input_files', lambda: [])():
+            try:
+                input_hashes.append(self._file_hash(input_path))
+            except OSError:
+                input_hashes.append(None)
+        # End For
+
+        hasher = hashlib.sha256()
+        hasher.update(self._file_hash(path).encode())
+        hasher.update(('%s.%s' % (type(reader).__module__, type(reader).__qualname__)).encode())
+        hasher.update(reader_version(reader).encode())
+        hasher.update(repr(options).encode())
+        hasher.update(repr(input_hashes).encode())
+        hasher.update(str(CACHE_FORMAT_VERSION).encode())
+        return os.path.join(self.directory, hasher.hexdigest() + '.npz')
+
+    def load(self, entry_path):
+        if not os.path.exists(entry_path):
+            return None
+
+        try:
+            with np.load(entry_path, allow_pickle=False) as data:
+                meta = json.loads(data['__meta__'].tobytes().decode('utf-8'))
+                if meta.get('format') != CACHE_FORMAT_VERSION:
+                    raise Exception('Cache entry format %s, expected %d' % (meta.get('format'), CACHE_FORMAT_VERSION))
+
+                arrays = { key: data[key] for key in data.files if key != '__meta__' }
+
+            model = _Decoder(arrays).decode(meta['model'])
+            if not isinstance(model, abc.Model):
+                raise Exception('Cache entry is a %s, not a Model' % type(model).__name__)
+            if len(model.nodes) > 0:
+                abc.build_undirected_tree(model.nodes)
+        except Exception as e:
+            # Anything wrong with the entry is just a miss, and it's removed so it's rebuilt
+            print("Ignoring bad parse cache entry %s: %s" % (entry_path, e))
+            self._remove(entry_path)
+            return None
+
+        # Mark it as recently used, a read only cache just won't know
+        try:
+            os.utime(entry_path)
+        except OSError:
+            pass
+        return model
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def store(self, entry_path, model):
+        encoder = _Encoder()
+        meta = {
+            'format': CACHE_FORMAT_VERSION,
+            'model': encoder.encode(model),
+        }
+
+        os.makedirs(self.directory, exist_ok=True)
+
+        # Write to a temporary file first, so a half written entry is never picked up.
+        # It has a unique name, other processes (like batch conversions) may be caching the same file.
+        with tempfile.NamedTemporaryFile(dir=self.directory, prefix=os.path.basename(entry_path) + '.', suffix='.tmp',
+                                         delete=False) as f:
+            temp_path = f.name
+            try:
+                np.savez(f, __meta__=np.frombuffer(json.dumps(meta).encode('utf-8'), dtype=np.uint8), **encoder.arrays)
+            except BaseException:
+                f.close()
+                self._remove(temp_path)
+                raise
+
+        try:
+            os.replace(temp_path, entry_path)
+        except BaseException:
+            self._remove(temp_path)
+            raise
+
+        self.evict(keep=entry_path)
+
+    # Remove the least recently used entries until we're under max_size,
+    # along with any temporary files a crashed process left behind
+    def evict(self, keep=None):
+        entries = []
+        stale_time = time.time() - STALE_TEMP_AGE
+        for name in os.listdir(self.directory):
+            entry_path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(entry_path)
+            except OSError:
+                continue
+
+            if name.endswith('.tmp'):
+                if stat.st_mtime < stale_time:
+                    self._remove(entry_path)
+                continue
+
+            if not name.endswith('.npz'):
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, entry_path))
+        # End For
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, entry_path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            if entry_path == keep:
+                continue
+            try:
+                os.remove(entry_path)
+                total_size -= size
+            except OSError:
+                pass
+        # End For
+
+    # Returns the model from the cache if we've seen this file before, otherwise reads it with `reader` and caches it
+    def read_model(self, reader, path):
+        entry_path = self.entry_path(reader, path)
+
+        model = self.load(entry_path)
+        if model is not None:
+            print("Loaded %s from the parse cache" % path)
+            return model
+
+        model = reader.from_file(path)
+
+        try:
+            self.store(entry_path, model)
+        except Exception as e:
+            # Caching is just a nice to have
+            print("Could not cache %s: %s" % (path, e))
+
+        return model
+
+
+# Shared caches (by directory), so file hashes are remembered between imports
+_default_caches = {}
+
+# `directory` defaults to the user cache directory, which is only meant for the headless cli and batch tools.
+# Inside Blender the importer passes the extension's own user directory instead.
+def get_default_cache(directory=None):
+    cache = _default_caches.get(directory)
+    if cache is None:
+        cache = ParseCache(directory)
+        _default_caches[directory] = cache
+    return cache
+
+
+def read_model(reader, path, cache=None):
+    if cache is None:
+        return reader.from_file(path)
+    return cache.read_model(reader, path)
@@ -0,0 +1,163 @@
+'''
+Command line tools, for working with models outside of Blender.
+
+    python -m io_scene_lithtech.cli info model.ltb
+    python -m io_scene_lithtech.cli convert model.ltb model.lta
+
+Only the readers, writers and abc.Model are used here, so bpy isn't needed (and mathutils is optional, see vector_math.py.)
+'''
+import argparse
+import os
+import sys
+import time
+
+from .reader_abc_pc import ABCModelReader
+from .reader_abc_v6_pc import ABCV6ModelReader
+from .reader_ltb_pc import PCLTBModelReader
+from .reader_ltb_ps2 import PS2LTBModelReader
+from .writer_abc_pc import ABCModelWriter
+from .writer_abc_v6_pc import ABCV6ModelWriter
+from .writer_lta_pc import LTAModelWriter
+from .stubber import ModelStubber
+from .cache import get_default_cache, read_model
+from .utils import ABCVersion, LTAVersion
+
+# Readers to try for each file type, in order. Same order as the import operators use.
+READERS = {
+    'abc': [ABCModelReader, ABCV6ModelReader],
+    'abc-6': [ABCV6ModelReader],
+    'ltb': [PCLTBModelReader, PS2LTBModelReader],
+    'ps2-ltb': [PS2LTBModelReader],
+}
+
+OUTPUT_FORMATS = {
+    '.lta': 'lta',
+    '.abc': 'abc',
+}
+
+
+def reader_types(path: str, reader: str = 'auto') -> list:
+    if reader == 'auto':
+        reader = os.path.splitext(path)[1].lower().lstrip('.')
+    if reader not in READERS:
+        raise Exception(f'Don\'t know how to read {path} (try --reader)')
+    return READERS[reader]
+
+
+def load_model(path: str, reader: str = 'auto', use_cache: bool = False):
+    parse_cache = get_default_cache() if use_cache else None
+
+    errors = []
+    for reader_type in reader_types(path, reader):
+        try:
+            model = read_model(reader_type(), path, parse_cache)
+        except Exception as e:
+            errors.append(f'{reader_type.__name__}: {e}')
+            continue
+
+        model.name = os.path.splitext(os.path.basename(path))[0]
+        return model, reader_type
+    # End For
+
+    raise Exception(f'Could not read {path} ({"; ".join(errors)})')
+
+
+def default_version(output_format: str, reader_type) -> str:
+    if output_format == 'abc':
+        return ABCVersion.ABC12.value
+    # Same as the converter operators
+    if reader_type is PS2LTBModelReader:
+        return LTAVersion.TALON.value
+    if reader_type is PCLTBModelReader:
+        return LTAVersion.JUPITER.value
+    return LTAVersion.TALON.value
+
+
+def writer_type(output_format: str, version: str):
+    if output_format == 'lta':
+        return LTAModelWriter
+    if version == ABCVersion.ABC6.value:
+        return ABCV6ModelWriter
+    return ABCModelWriter
+
+
+def save_model(model, path: str, output_format: str, version: str):
+    writer_type(output_format, version)().write(model, path, version)
+
+
+def convert(input_path: str, output_path: str, reader: str = 'auto', output_format: str | None = None, version: str | None = None,
+            use_cache: bool = False):
+    if output_format is None:
+        output_format = OUTPUT_FORMATS.get(os.path.splitext(output_path)[1].lower())
+        if output_format is None:
+            raise Exception(f'Don\'t know what to write to {output_path} (try --format)')
+
+    model, reader_type = load_model(input_path, reader, use_cache)
+
+    # PS2 models are missing parts that LTA needs
+    if reader_type is PS2LTBModelReader:
+        model = ModelStubber().execute(model)
+
+    if version is None:
+        version = default_version(output_format, reader_type)
+
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    save_model(model, output_path, output_format, version)
+    return model, reader_type
+
+
+def print_info(path: str, reader: str = 'auto', use_cache: bool = False):
+    model, reader_type = load_model(path, reader, use_cache)
+
+    print(f'{path} ({reader_type.__name__})')
+    print(f'  version:     {model.version}')
+    print(f'  nodes:       {len(model.nodes)}')
+    print(f'  pieces:      {len(model.pieces)}')
+    for piece in model.pieces:
+        lods = ', '.join(f'{len(lod.vertices)}v/{len(lod.faces)}f' for lod in piece.lods)
+        print(f'    {piece.name}: {lods}')
+    print(f'  sockets:     {len(model.sockets)}')
+    print(f'  animations:  {len(model.animations)} ({sum(len(animation.keyframes) for animation in model.animations)} keyframes)')
+    print(f'  child models: {len(model.child_models)}')
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(
+        prog='lithtech',
+        description='Reads and converts Lithtech models without Blender')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    info_parser = subparsers.add_parser('info', help='Print a summary of a model')
+    info_parser.add_argument('input')
+
+    convert_parser = subparsers.add_parser('convert', help='Convert a model to LTA or ABC')
+    convert_parser.add_argument('input')
+    convert_parser.add_argument('output')
+    convert_parser.add_argument('-f', '--format', choices=sorted(set(OUTPUT_FORMATS.values())), default=None,
+                                help='Output format (default: from the output extension)')
+    convert_parser.add_argument('-v', '--version', default=None,
+                                help=f'Output version, one of {", ".join(v.value for v in LTAVersion)} or {", ".join(v.value for v in ABCVersion)}')
+
+    for subparser in (info_parser, convert_parser):
+        subparser.add_argument('-r', '--reader', choices=['auto'] + list(READERS.keys()), default='auto',
+                               help='Reader to use (default: from the input extension)')
+        subparser.add_argument('--cache', action='store_true', help='Use the parse cache')
+
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == 'info':
+            print_info(args.input, args.reader, args.cache)
+        elif args.command == 'convert':
+            start = time.perf_counter()
+            convert(args.input, args.output, args.reader, args.format, args.version, args.cache)
+            print(f'Converted {args.input} -> {args.output} in {time.perf_counter() - start:.2f}s')
+    except Exception as e:
+        print(f'ERROR: {e}', file=sys.stderr)
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,9 @@
+import io
+import os
 import struct
 import array
+import numpy as np
+from collections import OrderedDict
 from . import s3tc
 from .io import unpack
 
@@ -61,6 +65,18 @@ bpp_names = [
 ]
 
 
+def read_pixels(f, size):
+    # bytearray so the buffer is writable for the swizzle, frombuffer shares its memory
+    return np.frombuffer(bytearray(f.read(size)), dtype=np.uint8)
+
+
+# Swaps the red and blue channels and fills in the alpha, in place
+def bgra_to_rgba(pixels):
+    pixels = pixels[:len(pixels) - len(pixels) % 4].reshape(-1, 4)
+    pixels[:, [0, 2]] = pixels[:, [2, 0]]
+    pixels[:, 3] = 255
+
+
 class SectionHeader(object):
     def __init__(self, f):
         self.type = f.read(15)
@@ -68,10 +84,32 @@ class SectionHeader(object):
         self.data_length = unpack('I', f)[0]    # Data length, not including SectionHeader.
 
 
+class MipLevel(object):
+    def __init__(self, offset, width, height, size):
+        self.offset = offset
+        self.width = width
+        self.height = height
+        self.size = size # In bytes
+
+
+'''
+DTX
+Only the header is read up front, along with the offset of every mip level (and cubemap face/section.)
+Levels are decoded when they're asked for, and the most recently used ones are kept around.
+'''
 class DTX(object):
 
-    def __init__(self, path):
-        with open(path, 'rb') as f:
+    # `path` can also be an open binary file object (like a file inside an Arch02), which is read in full.
+    def __init__(self, path, cache_size=4):
+        self.path = path
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+
+        self._data = None
+        if not isinstance(path, (str, bytes, os.PathLike)):
+            self._data = path.read()
+
+        with self._open() as f:
             resource_type = unpack('I', f)[0]
             if resource_type != RESOURCE_TYPE_DTX:
                 f.seek(0, 0)
@@ -80,27 +118,130 @@ class DTX(object):
             self.mipmap_count, self.section_count, self.flags, self.user_flags = unpack('2H2I', f)
             self.extra_data = unpack('12B', f)
             self.command_string = f.read(DTX_COMMANDSTRING_LENGTH)
+
+            # Fail early, rather than when the pixels are first asked for
+            if self.bpp_identifier == BPP_16:
+                raise NotImplementedError()
+
+            # Face 0 is the regular texture (or +x for cubemaps), the other 5 faces follow it.
+            # If a level's size isn't known, nothing after it can be found (see _level_size), so we stop there
+            self.faces = []
+            self._all_levels_found = True
+            offset = f.tell()
+            try:
+                for _ in range(self.face_count):
+                    mip_levels = []
+                    self.faces.append(mip_levels)
+                    for mip_index in range(max(1, self.mipmap_count)):
+                        width = max(1, self.width >> mip_index)
+                        height = max(1, self.height >> mip_index)
+                        size = self._level_size(width, height)
+                        mip_levels.append(MipLevel(offset, width, height, size))
+                        offset += size
+                # End For
+            except NotImplementedError:
+                self._all_levels_found = False
+
+            # Even with a single level, the 8P size is a guess, so we don't know where the sections start either
+            if self.bpp_identifier == BPP_8P:
+                self._all_levels_found = False
+
+            # Section count was only trustworthy once this flag was added
+            self._sections = []
+            if self._all_levels_found and self.flags & DTX_SECTIONSFIXED:
+                f.seek(offset)
+                for _ in range(self.section_count):
+                    try:
+                        section = SectionHeader(f)
+                    except struct.error:
+                        break
+                    self._sections.append((section, f.tell()))
+                    f.seek(section.data_length, 1)
+                # End For
+            # End If
+
+    @property
+    def face_count(self):
+        return 6 if self.flags & DTX_CUBEMAP else 1
+
+    # The full size surface
+    @property
+    def pixels(self):
+        return self.get_pixels(0)
+
+    # Sections come after the last level, so they can only be found if every level was
+    @property
+    def sections(self):
+        if not self._all_levels_found:
+            raise NotImplementedError()
+        return self._sections
+
+    def _level_size(self, width, height):
+        if self.bpp_identifier == BPP_S3TC_DXT1:
+            return s3tc.data_size(s3tc.DXT1, width, height)
+        elif self.bpp_identifier == BPP_S3TC_DXT3:
+            return s3tc.data_size(s3tc.DXT3, width, height)
+        elif self.bpp_identifier == BPP_S3TC_DXT5:
+            return s3tc.data_size(s3tc.DXT5, width, height)
+        elif self.bpp_identifier == BPP_16:
+            raise NotImplementedError()
+        elif self.bpp_identifier == BPP_8P and self.faces[0]:
+            # 8P levels are palettized, so the first one is read as 4 bytes per pixel like before,
+            # but that's not their real size and we can't tell where the following levels start
+            raise NotImplementedError()
+        return width * height * 4
+
+    # Returns a flat uint8 RGBA buffer (width * height * 4) for the requested level,
+    # use `self.faces[face][mip_level]` for its size.
+    def get_pixels(self, mip_level=0, face=0):
+        key = (face, mip_level)
+        pixels = self._cache.get(key)
+        if pixels is not None:
+            self._cache.move_to_end(key)
+            return pixels
+
+        if not self._all_levels_found and (face >= len(self.faces) or mip_level >= len(self.faces[face])):
+            raise NotImplementedError()
+
+        pixels = self._decode(self.faces[face][mip_level])
+
+        self._cache[key] = pixels
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+        return pixels
+
+    def _open(self):
+        if self._data is not None:
+            return io.BytesIO(self._data)
+        return open(self.path, 'rb')
+
+    def _decode(self, level):
+        with self._open() as f:
+            f.seek(level.offset)
+
+            # Pixels are kept as a flat uint8 RGBA buffer (width * height * 4)
             if self.bpp_identifier == BPP_8:
                 # TODO: probably not right
-                self.pixels = list(f.read(self.width * self.height * 4))
+                pixels = read_pixels(f, level.size)
             elif self.bpp_identifier == BPP_8P:
-                self.pixels = list(f.read(self.width * self.height * 4))
-                for i in range(0, len(self.pixels), 4):
-                    self.pixels[i], self.pixels[i + 2] = self.pixels[i + 2], self.pixels[i]
-                    self.pixels[i + 3] = 255
+                pixels = read_pixels(f, level.size)
+                bgra_to_rgba(pixels)
             elif self.bpp_identifier == BPP_16:
                 raise NotImplementedError()
             elif self.bpp_identifier == BPP_32:
-                self.pixels = list(f.read(self.width * self.height * 4))
-                for i in range(0, len(self.pixels), 4):
-                    self.pixels[i], self.pixels[i + 2] = self.pixels[i + 2], self.pixels[i]
-                    self.pixels[i + 3] = 255  # TODO: the alpha channel seems to be used for various things
+                pixels = read_pixels(f, level.size)
+                bgra_to_rgba(pixels)  # TODO: the alpha channel seems to be used for various things
             elif self.bpp_identifier == BPP_S3TC_DXT1:
-                self.pixels = s3tc.decompress(s3tc.DXT1, self.width, self.height, f)
+                pixels = s3tc.decompress(s3tc.DXT1, level.width, level.height, f)
             elif self.bpp_identifier == BPP_S3TC_DXT3:
-                self.pixels = s3tc.decompress(s3tc.DXT3, self.width, self.height, f)
+                pixels = s3tc.decompress(s3tc.DXT3, level.width, level.height, f)
             elif self.bpp_identifier == BPP_S3TC_DXT5:
-                self.pixels = s3tc.decompress(s3tc.DXT5, self.width, self.height, f)
+                pixels = s3tc.decompress(s3tc.DXT5, level.width, level.height, f)
+            else:
+                raise NotImplementedError()
+
+        return pixels
 
     @property
     def texture_group(self):
@@ -1,5 +1,3 @@
-from ctypes import c_int
-
 # Lookup table for our hashin'
 # These values must be datamined,
 # I've included known values for the new PS2 stuff in NOLF 1.
@@ -42,35 +40,84 @@ HASH_LOOKUP = {
     ]
 }
 
+# Hashes are 32-bit, we mask our plain ints to that after every step
+HASH_MASK = 0xFFFFFFFF
+
 '''
 HashLookUp
 Original hash code reverse engineered from NOLF PS2 rez module
-Ported to Python, it relies on overflowing signed integers, hence the ctypes!
+Ported to Python, it relies on overflowing 32-bit integers, hence the masking!
+
+Hashes depend on the magic number, so each lookup builds its own {hash: name} index per category.
+Extra names can be loaded from wordlists (one name per line, # for comments, optional [category] headers.)
 '''
 class HashLookUp(object):
-    def __init__(self, magic_number):
+    def __init__(self, magic_number, wordlists=None):
         self._magic_number = magic_number
-        pass
 
-    def lookup_hash(self, hash_value, category):
-        for string in HASH_LOOKUP[category]:
+        # hash = hash + char + hash * magic, so we can fold it into one multiply
+        self._multiplier = (magic_number + 1) & HASH_MASK
+
+        # Category -> { unsigned hash: name }
+        self._index = {}
+
+        for category, names in HASH_LOOKUP.items():
+            self.add_names(names, category)
+
+        if wordlists is not None:
+            for path in wordlists:
+                self.load_wordlist(path)
 
-            hashed = self.hash(string)
-            if hashed == c_int(hash_value).value:
-                return string
+    # Earlier names win, so datamined names always beat wordlist guesses
+    def add_names(self, names, category):
+        index = self._index.setdefault(category, {})
+        for name in names:
+            index.setdefault(self.hash(name) & HASH_MASK, name)
 
-        return None
+    # Names before any [category] header (or all names, if category is set) go into `category`,
+    # if that's None they're added to every category
+    def load_wordlist(self, path, category=None):
+        sections = { category: [] }
+        current = category
+
+        with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+            for line in f:
+                line = line.strip()
+                if line == '' or line.startswith('#'):
+                    continue
+
+                # Category header, like [sockets]
+                if category is None and line.startswith('[') and line.endswith(']'):
+                    current = line[1:-1].strip()
+                    sections.setdefault(current, [])
+                    continue
+
+                sections[current].append(line)
+            # End For
+
+        for section, names in sections.items():
+            categories = [ section ] if section is not None else list(HASH_LOOKUP.keys())
+            for section_category in categories:
+                self.add_names(names, section_category)
+        # End For
+
+    def lookup_hash(self, hash_value, category):
+        return self._index.get(category, {}).get(hash_value & HASH_MASK)
 
     def hash(self, name):
-        hash_value = c_int(0)
+        hash_value = 0
         for char in name:
             char = char.upper()
             byte_char = ord(char)
             byte_char = byte_char & 0xFF
             if (byte_char == 0x2F):
                 byte_char = 0x5C
-            hash_value.value = hash_value.value + c_int(byte_char).value + hash_value.value * c_int(self._magic_number).value
-        return hash_value.value
+            hash_value = (hash_value * self._multiplier + byte_char) & HASH_MASK
+
+        # Return it signed, like the original
+        if hash_value & 0x80000000:
+            hash_value -= 0x100000000
+        return hash_value
 
 # End Class
 
@@ -3,6 +3,7 @@ import bpy_extras
 import bmesh
 import os
 import math
+import numpy as np
 from math import ceil
 from mathutils import Vector, Matrix
 from bpy.props import StringProperty, BoolProperty, FloatProperty
@@ -14,10 +15,17 @@ from .reader_abc_v6_pc import ABCV6ModelReader
 from .reader_abc_pc import ABCModelReader
 from .reader_ltb_pc import PCLTBModelReader
 from .reader_ltb_ps2 import PS2LTBModelReader
+from .cache import get_default_cache, read_model
 
+from . import abc
 from . import utils
 
 
+# Blender extensions keep their files in the extension's user directory, rather than the user's cache directory
+def get_parse_cache():
+    return get_default_cache(os.path.join(bpy.utils.extension_path_user(__package__, create=True), 'models'))
+
+
 class ModelImportOptions(object):
     should_merge_duplicate_verts = False
     should_import_animations = False
@@ -26,10 +34,292 @@ class ModelImportOptions(object):
     should_merge_pieces = False
     should_clear_scene = False
 
+    should_use_fast_mesh_build = True
+    should_use_fast_animation_import = True
+
     bone_length_min = 0.1
     image = None
 
 
+'''
+Returns a mask of the faces Blender won't accept: faces that use the same vertex twice,
+and repeats of an earlier face (in any winding.) The first copy of a repeated face is kept.
+'''
+def find_duplicate_faces(face_vertex_indices):
+    face_vertex_indices = np.asarray(face_vertex_indices, dtype=np.int64).reshape(-1, 3)
+    sorted_indices = np.sort(face_vertex_indices, axis=1)
+
+    is_duplicate = (sorted_indices[:, 0] == sorted_indices[:, 1]) | (sorted_indices[:, 1] == sorted_indices[:, 2])
+
+    # Pack the sorted indices into one key per face, so repeats can be found with a single sort
+    vertex_count = int(face_vertex_indices.max()) + 1 if len(face_vertex_indices) > 0 else 1
+    keys = (sorted_indices[:, 0] * vertex_count + sorted_indices[:, 1]) * vertex_count + sorted_indices[:, 2]
+    keys[is_duplicate] = -1 - np.arange(np.count_nonzero(is_duplicate))
+
+    _, first_indices = np.unique(keys, return_index=True)
+    is_repeat = np.ones(len(keys), dtype=bool)
+    is_repeat[first_indices] = False
+
+    return is_duplicate | is_repeat
+
+
+'''
+Fills an empty mesh straight from the LOD's arrays with foreach_set, rather than going through bmesh.
+lod is an abc.ArrayLOD (see ArrayLOD.from_lod.)
+'''
+def build_mesh(mesh, lod, material_index):
+    duplicate_faces = find_duplicate_faces(lod.face_vertex_indices)
+    if duplicate_faces.any():
+        print('WARNING: {} duplicate faces detected.'.format(np.count_nonzero(duplicate_faces)))
+
+    face_vertex_indices = lod.face_vertex_indices[~duplicate_faces].astype(np.int32)
+    face_texcoords = lod.face_texcoords[~duplicate_faces]
+    face_count = len(face_vertex_indices)
+
+    mesh.vertices.add(len(lod.locations))
+    mesh.vertices.foreach_set('co', lod.locations.astype(np.float32).ravel())
+
+    mesh.loops.add(face_count * 3)
+    mesh.loops.foreach_set('vertex_index', face_vertex_indices.ravel())
+
+    mesh.polygons.add(face_count)
+    mesh.polygons.foreach_set('loop_start', np.arange(0, face_count * 3, 3, dtype=np.int32))
+    mesh.polygons.foreach_set('material_index', np.full(face_count, material_index, dtype=np.int32))
+    mesh.polygons.foreach_set('use_smooth', np.ones(face_count, dtype=bool))
+
+    mesh.update(calc_edges=True)
+
+    ''' Assign texture coordinates. '''
+    uv_texture = mesh.uv_layers[material_index]
+    uv_texture.active = True
+    uv_texture.active_render = True
+
+    uvs = face_texcoords.astype(np.float32).reshape(-1, 2)
+    uvs[:, 1] = 1.0 - uvs[:, 1]
+    uv_texture.data.foreach_set('uv', uvs.ravel())
+
+    ''' Assign normals, every loop uses its vertex's normal. '''
+    mesh.normals_split_custom_set_from_vertices(lod.normals.astype(np.float32).tolist())
+
+
+'''
+Returns the LOD's weights grouped into (node index, bias, vertex indices) buckets,
+so each bucket can be added to its vertex group in one call. lod is an abc.ArrayLOD.
+VertexGroup.add takes a single weight, so blended meshes still need a call for each distinct bias a node has.
+'''
+def group_vertex_weights(lod, node_count):
+    weight_counts = np.diff(lod.weight_offsets)
+    vertex_indices = np.repeat(np.arange(len(weight_counts), dtype=np.int64), weight_counts)
+    node_indices = lod.weight_node_indices.astype(np.int64)
+    # Blender stores weights as floats, so biases that are equal at that precision can share a call
+    biases = lod.weight_biases.astype(np.float32)
+
+    # Weights are added with REPLACE, so if a vertex lists a node twice only the last one counts
+    keys = vertex_indices * max(node_count, 1) + node_indices
+    _, last_indices = np.unique(keys[::-1], return_index=True)
+    keep = np.sort(len(keys) - 1 - last_indices)
+    vertex_indices, node_indices, biases = vertex_indices[keep], node_indices[keep], biases[keep]
+
+    # Bucket by node first (stable, so vertices stay in order)...
+    order = np.argsort(node_indices, kind='stable')
+    vertex_indices, node_indices, biases = vertex_indices[order], node_indices[order], biases[order]
+
+    node_starts = np.flatnonzero(np.concatenate(([True], node_indices[1:] != node_indices[:-1])))
+    node_ends = np.append(node_starts[1:], len(order))
+
+    buckets = []
+    for start, end in zip(node_starts.tolist(), node_ends.tolist()):
+        if start == end:
+            continue
+
+        node_index = int(node_indices[start])
+        node_vertex_indices = vertex_indices[start:end]
+
+        # ...then by bias within the node
+        unique_biases, inverse = np.unique(biases[start:end], return_inverse=True)
+        if len(unique_biases) == 1:
+            buckets.append((node_index, float(unique_biases[0]), node_vertex_indices.tolist()))
+            continue
+
+        # Typical of blended meshes, every weight is its own call, so skip the sorting
+        if len(unique_biases) == end - start:
+            for vertex_index, bias in zip(node_vertex_indices.tolist(), biases[start:end].tolist()):
+                buckets.append((node_index, bias, [vertex_index]))
+            continue
+
+        by_bias = node_vertex_indices[np.argsort(inverse, kind='stable')]
+        bias_counts = np.bincount(inverse, minlength=len(unique_biases))
+        bias_ends = np.cumsum(bias_counts)
+        bias_starts = bias_ends - bias_counts
+
+        for bias, bias_start, bias_end in zip(unique_biases.tolist(), bias_starts.tolist(), bias_ends.tolist()):
+            buckets.append((node_index, bias, by_bias[bias_start:bias_end].tolist()))
+        # End For
+    # End For
+
+    return buckets
+
+
+# (..., 4) wxyz quaternions to (..., 3, 3) rotation matrices
+def quaternions_to_matrices(quaternions):
+    w, x, y, z = np.moveaxis(quaternions / np.linalg.norm(quaternions, axis=-1, keepdims=True), -1, 0)
+    return np.stack([
+        np.stack([1 - 2 * (y * y + z * z), 2 * (x * y - w * z), 2 * (x * z + w * y)], axis=-1),
+        np.stack([2 * (x * y + w * z), 1 - 2 * (x * x + z * z), 2 * (y * z - w * x)], axis=-1),
+        np.stack([2 * (x * z - w * y), 2 * (y * z + w * x), 1 - 2 * (x * x + y * y)], axis=-1),
+    ], axis=-2)
+
+
+# (..., 3, 3) rotation matrices to (..., 4) wxyz quaternions, with w kept positive like Blender does
+def matrices_to_quaternions(matrices):
+    m = matrices[..., :3, :3]
+    m00, m01, m02 = m[..., 0, 0], m[..., 0, 1], m[..., 0, 2]
+    m10, m11, m12 = m[..., 1, 0], m[..., 1, 1], m[..., 1, 2]
+    m20, m21, m22 = m[..., 2, 0], m[..., 2, 1], m[..., 2, 2]
+
+    # Work from whichever of w, x, y or z is largest, so we never divide by something tiny
+    candidates = np.stack([
+        np.stack([1 + m00 + m11 + m22, m21 - m12, m02 - m20, m10 - m01], axis=-1),
+        np.stack([m21 - m12, 1 + m00 - m11 - m22, m01 + m10, m02 + m20], axis=-1),
+        np.stack([m02 - m20, m01 + m10, 1 - m00 + m11 - m22, m12 + m21], axis=-1),
+        np.stack([m10 - m01, m02 + m20, m12 + m21, 1 - m00 - m11 + m22], axis=-1),
+    ], axis=-2)
+    best = np.argmax(np.stack([m00 + m11 + m22, m00, m11, m22], axis=-1), axis=-1)
+    quaternions = np.take_along_axis(candidates, best[..., None, None], axis=-2)[..., 0, :]
+
+    quaternions /= np.linalg.norm(quaternions, axis=-1, keepdims=True)
+    quaternions[quaternions[..., 0] < 0] *= -1
+    return quaternions
+
+
+'''
+Works out each pose bone's local (matrix_basis) location and rotation for every keyframe, without posing the armature.
+Keyframe transforms are relative to the parent node, and pose bones are relative to their rest pose,
+so this comes down to basis = rest^-1 @ parent_rest @ keyframe_transform.
+Returns (node, keyframe, 3) locations and (node, keyframe, 4) rotations, or None if the animation can't be handled here.
+'''
+def compute_pose_keyframes(model, animation, rest_matrices):
+    keyframes = animation.get_node_keyframe_array()
+    if keyframes is None or len(keyframes) != len(model.nodes):
+        return None
+
+    keyframes = np.asarray(keyframes, dtype=np.float64)
+    rotations = keyframes[..., 3:7].copy()
+    if model.version == 6 and model.flip_anim:
+        rotations[..., 1:] *= -1
+
+    transforms = np.zeros(keyframes.shape[:2] + (4, 4))
+    transforms[..., :3, :3] = quaternions_to_matrices(rotations)
+    transforms[..., :3, 3] = keyframes[..., 0:3]
+    transforms[..., 3, 3] = 1.0
+
+    rest_matrices = np.asarray(rest_matrices, dtype=np.float64).reshape(-1, 4, 4)
+    offsets = np.linalg.inv(rest_matrices)
+    for node_index, node in enumerate(model.nodes):
+        if node.parent is not None:
+            offsets[node_index] = offsets[node_index] @ rest_matrices[model.nodes.index(node.parent)]
+    # End For
+
+    basis = offsets[:, None] @ transforms
+    return basis[..., :3, 3], matrices_to_quaternions(basis)
+
+
+'''
+Creates the location and rotation_quaternion F-curves for every bone on `action`,
+and fills them in one go with foreach_set rather than a keyframe_insert per bone per keyframe.
+Blender 4.4+ keeps F-curves in action slots, so there the curves go through fcurve_ensure_for_datablock,
+which needs the action (and its slot) assigned to the armature first. Older versions use action.fcurves.new.
+'''
+def populate_action(action, armature_object, model, animation, locations, rotations):
+    use_slots = hasattr(action, 'fcurve_ensure_for_datablock')
+    if use_slots:
+        animation_data = armature_object.animation_data
+        if animation_data.action != action:
+            animation_data.action = action
+        if animation_data.action_slot is None:
+            animation_data.action_slot = action.slots.new(id_type='OBJECT', name=armature_object.name)
+    # End If
+
+    frames = np.array([keyframe.time for keyframe in animation.keyframes], dtype=np.float64) * get_framerate()
+    keyframe_points = np.empty((len(frames), 2), dtype=np.float32)
+    keyframe_points[:, 0] = frames
+
+    for node_index, node in enumerate(model.nodes):
+        pose_bone = armature_object.pose.bones[node_index]
+
+        for data_path, values in ((pose_bone.path_from_id('location'), locations[node_index]),
+                                  (pose_bone.path_from_id('rotation_quaternion'), rotations[node_index])):
+            for index in range(values.shape[1]):
+                if use_slots:
+                    fcurve = action.fcurve_ensure_for_datablock(armature_object, data_path, index=index, group_name=pose_bone.name)
+                else:
+                    fcurve = action.fcurves.new(data_path, index=index, action_group=pose_bone.name)
+                fcurve.keyframe_points.add(len(frames))
+                keyframe_points[:, 1] = values[:, index]
+                fcurve.keyframe_points.foreach_set('co', keyframe_points.ravel())
+                fcurve.update()
+            # End For
+        # End For
+    # End For
+
+
+'''
+Finds the vertices that are moved by vertex animation (ABC v6), and where each one is in its node's md_vert_list.
+Returns (vertex indices, node indices, md_vert slots) arrays.
+'''
+def map_vertex_animation(model, lod, vertex_count):
+    vertex_indices = []
+    node_indices = []
+    slots = []
+
+    # md_vert_list.index() for every vertex is far too slow on big meshes, so look them up once per node
+    node_slots = {}
+    for vertex_index, vertex in enumerate(lod.vertices[:vertex_count]):
+        if len(vertex.weights) == 0:
+            continue
+
+        node_index = vertex.weights[0].node_index
+        node = model.nodes[node_index]
+        if node.md_vert_count == 0:
+            continue
+
+        if node_index not in node_slots:
+            node_slots[node_index] = {}
+            for slot, md_vert_index in enumerate(node.md_vert_list):
+                node_slots[node_index].setdefault(md_vert_index, slot)
+        # End If
+
+        vertex_indices.append(vertex_index)
+        node_indices.append(node_index)
+        slots.append(node_slots[node_index][vertex_index])
+    # End For
+
+    return np.array(vertex_indices, dtype=np.int64), np.array(node_indices, dtype=np.int64), np.array(slots, dtype=np.int64)
+
+
+'''
+Moves every node's vertex deformations for `animation` into model space with the node's bind matrix.
+Returns the deformations of all nodes as one (count, 3) array, along with where each node's deformations start in it.
+'''
+def transform_vertex_deformations(model, animation):
+    starts = np.zeros(len(model.nodes), dtype=np.int64)
+    deformations = [np.zeros((0, 3))]
+
+    offset = 0
+    for node_index, node in enumerate(model.nodes):
+        starts[node_index] = offset
+        if len(animation.vertex_deformations[node_index]) == 0:
+            continue
+
+        locations = np.array([deformation.location for deformation in animation.vertex_deformations[node_index]], dtype=np.float64).reshape(-1, 3)
+        bind_matrix = np.array(node.bind_matrix)
+        deformations.append(locations @ bind_matrix[:3, :3].T + bind_matrix[:3, 3])
+        offset += len(locations)
+    # End For
+
+    return np.concatenate(deformations), starts
+
+
 def import_model(model, options: ModelImportOptions):
     if options.should_clear_scene:
         utils.clear_scene()
@@ -144,7 +434,8 @@ def import_model(model, options: ModelImportOptions):
             # Note: Texture image names are stored in ModelButes.txt
             if options.image is not None:
                 texture.image = bpy.data.images.new(piece.name, width=options.image.width, height=options.image.height, alpha=True)  # TODO: get real name
-                texture.image.pixels[:] = options.image.pixels[:]
+                # Blender wants 0-1 floats, foreach_set takes the whole buffer in one call
+                texture.image.pixels.foreach_set(np.asarray(options.image.pixels, dtype=np.float32) / 255.0)
 
             texImage.image = texture.image
 
@@ -153,6 +444,9 @@ def import_model(model, options: ModelImportOptions):
         for piece_index, piece in enumerate(model.pieces):
             lod = piece.lods[lod_index]
 
+            # The mesh and weights are built from arrays, so object LODs (PS2, ABC v6) are converted once here
+            array_lod = abc.ArrayLOD.from_lod(lod)
+
             ''' Create the object and mesh. '''
             mesh_name = piece.name
             if options.should_import_lods:
@@ -176,82 +470,85 @@ def import_model(model, options: ModelImportOptions):
             for node in model.nodes:
                 mesh_object.vertex_groups.new(name=node.name)
 
-            # TODO: these need to be reset for each mesh
-            vertex_offset = 0
-            face_offset = 0
-
-            ''' Populate the actual mesh data. '''
-            bm = bmesh.new()
-            bm.from_mesh(mesh)
+            if options.should_use_fast_mesh_build:
+                build_mesh(mesh, array_lod, piece.material_index)
+            else:
+                # TODO: these need to be reset for each mesh
+                vertex_offset = 0
+                face_offset = 0
 
-            for vertex in lod.vertices:
-                bm.verts.new(vertex.location)
+                ''' Populate the actual mesh data. '''
+                bm = bmesh.new()
+                bm.from_mesh(mesh)
 
-            bm.verts.ensure_lookup_table()
-            duplicate_face_indices = []
-            for face_index, face in enumerate(lod.faces):
-                face = [bm.verts[vertex_offset + vertex.vertex_index] for vertex in face.vertices]
-                try:
-                    bmface = bm.faces.new(face)
-                except ValueError:
+                for vertex in lod.vertices:
+                    bm.verts.new(vertex.location)
+
+                bm.verts.ensure_lookup_table()
+                duplicate_face_indices = []
+                for face_index, face in enumerate(lod.faces):
+                    face = [bm.verts[vertex_offset + vertex.vertex_index] for vertex in face.vertices]
+                    try:
+                        bmface = bm.faces.new(face)
+                    except ValueError:
+                        '''
+                        This face is a duplicate of another face, which is disallowed by Blender.
+                        Mark this face for deletion after iteration.
+                        '''
+                        duplicate_face_indices.append(face_index)
+                        continue
                     '''
-                    This face is a duplicate of another face, which is disallowed by Blender.
-                    Mark this face for deletion after iteration.
+                    Assign the material index of face based on the piece's material index.
                     '''
-                    duplicate_face_indices.append(face_index)
-                    continue
+                    bmface.material_index = model.pieces[piece_index].material_index
+                    bmface.smooth = True
+
+                bm.faces.ensure_lookup_table()
+
+                '''
+                Warn the user of the number of duplicate faces detected, if any.
+                '''
+                if len(duplicate_face_indices) > 0:
+                    print('WARNING: {} duplicate faces detected.'.format(len(duplicate_face_indices)))
+
+                '''
+                Delete any of the duplicate faces from the mesh.
                 '''
-                Assign the material index of face based on the piece's material index.
+                for face_index in reversed(sorted(duplicate_face_indices)):
+                    del lod.faces[face_index]
+
+                vertex_offset += len(lod.vertices)
+                face_offset += len(lod.faces)
+
+                bm.to_mesh(mesh)
+                bm.free()
+
+                '''
+                Assign texture coordinates.
                 '''
-                bmface.material_index = model.pieces[piece_index].material_index
-                bmface.smooth = True
-
-            bm.faces.ensure_lookup_table()
-
-            '''
-            Warn the user of the number of duplicate faces detected, if any.
-            '''
-            if len(duplicate_face_indices) > 0:
-                print('WARNING: {} duplicate faces detected.'.format(len(duplicate_face_indices)))
-
-            '''
-            Delete any of the duplicate faces from the mesh.
-            '''
-            for face_index in reversed(sorted(duplicate_face_indices)):
-                del lod.faces[face_index]
-
-            vertex_offset += len(lod.vertices)
-            face_offset += len(lod.faces)
-
-            bm.to_mesh(mesh)
-            bm.free()
-
-            '''
-            Assign texture coordinates.
-            '''
-            material_face_offsets = [0] * len(mesh.materials)
-            uv_texture = mesh.uv_layers[piece.material_index]
-
-            # Set the correct UV as active
-            uv_texture.active = True
-            uv_texture.active_render = True
-
-            for face_index, face in enumerate(lod.faces):
-                material_face_offset = material_face_offsets[0]  # TODO: is this right?
-                texcoords = [vertex.texcoord for vertex in face.vertices]
-                for i in range(3):
-                    uv = texcoords[i][0], 1.0 - texcoords[i][1]
-                    uv_texture.data[(material_face_offset + face_index) * 3 + i].uv = uv
-            material_face_offsets[0] += len(lod.faces)
-
-            ''' Assign normals '''
-            normals = []
-            for polygon in mesh.polygons:
-                for loop_index in polygon.loop_indices:
-                    vertex_index = mesh.loops[loop_index].vertex_index
-                    normal = Vector(lod.vertices[vertex_index].normal)
-                    normals.append(normal)
-            mesh.normals_split_custom_set(normals)
+                material_face_offsets = [0] * len(mesh.materials)
+                uv_texture = mesh.uv_layers[piece.material_index]
+
+                # Set the correct UV as active
+                uv_texture.active = True
+                uv_texture.active_render = True
+
+                for face_index, face in enumerate(lod.faces):
+                    material_face_offset = material_face_offsets[0]  # TODO: is this right?
+                    texcoords = [vertex.texcoord for vertex in face.vertices]
+                    for i in range(3):
+                        uv = texcoords[i][0], 1.0 - texcoords[i][1]
+                        uv_texture.data[(material_face_offset + face_index) * 3 + i].uv = uv
+                material_face_offsets[0] += len(lod.faces)
+
+                ''' Assign normals '''
+                normals = []
+                for polygon in mesh.polygons:
+                    for loop_index in polygon.loop_indices:
+                        vertex_index = mesh.loops[loop_index].vertex_index
+                        normal = Vector(lod.vertices[vertex_index].normal)
+                        normals.append(normal)
+                mesh.normals_split_custom_set(normals)
 
             mesh.validate(clean_customdata=False)
             mesh.update(calc_edges=False)
@@ -271,13 +568,9 @@ def import_model(model, options: ModelImportOptions):
             armature_modifier.show_on_cage = True
 
             ''' Assign vertex weighting. '''
-            vertex_offset = 0
-            for (vertex_index, vertex) in enumerate(lod.vertices):
-                for weight in vertex.weights:
-                    vertex_group_name = model.nodes[weight.node_index].name
-                    vertex_group = mesh_object.vertex_groups[vertex_group_name]
-                    vertex_group.add([vertex_offset + vertex_index], weight.bias, 'REPLACE')
-            vertex_offset += len(lod.vertices)
+            vertex_groups = [mesh_object.vertex_groups[node.name] for node in model.nodes]
+            for node_index, bias, vertex_indices in group_vertex_weights(array_lod, len(model.nodes)):
+                vertex_groups[node_index].add(vertex_indices, bias, 'REPLACE')
 
             # Work-around for PC LTB meshes having overlapping but not connected vertices...
             if options.should_merge_duplicate_verts:
@@ -301,15 +594,28 @@ def import_model(model, options: ModelImportOptions):
         armature_object.animation_data_create()
 
         if options.should_import_vertex_animations:
+            # Which vertices each object's shape keys move, and where they start from
+            vertex_animation_maps = {}
+            neutral_coords = {}
+            md_vert_counts = np.array([node.md_vert_count for node in model.nodes], dtype=np.int64)
+
             for obj in armature_object.children:
                 obj.shape_key_add(name="neutral_pose", from_mix=False)
                 # we'll animate using mesh.shape_keys.eval_time
                 mesh.shape_keys.animation_data_create()
                 mesh.shape_keys.use_relative = False
 
+                vertex_count = len(obj.data.vertices)
+                vertex_animation_maps[obj.name] = map_vertex_animation(model, model.pieces[0].lods[0], vertex_count)
+                neutral_coords[obj.name] = np.empty(vertex_count * 3, dtype=np.float32)
+                obj.data.vertices.foreach_get('co', neutral_coords[obj.name])
+                neutral_coords[obj.name] = neutral_coords[obj.name].reshape(-1, 3)
+
         actions = []
         md_actions = []
 
+        rest_matrices = [np.array(pose_bone.bone.matrix_local) for pose_bone in armature_object.pose.bones]
+
         index = 0
         processed_frame_count = 1  # 1 for neutral_pose
         for animation in model.animations:
@@ -327,52 +633,62 @@ def import_model(model, options: ModelImportOptions):
                 md_action = Data.actions.new(name="d_%s" % (animation.name))
                 mesh.shape_keys.animation_data.action = md_action
 
+                vertex_deformations, deformation_starts = transform_vertex_deformations(model, animation)
+
+            # Write the F-curves directly if we can, otherwise pose and key every bone on every keyframe below
+            pose_keyframes = None
+            if options.should_use_fast_animation_import:
+                pose_keyframes = compute_pose_keyframes(model, animation, rest_matrices)
+                if pose_keyframes is not None:
+                    populate_action(action, armature_object, model, animation, *pose_keyframes)
+
             # For every keyframe
             for keyframe_index, keyframe in enumerate(animation.keyframes):
                 # Set keyframe time - Scale it down to the default blender animation framerate (25fps)
                 subframe_time = keyframe.time * get_framerate()
 
-                # Apply transforms with respect to their parent's transforms
-                transform_stack = [None]
-                current_index = 0
-                while len(transform_stack) > 0:
-                    node_index = current_index
-                    parent_matrix = transform_stack.pop()
+                if pose_keyframes is None:
+                    # Apply transforms with respect to their parent's transforms
+                    transform_stack = [None]
+                    current_index = 0
+                    while len(transform_stack) > 0:
+                        node_index = current_index
+                        parent_matrix = transform_stack.pop()
 
-                    node = model.nodes[node_index]
-                    pose_bone = armature_object.pose.bones[node_index]
+                        node = model.nodes[node_index]
+                        pose_bone = armature_object.pose.bones[node_index]
 
-                    # Get the current transform
-                    transform = animation.node_keyframe_transforms[node_index][keyframe_index]
+                        # Get the current transform
+                        transform = animation.node_keyframe_transforms[node_index][keyframe_index]
 
-                    mat_scale = Matrix()
+                        mat_scale = Matrix()
 
-                    if model.version == 6 and model.flip_anim:
-                        transform.rotation.conjugate()
-                    # End
+                        if model.version == 6 and model.flip_anim:
+                            transform.rotation.conjugate()
+                        # End
 
-                    # Form our animation matrix
-                    mat_rot = transform.rotation.to_matrix()
-                    mat_loc = Matrix.Translation(transform.location)
-                    matrix = mat_loc @ mat_rot.to_4x4() @ mat_scale
+                        # Form our animation matrix
+                        mat_rot = transform.rotation.to_matrix()
+                        mat_loc = Matrix.Translation(transform.location)
+                        matrix = mat_loc @ mat_rot.to_4x4() @ mat_scale
 
-                    # If we have a parent, make sure to apply their matrix with ours to get position relative to our parent
-                    # otherwise just use our matrix
-                    if parent_matrix is not None:
-                        matrix = parent_matrix @ matrix
+                        # If we have a parent, make sure to apply their matrix with ours to get position relative to our parent
+                        # otherwise just use our matrix
+                        if parent_matrix is not None:
+                            matrix = parent_matrix @ matrix
 
-                    pose_bone.matrix = matrix
+                        pose_bone.matrix = matrix
 
-                    for _ in range(0, node.child_count):
-                        transform_stack.append(pose_bone.matrix)
+                        for _ in range(0, node.child_count):
+                            transform_stack.append(pose_bone.matrix)
 
-                    current_index += 1
+                        current_index += 1
 
-                # For every bone
-                for bone, node in zip(armature_object.pose.bones, model.nodes):
-                    bone.keyframe_insert('location', frame=subframe_time)
-                    bone.keyframe_insert('rotation_quaternion', frame=subframe_time)
-                # End For
+                    # For every bone
+                    for bone, node in zip(armature_object.pose.bones, model.nodes):
+                        bone.keyframe_insert('location', frame=subframe_time)
+                        bone.keyframe_insert('rotation_quaternion', frame=subframe_time)
+                    # End For
 
                 if options.should_import_vertex_animations:
                     # shape keys, here I go!
@@ -380,18 +696,12 @@ def import_model(model, options: ModelImportOptions):
                         # create our shape key
                         shape_key = obj.shape_key_add(name="%s_%d" % (animation.name, keyframe_index), from_mix=False)
 
-                        for vert_index, vert in enumerate(obj.data.vertices):
-                            our_vert_index = vert_index
-                            node_index = model.pieces[0].lods[0].vertices[our_vert_index].weights[0].node_index
-                            node = model.nodes[node_index]
-
-                            if node.md_vert_count > 0:
-                                md_vert = node.md_vert_list.index(our_vert_index) + (keyframe_index * node.md_vert_count)
+                        vertex_indices, node_indices, slots = vertex_animation_maps[obj.name]
+                        md_vert_indices = deformation_starts[node_indices] + slots + keyframe_index * md_vert_counts[node_indices]
 
-                                vertex_transform = animation.vertex_deformations[node_index][md_vert].location
-                                shape_key.data[vert_index].co = node.bind_matrix @ vertex_transform
-                            # End If
-                        # End For
+                        coords = neutral_coords[obj.name].copy()
+                        coords[vertex_indices] = vertex_deformations[md_vert_indices]
+                        shape_key.data.foreach_set('co', coords.ravel())
                     # End For
 
                     mesh.shape_keys.eval_time = shape_key.frame
@@ -500,12 +810,30 @@ class ImportOperatorABC(bpy.types.Operator, bpy_extras.io_utils.ImportHelper):
         default=False,
     )
 
+    should_use_fast_animation_import: BoolProperty(
+        name="Fast Animation Import",
+        description="When checked, bone animation F-curves are filled in directly instead of posing and keying every bone on every keyframe.",
+        default=True,
+    )
+
     should_clear_scene: BoolProperty(
         name="Clear Scene",
         description="When checked, the scene will be cleared before the model is imported.",
         default=False,
     )
 
+    should_use_fast_mesh_build: BoolProperty(
+        name="Fast Mesh Build",
+        description="When checked, meshes are built directly from arrays instead of through bmesh. Uncheck if a mesh imports incorrectly.",
+        default=True,
+    )
+
+    should_use_parse_cache: BoolProperty(
+        name="Use Parse Cache",
+        description="When checked, parsed models are cached on disk so importing the same file again is faster.",
+        default=True,
+    )
+
     def draw(self, context):
         layout = self.layout
 
@@ -518,6 +846,7 @@ class ImportOperatorABC(bpy.types.Operator, bpy_extras.io_utils.ImportHelper):
         box.label(text='Meshes')
         box.row().prop(self, 'should_import_lods')
         box.row().prop(self, 'should_merge_pieces')
+        box.row().prop(self, 'should_use_fast_mesh_build')
 
         box = layout.box()
         box.label(text='Materials')
@@ -527,18 +856,21 @@ class ImportOperatorABC(bpy.types.Operator, bpy_extras.io_utils.ImportHelper):
         box = layout.box()
         box.label(text='Animations')
         box.row().prop(self, 'should_import_animations')
+        box.row().prop(self, 'should_use_fast_animation_import')
         box.row().prop(self, 'should_import_vertex_animations')
 
         box = layout.box()
         box.label(text='Misc')
         box.row().prop(self, 'should_clear_scene')
+        box.row().prop(self, 'should_use_parse_cache')
 
     def execute(self, context):
         # Load the model
+        parse_cache = get_parse_cache() if self.should_use_parse_cache else None
         try:
-            model = ABCModelReader().from_file(self.filepath)
+            model = read_model(ABCModelReader(), self.filepath, parse_cache)
         except Exception:
-            model = ABCV6ModelReader().from_file(self.filepath)
+            model = read_model(ABCV6ModelReader(), self.filepath, parse_cache)
 
         model.name = os.path.splitext(os.path.basename(self.filepath))[0]
         image = None
@@ -558,6 +890,8 @@ class ImportOperatorABC(bpy.types.Operator, bpy_extras.io_utils.ImportHelper):
         options.should_import_sockets = self.should_import_sockets
         options.should_merge_pieces = self.should_merge_pieces
         options.should_clear_scene = self.should_clear_scene
+        options.should_use_fast_mesh_build = self.should_use_fast_mesh_build
+        options.should_use_fast_animation_import = self.should_use_fast_animation_import
         options.image = image
         import_model(model, options)
         return {'FINISHED'}
@@ -622,6 +956,12 @@ class ImportOperatorLTB(bpy.types.Operator, bpy_extras.io_utils.ImportHelper):
         default=False,
     )
 
+    should_use_fast_animation_import: BoolProperty(
+        name="Fast Animation Import",
+        description="When checked, bone animation F-curves are filled in directly instead of posing and keying every bone on every keyframe.",
+        default=True,
+    )
+
     should_clear_scene: BoolProperty(
         name="Clear Scene",
         description="When checked, the scene will be cleared before the model is imported.",
@@ -634,6 +974,18 @@ class ImportOperatorLTB(bpy.types.Operator, bpy_extras.io_utils.ImportHelper):
         default=True,
     )
 
+    should_use_fast_mesh_build: BoolProperty(
+        name="Fast Mesh Build",
+        description="When checked, meshes are built directly from arrays instead of through bmesh. Uncheck if a mesh imports incorrectly.",
+        default=True,
+    )
+
+    should_use_parse_cache: BoolProperty(
+        name="Use Parse Cache",
+        description="When checked, parsed models are cached on disk so importing the same file again is faster.",
+        default=True,
+    )
+
     def draw(self, context):
         layout = self.layout
 
@@ -647,6 +999,7 @@ class ImportOperatorLTB(bpy.types.Operator, bpy_extras.io_utils.ImportHelper):
         box.row().prop(self, 'should_merge_duplicate_verts')
         # box.row().prop(self, 'should_import_lods')
         # box.row().prop(self, 'should_merge_pieces')
+        box.row().prop(self, 'should_use_fast_mesh_build')
 
         # box = layout.box()
         # box.label(text='Materials')
@@ -656,18 +1009,21 @@ class ImportOperatorLTB(bpy.types.Operator, bpy_extras.io_utils.ImportHelper):
         box = layout.box()
         box.label(text='Animations')
         box.row().prop(self, 'should_import_animations')
+        box.row().prop(self, 'should_use_fast_animation_import')
 
         box = layout.box()
         box.label(text='Misc')
         box.row().prop(self, 'should_clear_scene')
+        box.row().prop(self, 'should_use_parse_cache')
 
     def execute(self, context):
 
         # Load the model
+        parse_cache = get_parse_cache() if self.should_use_parse_cache else None
         try:
-            model = PCLTBModelReader().from_file(self.filepath)
+            model = read_model(PCLTBModelReader(), self.filepath, parse_cache)
         except Exception:
-            model = PS2LTBModelReader().from_file(self.filepath)
+            model = read_model(PS2LTBModelReader(), self.filepath, parse_cache)
 
         model.name = os.path.splitext(os.path.basename(self.filepath))[0]
         image = None
@@ -687,6 +1043,8 @@ class ImportOperatorLTB(bpy.types.Operator, bpy_extras.io_utils.ImportHelper):
         options.should_import_sockets = self.should_import_sockets
         options.should_merge_pieces = self.should_merge_pieces
         options.should_clear_scene = self.should_clear_scene
+        options.should_use_fast_mesh_build = self.should_use_fast_mesh_build
+        options.should_use_fast_animation_import = self.should_use_fast_animation_import
         options.should_merge_duplicate_verts = self.should_merge_duplicate_verts
         options.image = image
         import_model(model, options)
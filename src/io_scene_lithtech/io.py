@@ -1,4 +1,7 @@
+import mmap
+import os
 import struct
+import numpy as np
 
 '''
 Utility functions for reading from the file.
@@ -7,9 +10,136 @@ fmt reference:
 https://docs.python.org/3/library/struct.html#format-characters
 
 '''
+
+# Compiled struct objects, keyed by their format string.
+# Formats are parsed once and re-used for the lifetime of the addon.
+_struct_cache = {}
+
+
+def get_struct(fmt):
+    compiled = _struct_cache.get(fmt)
+    if compiled is None:
+        compiled = struct.Struct(fmt)
+        _struct_cache[fmt] = compiled
+    return compiled
+
+
+'''
+BinaryReader
+Wraps an in-memory buffer and walks it with an offset cursor.
+It quacks like a binary file object (read/seek/tell) so the readers can use it as a drop-in,
+but `unpack` goes straight through `unpack_from` instead of slicing out a new bytes object per scalar.
+'''
+class BinaryReader(object):
+    def __init__(self, data, name=''):
+        self._view = memoryview(data)
+        self._offset = 0
+        self._mapped = None
+        self.name = name
+
+    # With use_mmap the file is mapped read-only and parsed in place,
+    # which avoids pulling the whole file through read() on slow (network) disks.
+    # `path` can also be an open binary file object (like a file inside an Arch02), which is read in full.
+    @classmethod
+    def from_file(cls, path, use_mmap=False):
+        if not isinstance(path, (str, bytes, os.PathLike)):
+            return cls(path.read(), source_path(path))
+
+        with open(path, 'rb') as f:
+            if use_mmap:
+                try:
+                    mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                except ValueError:
+                    # Empty files can't be mapped, just fall through to a regular read
+                    mapped = None
+
+                if mapped is not None:
+                    reader = cls(mapped, path)
+                    reader._mapped = mapped
+                    return reader
+            # End If
+            return cls(f.read(), path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return len(self._view)
+
+    @property
+    def view(self):
+        return self._view
+
+    # Arrays made with np.frombuffer(view) can outlive the reader (a traceback frame is enough to keep one alive),
+    # and neither the view nor the mmap can be closed while they do. Then we only drop our references,
+    # and the mmap is closed when the last array goes, rather than raising over whatever error got us here.
+    def close(self):
+        try:
+            self._view.release()
+            if self._mapped is not None:
+                self._mapped.close()
+        except BufferError:
+            pass
+        self._mapped = None
+
+    def unpack(self, fmt):
+        compiled = get_struct(fmt)
+        values = compiled.unpack_from(self._view, self._offset)
+        self._offset += compiled.size
+        return values
+
+    # Reads `count` records of `dtype` in one go.
+    # The result is a copy, so it stays valid after the reader (and any mmap) is closed.
+    def read_array(self, dtype, count):
+        array = np.frombuffer(self._view, dtype=dtype, count=count, offset=self._offset).copy()
+        self._offset += array.nbytes
+        return array
+
+    # Byte search over the underlying buffer (bytes or mmap), without copying it
+    def find(self, sub, start=0):
+        return self._view.obj.find(sub, start)
+
+    def read(self, size=-1):
+        start = self._offset
+        end = len(self._view) if size < 0 else min(start + size, len(self._view))
+        self._offset = max(start, end)
+        return self._view[start:end].tobytes()
+
+    def seek(self, offset, whence=0):
+        if whence == 0:
+            self._offset = offset
+        elif whence == 1:
+            self._offset += offset
+        elif whence == 2:
+            self._offset = len(self._view) + offset
+        else:
+            raise ValueError('Invalid whence ({})'.format(whence))
+
+        if self._offset < 0:
+            raise ValueError('Negative seek position {}'.format(self._offset))
+
+        return self._offset
+
+    def tell(self):
+        return self._offset
+
+
+# The path behind a source given to a reader, which is either a path or a file object
+def source_path(source):
+    if isinstance(source, (str, bytes, os.PathLike)):
+        return os.fsdecode(source)
+    return getattr(source, 'name', '')
+
+
 def unpack(fmt, f):
-    return struct.unpack(fmt, f.read(struct.calcsize(fmt)))
+    if isinstance(f, BinaryReader):
+        return f.unpack(fmt)
+    compiled = get_struct(fmt)
+    return compiled.unpack(f.read(compiled.size))
 
 
 def pack(fmt, f, values):
-    f.write(struct.pack(fmt, values))
+    f.write(get_struct(fmt).pack(values))
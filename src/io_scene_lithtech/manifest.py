@@ -0,0 +1,148 @@
+import json
+import os
+
+from .cache import CODE_INPUTS, code_version, hash_file, module_name
+from .cli import READERS
+from .writer_abc_pc import ABCModelWriter
+from .writer_abc_v6_pc import ABCV6ModelWriter
+from .writer_lta_pc import LTAModelWriter
+
+'''
+Conversion Manifest
+Remembers what each batch converted output was made from, so re-running a batch only converts what changed.
+
+Each output has an entry with the source file's hash, the reader and writer used (and a hash of their code), the options
+and the output file's hash. An output is skipped if all of those still match.
+Sizes and modification times are stored too, so unchanged files don't need hashing again.
+'''
+
+# Bump this if the entry layout changes
+MANIFEST_FORMAT_VERSION = 1
+
+DEFAULT_MANIFEST_NAME = 'lithtech-manifest.json'
+
+
+def class_name(cls):
+    return '%s.%s' % (cls.__module__, cls.__qualname__)
+
+
+READER_TYPES = { class_name(reader_type): reader_type for reader_types in READERS.values() for reader_type in reader_types }
+WRITER_TYPES = { class_name(writer_type): writer_type for writer_type in (LTAModelWriter, ABCModelWriter, ABCV6ModelWriter) }
+
+
+# Same code inputs as the parse cache uses
+def reader_version(reader_type):
+    return code_version(module_name(reader_type), *CODE_INPUTS)
+
+
+# PS2 models go through the stubber before they're written, so it's counted as part of the writer.
+# cli picks the default output version and whether the stubber runs, so it's counted too
+def writer_version(writer_type):
+    return code_version(module_name(writer_type), *CODE_INPUTS, 'stubber', 'cli')
+
+
+def file_stat(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+class ConversionManifest(object):
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+
+    def load(self):
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return self
+
+        # Older layouts are dropped, which just means converting everything once more
+        if data.get('format') == MANIFEST_FORMAT_VERSION:
+            self.entries = data.get('entries', {})
+        return self
+
+    def save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+
+        # Write to a temporary file first, so a half written manifest is never loaded
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump({ 'format': MANIFEST_FORMAT_VERSION, 'entries': self.entries }, f, indent=1, sort_keys=True)
+        os.replace(temp_path, self.path)
+
+    @staticmethod
+    def key(output_path):
+        return os.path.abspath(output_path)
+
+    @staticmethod
+    def _file_matches(entry, prefix, path):
+        '''
+        Checks path against the size, mtime and hash stored under prefix. The hash is only checked if the size or mtime changed,
+        and if it still matches the new size and mtime are kept.
+        '''
+        try:
+            size, mtime_ns = file_stat(path)
+        except OSError:
+            return False
+
+        if entry.get(prefix + '_size') == size and entry.get(prefix + '_mtime_ns') == mtime_ns:
+            return True
+
+        if size != entry.get(prefix + '_size') or hash_file(path) != entry.get(prefix + '_hash'):
+            return False
+
+        entry[prefix + '_mtime_ns'] = mtime_ns
+        return True
+
+    def is_up_to_date(self, job, options):
+        entry = self.entries.get(self.key(job.output_path))
+        if entry is None:
+            return False
+
+        if entry.get('input') != os.path.abspath(job.input_path):
+            return False
+
+        # Requested options, the version actually written is stored separately
+        if entry.get('options') != [options.reader, options.output_format, options.version]:
+            return False
+
+        reader_type = READER_TYPES.get(entry.get('reader'))
+        writer_type = WRITER_TYPES.get(entry.get('writer'))
+        if reader_type is None or writer_type is None:
+            return False
+        if entry.get('reader_version') != reader_version(reader_type) or entry.get('writer_version') != writer_version(writer_type):
+            return False
+
+        # Also catches outputs that were deleted or edited by hand
+        return self._file_matches(entry, 'source', job.input_path) and self._file_matches(entry, 'output', job.output_path)
+
+    def record(self, job, options, result):
+        '''
+        Adds the entry for a successful conversion. result is the report entry from batch.run_job,
+        the sizes and mtimes in it were taken by the worker before hashing each file.
+        '''
+        reader_type = READER_TYPES[result['reader']]
+        writer_type = WRITER_TYPES[result['writer']]
+        source_size, source_mtime_ns = result['source_stat']
+        output_size, output_mtime_ns = result['output_stat']
+
+        self.entries[self.key(job.output_path)] = {
+            'input': os.path.abspath(job.input_path),
+            'options': [options.reader, options.output_format, options.version],
+            'version': result['version'],
+            'reader': result['reader'],
+            'reader_version': reader_version(reader_type),
+            'writer': result['writer'],
+            'writer_version': writer_version(writer_type),
+            'source_hash': result['source_hash'],
+            'source_size': source_size,
+            'source_mtime_ns': source_mtime_ns,
+            'output_hash': result['output_hash'],
+            'output_size': output_size,
+            'output_mtime_ns': output_mtime_ns,
+        }
+
+    def forget(self, job):
+        self.entries.pop(self.key(job.output_path), None)
@@ -0,0 +1,494 @@
+import math
+import numpy as np
+from array import array
+
+'''
+Mathutils Shim
+Pure python stand-ins for mathutils' Vector, Quaternion and Matrix, so models can be read and written outside of Blender.
+
+Only the parts of the API that the readers and writers use are here, and they follow mathutils' conventions:
+matrices are indexed by row, `matrix[i]` is a Vector that writes through to the matrix,
+quaternions are (w, x, y, z), and a 3d vector multiplied by a 4x4 matrix is treated as a point.
+Values are stored as 32 bit floats like mathutils does, so written files come out the same either way.
+
+Don't import this directly, use `from .vector_math import Vector, Quaternion, Matrix` which picks the real mathutils when it's around.
+'''
+
+
+def _floats(values):
+    return array('f', [float(value) for value in values])
+
+
+class Vector(object):
+    __hash__ = None
+
+    def __init__(self, seq=(0.0, 0.0, 0.0)):
+        self._values = _floats(seq)
+
+    # Wraps `values` without copying it, used for matrix rows
+    @classmethod
+    def _wrap(cls, values):
+        vector = cls.__new__(cls)
+        vector._values = values
+        return vector
+
+    def __len__(self):
+        return len(self._values)
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple(self._values[index])
+        return self._values[index]
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            values = _floats(value)
+            if len(values) != len(self._values[index]):
+                raise ValueError('Vector[a:b] = value: size mismatch')
+            self._values[index] = values
+            return
+        self._values[index] = float(value)
+
+    def _get_axis(index):
+        def getter(self):
+            return self._values[index]
+
+        def setter(self, value):
+            self._values[index] = float(value)
+
+        return property(getter, setter)
+
+    x = _get_axis(0)
+    y = _get_axis(1)
+    z = _get_axis(2)
+    w = _get_axis(3)
+
+    def _get_swizzle(size):
+        def getter(self):
+            return Vector(self._values[:size])
+
+        def setter(self, value):
+            self[:size] = value
+
+        return property(getter, setter)
+
+    xy = _get_swizzle(2)
+    xyz = _get_swizzle(3)
+
+    del _get_axis, _get_swizzle
+
+    @property
+    def length(self):
+        return math.sqrt(sum(value * value for value in self._values))
+
+    @property
+    def magnitude(self):
+        return self.length
+
+    @property
+    def length_squared(self):
+        return sum(value * value for value in self._values)
+
+    def copy(self):
+        return Vector(self._values)
+
+    def to_tuple(self, precision=-1):
+        if precision == -1:
+            return tuple(self._values)
+        return tuple(round(value, precision) for value in self._values)
+
+    def to_3d(self):
+        return Vector((list(self._values) + [0.0, 0.0, 0.0])[:3])
+
+    def to_4d(self):
+        return Vector((list(self._values) + [0.0, 0.0, 0.0])[:3] + [1.0])
+
+    def normalize(self):
+        length = self.length
+        if length != 0.0:
+            self._values = _floats(value / length for value in self._values)
+
+    def normalized(self):
+        vector = self.copy()
+        vector.normalize()
+        return vector
+
+    def dot(self, other):
+        return sum(a * b for a, b in zip(self._values, other))
+
+    def cross(self, other):
+        ax, ay, az = self._values
+        bx, by, bz = other
+        return Vector((ay * bz - az * by, az * bx - ax * bz, ax * by - ay * bx))
+
+    def __eq__(self, other):
+        if not isinstance(other, Vector):
+            return NotImplemented
+        return self._values == other._values
+
+    def __ne__(self, other):
+        if not isinstance(other, Vector):
+            return NotImplemented
+        return self._values != other._values
+
+    def __neg__(self):
+        return Vector([-value for value in self._values])
+
+    def __add__(self, other):
+        if len(other) != len(self._values):
+            raise ValueError('Vector addition: vectors must have the same dimensions for this operation')
+        return Vector([a + b for a, b in zip(self._values, other)])
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        if len(other) != len(self._values):
+            raise ValueError('Vector subtraction: vectors must have the same dimensions for this operation')
+        return Vector([a - b for a, b in zip(self._values, other)])
+
+    def __rsub__(self, other):
+        return Vector([b - a for a, b in zip(self._values, other)])
+
+    def __mul__(self, other):
+        if isinstance(other, Vector):
+            return Vector([a * b for a, b in zip(self._values, other._values)])
+        return Vector([value * other for value in self._values])
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other):
+        return Vector([value / other for value in self._values])
+
+    def __matmul__(self, other):
+        if isinstance(other, Vector):
+            return self.dot(other)
+        if isinstance(other, Matrix):
+            return other._row_vector_multiply(self)
+        return NotImplemented
+
+    def __repr__(self):
+        return 'Vector((%s))' % ', '.join(repr(value) for value in self._values)
+
+
+class Quaternion(object):
+    __hash__ = None
+
+    def __init__(self, seq=(1.0, 0.0, 0.0, 0.0)):
+        self._values = _floats(seq)
+        if len(self._values) != 4:
+            raise ValueError('Quaternion(): 4d numeric sequence expected')
+
+    def __len__(self):
+        return 4
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple(self._values[index])
+        return self._values[index]
+
+    def __setitem__(self, index, value):
+        self._values[index] = float(value)
+
+    def _get_component(index):
+        def getter(self):
+            return self._values[index]
+
+        def setter(self, value):
+            self._values[index] = float(value)
+
+        return property(getter, setter)
+
+    w = _get_component(0)
+    x = _get_component(1)
+    y = _get_component(2)
+    z = _get_component(3)
+
+    del _get_component
+
+    @property
+    def magnitude(self):
+        return math.sqrt(sum(value * value for value in self._values))
+
+    def copy(self):
+        return Quaternion(self._values)
+
+    def conjugate(self):
+        w, x, y, z = self._values
+        self._values = _floats((w, -x, -y, -z))
+
+    def conjugated(self):
+        quaternion = self.copy()
+        quaternion.conjugate()
+        return quaternion
+
+    def normalize(self):
+        magnitude = self.magnitude
+        if magnitude != 0.0:
+            self._values = _floats(value / magnitude for value in self._values)
+
+    def normalized(self):
+        quaternion = self.copy()
+        quaternion.normalize()
+        return quaternion
+
+    def inverted(self):
+        magnitude_squared = sum(value * value for value in self._values)
+        w, x, y, z = self._values
+        return Quaternion((w / magnitude_squared, -x / magnitude_squared, -y / magnitude_squared, -z / magnitude_squared))
+
+    def dot(self, other):
+        return sum(a * b for a, b in zip(self._values, other))
+
+    def to_matrix(self):
+        w, x, y, z = self.normalized()._values
+        return Matrix((
+            (1 - 2 * (y * y + z * z), 2 * (x * y - w * z), 2 * (x * z + w * y)),
+            (2 * (x * y + w * z), 1 - 2 * (x * x + z * z), 2 * (y * z - w * x)),
+            (2 * (x * z - w * y), 2 * (y * z + w * x), 1 - 2 * (x * x + y * y)),
+        ))
+
+    def __eq__(self, other):
+        if not isinstance(other, Quaternion):
+            return NotImplemented
+        return self._values == other._values
+
+    def __ne__(self, other):
+        if not isinstance(other, Quaternion):
+            return NotImplemented
+        return self._values != other._values
+
+    def __neg__(self):
+        return Quaternion([-value for value in self._values])
+
+    def __mul__(self, other):
+        if isinstance(other, Quaternion):
+            return Quaternion([a * b for a, b in zip(self._values, other._values)])
+        return Quaternion([value * other for value in self._values])
+
+    __rmul__ = __mul__
+
+    def __matmul__(self, other):
+        if isinstance(other, Quaternion):
+            aw, ax, ay, az = self._values
+            bw, bx, by, bz = other._values
+            return Quaternion((
+                aw * bw - ax * bx - ay * by - az * bz,
+                aw * bx + ax * bw + ay * bz - az * by,
+                aw * by - ax * bz + ay * bw + az * bx,
+                aw * bz + ax * by - ay * bx + az * bw,
+            ))
+        if isinstance(other, Vector):
+            return self.to_matrix() @ other
+        return NotImplemented
+
+    def __repr__(self):
+        return 'Quaternion((%s))' % ', '.join(repr(value) for value in self._values)
+
+
+class Matrix(object):
+    __hash__ = None
+
+    def __init__(self, rows=None):
+        if rows is None:
+            rows = Matrix.Identity(4)._rows
+        self._rows = [_floats(row) for row in rows]
+
+        column_count = len(self._rows[0]) if self._rows else 0
+        if not 2 <= len(self._rows) <= 4 or not 2 <= column_count <= 4 or any(len(row) != column_count for row in self._rows):
+            raise ValueError('Matrix(): expects 2-4 rows of 2-4 items each')
+
+    @staticmethod
+    def Identity(size):
+        return Matrix([[1.0 if row == column else 0.0 for column in range(size)] for row in range(size)])
+
+    @staticmethod
+    def Translation(vector):
+        matrix = Matrix.Identity(4)
+        for row, value in enumerate(vector):
+            matrix._rows[row][3] = float(value)
+        return matrix
+
+    @staticmethod
+    def Diagonal(vector):
+        values = list(vector)
+        matrix = Matrix.Identity(len(values))
+        for row, value in enumerate(values):
+            matrix._rows[row][row] = float(value)
+        return matrix
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __iter__(self):
+        return (Vector._wrap(row) for row in self._rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple(Vector._wrap(row) for row in self._rows[index])
+        return Vector._wrap(self._rows[index])
+
+    def __setitem__(self, index, value):
+        row = _floats(value)
+        if len(row) != len(self._rows[index]):
+            raise ValueError('matrix[i] = value: size mismatch')
+        self._rows[index][:] = _floats(row)
+
+    @property
+    def col(self):
+        return tuple(Vector([row[column] for row in self._rows]) for column in range(len(self._rows[0])))
+
+    @property
+    def translation(self):
+        return Vector([row[3] for row in self._rows[:3]])
+
+    @translation.setter
+    def translation(self, vector):
+        for row, value in zip(self._rows, vector):
+            row[3] = float(value)
+
+    def copy(self):
+        return Matrix(self._rows)
+
+    def to_3x3(self):
+        return Matrix([(list(row) + [0.0, 0.0, 0.0])[:3] for row in (self._rows + [[], [], []])[:3]])
+
+    def to_4x4(self):
+        matrix = Matrix.Identity(4)
+        for row, values in zip(matrix._rows, self._rows):
+            row[:len(values)] = values
+        return matrix
+
+    def to_translation(self):
+        return self.translation
+
+    def to_scale(self):
+        return self._to_rotation_scale()[1]
+
+    def to_quaternion(self):
+        return self._to_rotation_scale()[0]
+
+    def _to_rotation_scale(self):
+        rotation = self.to_3x3()._rows
+
+        scale = [math.sqrt(sum(rotation[row][column] ** 2 for row in range(3))) for column in range(3)]
+        if np.linalg.det(np.array(rotation)) < 0.0:
+            scale = [-value for value in scale]
+
+        for column in range(3):
+            if scale[column] != 0.0:
+                for row in range(3):
+                    rotation[row][column] /= scale[column]
+
+        return _matrix_to_quaternion(rotation), Vector(scale)
+
+    def decompose(self):
+        rotation, scale = self._to_rotation_scale()
+        return self.to_translation(), rotation, scale
+
+    def transposed(self):
+        return Matrix(list(zip(*self._rows)))
+
+    def transpose(self):
+        self._rows = self.transposed()._rows
+
+    def inverted(self, fallback=None):
+        try:
+            inverse = np.linalg.inv(np.array(self._rows))
+        except np.linalg.LinAlgError:
+            if fallback is not None:
+                return fallback
+            raise ValueError('Matrix.inverted(M): matrix does not have an inverse')
+        return Matrix(inverse.tolist())
+
+    def invert(self, fallback=None):
+        self._rows = self.inverted(fallback)._rows
+
+    # mathutils treats a 3d vector times a 4x4 matrix as a point (w = 1), and gives back a 3d vector
+    def _extend(self, vector):
+        values = list(vector)
+        if len(values) == 3 and len(self._rows) == 4:
+            values.append(1.0)
+        if len(values) != len(self._rows[0]):
+            raise ValueError('matrix * vector: len(matrix.col) and len(vector) must be the same')
+        return values
+
+    def _row_vector_multiply(self, vector):
+        size = len(vector)
+        values = self._extend(vector)
+        return Vector([sum(values[row] * self._rows[row][column] for row in range(len(values))) for column in range(len(self._rows[0]))][:size])
+
+    def __matmul__(self, other):
+        if isinstance(other, Matrix):
+            other_columns = list(zip(*other._rows))
+            if len(self._rows[0]) != len(other._rows):
+                raise ValueError('matrix1 * matrix2: matrix1 number of columns and the matrix2 number of rows must be the same')
+            return Matrix([[sum(a * b for a, b in zip(row, column)) for column in other_columns] for row in self._rows])
+        if isinstance(other, Vector):
+            size = len(other)
+            values = self._extend(other)
+            return Vector([sum(a * b for a, b in zip(row, values)) for row in self._rows][:size])
+        return NotImplemented
+
+    def __mul__(self, other):
+        if isinstance(other, Matrix):
+            return Matrix([[a * b for a, b in zip(row, other_row)] for row, other_row in zip(self._rows, other._rows)])
+        return Matrix([[value * other for value in row] for row in self._rows])
+
+    __rmul__ = __mul__
+
+    def __eq__(self, other):
+        if not isinstance(other, Matrix):
+            return NotImplemented
+        return self._rows == other._rows
+
+    def __ne__(self, other):
+        if not isinstance(other, Matrix):
+            return NotImplemented
+        return self._rows != other._rows
+
+    def __repr__(self):
+        return 'Matrix((%s))' % ',\n        '.join('(%s)' % ', '.join(repr(value) for value in row) for row in self._rows)
+
+
+# Rotation matrix (as rows) to a quaternion, w is kept positive like mathutils does
+def _matrix_to_quaternion(m):
+    trace = m[0][0] + m[1][1] + m[2][2]
+
+    # Work from whichever of w, x, y or z is largest, so we never divide by something tiny
+    if trace >= max(m[0][0], m[1][1], m[2][2]):
+        largest = 0
+        s = 2.0 * math.sqrt(max(0.0, 1.0 + trace))
+    elif m[0][0] >= m[1][1] and m[0][0] >= m[2][2]:
+        largest = 1
+        s = 2.0 * math.sqrt(max(0.0, 1.0 + m[0][0] - m[1][1] - m[2][2]))
+    elif m[1][1] >= m[2][2]:
+        largest = 2
+        s = 2.0 * math.sqrt(max(0.0, 1.0 - m[0][0] + m[1][1] - m[2][2]))
+    else:
+        largest = 3
+        s = 2.0 * math.sqrt(max(0.0, 1.0 - m[0][0] - m[1][1] + m[2][2]))
+
+    # Degenerate (zero scale) matrix
+    if s == 0.0:
+        return Quaternion()
+
+    if largest == 0:
+        values = [0.25 * s, (m[2][1] - m[1][2]) / s, (m[0][2] - m[2][0]) / s, (m[1][0] - m[0][1]) / s]
+    elif largest == 1:
+        values = [(m[2][1] - m[1][2]) / s, 0.25 * s, (m[0][1] + m[1][0]) / s, (m[0][2] + m[2][0]) / s]
+    elif largest == 2:
+        values = [(m[0][2] - m[2][0]) / s, (m[0][1] + m[1][0]) / s, 0.25 * s, (m[1][2] + m[2][1]) / s]
+    else:
+        values = [(m[1][0] - m[0][1]) / s, (m[0][2] + m[2][0]) / s, (m[1][2] + m[2][1]) / s, 0.25 * s]
+
+    quaternion = Quaternion(values)
+    quaternion.normalize()
+    if quaternion.w < 0.0:
+        quaternion = -quaternion
+    return quaternion
@@ -1,7 +1,21 @@
 import os
+import numpy as np
 from . import abc
-from .io import unpack
-from mathutils import Vector, Matrix, Quaternion
+from .io import unpack, get_struct, BinaryReader, source_path
+from .vector_math import Vector, Matrix, Quaternion
+
+# Face vertex: 2f texcoord, H vertex index
+FACE_VERTEX_DTYPE = np.dtype([('texcoord', '<f4', (2,)), ('vertex_index', '<u2')])
+# Weight: I node index, 3f location, f bias
+WEIGHT_DTYPE = np.dtype([('node_index', '<u4'), ('location', '<f4', (3,)), ('bias', '<f4')])
+# Vertex: H weight count, H sublod vertex index, weights..., 3f location, 3f normal
+VERTEX_WEIGHT_COUNT = get_struct('H')
+VERTEX_BASE_SIZE = 2 + 2 + 12 + 12
+
+
+# Copies `size` bytes from each of `starts` into a contiguous (len(starts), size) array
+def _gather(block, starts, size):
+    return np.ascontiguousarray(block[starts[:, None] + np.arange(size)])
 
 
 class ABCModelReader(object):
@@ -25,39 +39,50 @@ class ABCModelReader(object):
     def _read_string(self, f):
         return f.read(unpack('H', f)[0]).decode('ascii')
 
-    def _read_weight(self, f):
-        weight = abc.Weight()
-        weight.node_index = unpack('I', f)[0]
-        weight.location = self._read_vector(f)
-        weight.bias = unpack('f', f)[0]
-        return weight
-
-    def _read_vertex(self, f):
-        vertex = abc.Vertex()
-        weight_count = unpack('H', f)[0]
-        vertex.sublod_vertex_index = unpack('H', f)[0]
-        vertex.weights = [self._read_weight(f) for _ in range(weight_count)]
-        vertex.location = self._read_vector(f)
-        vertex.normal = self._read_vector(f)
-        return vertex
-
-    def _read_face_vertex(self, f):
-        face_vertex = abc.FaceVertex()
-        face_vertex.texcoord.xy = unpack('2f', f)
-        face_vertex.vertex_index = unpack('H', f)[0]
-        return face_vertex
-
-    def _read_face(self, f):
-        face = abc.Face()
-        face.vertices = [self._read_face_vertex(f) for _ in range(3)]
-        return face
-
     def _read_lod(self, f):
-        lod = abc.LOD()
+        lod = abc.ArrayLOD()
+
+        # Faces are fixed size, so the whole block comes out in one go
         face_count = unpack('I', f)[0]
-        lod.faces = [self._read_face(f) for _ in range(face_count)]
+        face_vertices = f.read_array(FACE_VERTEX_DTYPE, face_count * 3).reshape(face_count, 3)
+        lod.face_texcoords = face_vertices['texcoord']
+        lod.face_vertex_indices = face_vertices['vertex_index']
+
+        # Vertices have a variable amount of weights, so first walk the block to find where each one starts...
         vertex_count = unpack('I', f)[0]
-        lod.vertices = [self._read_vertex(f) for _ in range(vertex_count)]
+        block_start = f.tell()
+        weight_counts = []
+        offset = block_start
+        for _ in range(vertex_count):
+            weight_count = VERTEX_WEIGHT_COUNT.unpack_from(f.view, offset)[0]
+            weight_counts.append(weight_count)
+            offset += VERTEX_BASE_SIZE + WEIGHT_DTYPE.itemsize * weight_count
+        f.seek(offset)
+
+        # ...then pull every field out with one gather each.
+        block = np.frombuffer(f.view, dtype=np.uint8, count=offset - block_start, offset=block_start)
+        weight_counts = np.array(weight_counts, dtype=np.int64)
+        vertex_sizes = VERTEX_BASE_SIZE + WEIGHT_DTYPE.itemsize * weight_counts
+        vertex_starts = np.cumsum(vertex_sizes) - vertex_sizes
+
+        lod.weight_offsets = np.zeros(vertex_count + 1, dtype=np.int64)
+        np.cumsum(weight_counts, out=lod.weight_offsets[1:])
+
+        lod.sublod_vertex_indices = _gather(block, vertex_starts + 2, 2).view('<u2').reshape(vertex_count)
+
+        # Location and normal sit right after the weights
+        vectors = _gather(block, vertex_starts + 4 + WEIGHT_DTYPE.itemsize * weight_counts, 24).view('<f4').reshape(vertex_count, 6)
+        lod.locations = vectors[:, 0:3]
+        lod.normals = vectors[:, 3:6]
+
+        weight_vertices = np.repeat(np.arange(vertex_count), weight_counts)
+        weight_slots = np.arange(len(weight_vertices)) - lod.weight_offsets[weight_vertices]
+        weight_starts = vertex_starts[weight_vertices] + 4 + WEIGHT_DTYPE.itemsize * weight_slots
+        weights = _gather(block, weight_starts, WEIGHT_DTYPE.itemsize).view(WEIGHT_DTYPE).reshape(len(weight_vertices))
+        lod.weight_node_indices = weights['node_index'].copy()
+        lod.weight_locations = weights['location'].copy()
+        lod.weight_biases = weights['bias'].copy()
+
         return lod
 
     def _read_piece(self, f):
@@ -147,10 +172,10 @@ class ABCModelReader(object):
         weight_set.node_weights = [unpack('f', f)[0] for _ in range(node_count)]
         return weight_set
 
-    def from_file(self, path):
+    def from_file(self, path, use_mmap=False):
         model = abc.Model()
-        model.name = os.path.splitext(os.path.basename(path))[0]
-        with open(path, 'rb') as f:
+        model.name = os.path.splitext(os.path.basename(source_path(path)))[0]
+        with BinaryReader.from_file(path, use_mmap) as f:
             next_section_offset = 0
             while next_section_offset != -1:
                 f.seek(next_section_offset)
@@ -1,7 +1,7 @@
 import os
 from . import abc
-from .io import unpack
-from mathutils import Vector, Matrix, Quaternion
+from .io import unpack, BinaryReader, source_path
+from .vector_math import Vector, Matrix, Quaternion
 import copy
 
 #
@@ -264,10 +264,10 @@ class ABCV6ModelReader(object):
     # End Function
 
 
-    def from_file(self, path):
+    def from_file(self, path, use_mmap=False):
         self._model = abc.Model()
-        self._model.name = os.path.splitext(os.path.basename(path))[0]
-        with open(path, 'rb') as f:
+        self._model.name = os.path.splitext(os.path.basename(source_path(path)))[0]
+        with BinaryReader.from_file(path, use_mmap) as f:
             next_section_offset = 0
             while next_section_offset != -1:
                 f.seek(next_section_offset)
@@ -1,7 +1,8 @@
 import os
+import numpy as np
 from . import abc
-from .io import unpack
-from mathutils import Vector, Matrix, Quaternion
+from .io import unpack, BinaryReader, source_path
+from .vector_math import Vector, Matrix, Quaternion
 
 # LTB Mesh Types
 LTB_Type_Rigid_Mesh = 4
@@ -19,6 +20,8 @@ VTX_UV_Sets_3     = 0x0040
 VTX_UV_Sets_4     = 0x0080
 VTX_BasisVector   = 0x0100
 
+VTX_UV_Sets = [VTX_UV_Sets_1, VTX_UV_Sets_2, VTX_UV_Sets_3, VTX_UV_Sets_4]
+
 # Animation Compression Types
 CMP_None = 0
 CMP_Relevant = 1
@@ -27,6 +30,10 @@ CMP_Relevant_Rot16 = 3
 
 Invalid_Bone = 255
 
+# Copies `size` bytes from each of `starts` into a contiguous (len(starts), size) array
+def _gather(view, starts, size):
+    return np.ascontiguousarray(view[starts[:, None] + np.arange(size)])
+
 #
 # Supports LTB v23 (and maybe 24, 25?)
 #
@@ -84,94 +91,101 @@ class PCLTBModelReader(object):
         f.seek(4, 1)
         return lod
 
-    def _read_rigid_mesh(self, lod, f):
-        data_type = unpack('4I', f)
-        bone = unpack('I', f)[0]
-
-        # We need face vertex data alongside vertices!
-        face_vertex_list = []
+    # Builds the per-vertex record layout for a data stream mask.
+    # Skeletal meshes have `blend_count` extra floats right after the position.
+    @staticmethod
+    def _get_stream_dtype(mask, blend_count=0):
+        fields = []
+        if mask & VTX_Position:
+            fields.append(('location', '<f4', (3,)))
+            if blend_count > 0:
+                fields.append(('blends', '<f4', (blend_count,)))
+        if mask & VTX_Normal:
+            fields.append(('normal', '<f4', (3,)))
+        if mask & VTX_Colour:
+            fields.append(('colour', '<i4'))
+        for uv_set, uv_flag in enumerate(VTX_UV_Sets):
+            if mask & uv_flag:
+                fields.append(('uv%d' % uv_set, '<f4', (2,)))
+        if mask & VTX_BasisVector:
+            fields.append(('s', '<f4', (3,)))
+            fields.append(('t', '<f4', (3,)))
+        return np.dtype(fields)
+
+    # Reads the (up to) 4 vertex data streams and the face index list into an ArrayLOD.
+    # Returns the raw stream holding the vertex data so the caller can pull out its weights.
+    def _read_mesh_streams(self, lod, data_type, blend_count, f):
+        vertex_stream = None
+        uv_stream = None
+        vertex_stream_count = 0
 
         for mask in data_type:
-            for _ in range(lod.vert_count):
-                vertex = abc.Vertex()
-                face_vertex = abc.FaceVertex()
+            dtype = self._get_stream_dtype(mask, blend_count)
 
-                # Dirty flags
-                is_vertex_used = False
-                is_face_vertex_used = False
-            
-                if mask & VTX_Position:
-                    vertex.location = self._read_vector(f)
-                    
-                    # One bone per vertex
-                    weight = abc.Weight()
-                    weight.node_index = bone
-                    weight.bias = 1.0
-
-                    vertex.weights.append(weight)
-
-                    is_vertex_used = True
-                if mask & VTX_Normal:
-                    vertex.normal = self._read_vector(f)
-                    is_vertex_used = True
-                if mask & VTX_Colour:
-                    vertex.colour = unpack('i', f)[0]
-                    is_vertex_used = True
-                if mask & VTX_UV_Sets_1:
-                    face_vertex.texcoord.xy = unpack('2f', f)
-                    is_face_vertex_used = True
-                if mask & VTX_UV_Sets_2:
-                    face_vertex.extra_texcoords[0].xy = unpack('2f', f)
-                    is_face_vertex_used = True
-                if mask & VTX_UV_Sets_3:
-                    face_vertex.extra_texcoords[1].xy = unpack('2f', f)
-                    is_face_vertex_used = True
-                if mask & VTX_UV_Sets_4:
-                    face_vertex.extra_texcoords[2].xy = unpack('2f', f)
-                    is_face_vertex_used = True
-                if mask & VTX_BasisVector:
-                    vertex.s = self._read_vector(f)
-                    vertex.t = self._read_vector(f)
-                    is_vertex_used = True
-                # End If
-
-                if is_vertex_used:
-                    lod.vertices.append(vertex)
-
-                if is_face_vertex_used:
-                    face_vertex_list.append(face_vertex)
-                 
-            # End For
+            # Nothing we know how to read in this stream
+            if dtype.itemsize == 0:
+                continue
+
+            stream = f.read_array(dtype, lod.vert_count)
+
+            if mask & (VTX_Position | VTX_Normal | VTX_Colour | VTX_BasisVector):
+                vertex_stream_count += 1
+                if vertex_stream is None:
+                    vertex_stream = stream
+
+            # Face vertices are indexed from the first stream with texcoords
+            if mask & (VTX_UV_Sets_1 | VTX_UV_Sets_2 | VTX_UV_Sets_3 | VTX_UV_Sets_4) and uv_stream is None:
+                uv_stream = stream
         # End For
 
         # Make sure our stuff is good!!
-        print ("Vert Count Check: %d/%d" % (lod.vert_count, len(lod.vertices)))
-        assert(lod.vert_count == len(lod.vertices))
+        print ("Vertex Stream Count: %d" % vertex_stream_count)
+        assert lod.vert_count == 0 or vertex_stream_count == 1, "Expected exactly one vertex stream, found %d" % vertex_stream_count
+
+        fields = vertex_stream.dtype.names if vertex_stream is not None else ()
+        lod.locations = vertex_stream['location'] if 'location' in fields else np.zeros((lod.vert_count, 3), dtype=np.float32)
+        lod.normals = vertex_stream['normal'] if 'normal' in fields else np.zeros((lod.vert_count, 3), dtype=np.float32)
+        lod.sublod_vertex_indices = np.full(lod.vert_count, 0xCDCD, dtype=np.uint16)
+        if 'colour' in fields:
+            lod.colours = vertex_stream['colour']
+        if 's' in fields:
+            lod.basis_s = vertex_stream['s']
+            lod.basis_t = vertex_stream['t']
+
+        # The whole index list in one read
+        lod.face_vertex_indices = f.read_array('<u2', lod.face_count * 3).reshape(lod.face_count, 3)
+
+        uv_fields = uv_stream.dtype.names if uv_stream is not None else ()
+        if 'uv0' in uv_fields:
+            lod.face_texcoords = uv_stream['uv0'][lod.face_vertex_indices]
+        else:
+            lod.face_texcoords = np.zeros((lod.face_count, 3, 2), dtype=np.float32)
 
-        # We need a "global" face, we'll fill it and re-use it.
-        face = abc.Face()
-        for _ in range(lod.face_count * 3):
-            vertex_index = unpack('H', f)[0]
+        extra_uv_fields = [name for name in ('uv1', 'uv2', 'uv3') if name in uv_fields]
+        if len(extra_uv_fields) > 0:
+            lod.face_extra_texcoords = np.zeros((lod.face_count, 3, 3, 2), dtype=np.float32)
+            for name in extra_uv_fields:
+                lod.face_extra_texcoords[:, :, int(name[2:]) - 1] = uv_stream[name][lod.face_vertex_indices]
 
-            face_vertex = face_vertex_list[vertex_index]
-            face_vertex.vertex_index = vertex_index
+        # Make sure our stuff is good!!
+        print ("Face Count Check: %d/%d" % (lod.face_count, len(lod.face_vertex_indices)))
+        assert(lod.face_count == len(lod.face_vertex_indices))
 
-            # If we have room, append!
-            if len(face.vertices) < 3:
-                face.vertices.append(face_vertex)
-            # End If
+        return vertex_stream
 
-            # If we're now over, then flush!
-            if len(face.vertices) >= 3:
-                lod.faces.append(face)
-                # Make a new face, and append our face vertex
-                face = abc.Face()
-            # End If
-        # End For
+    def _read_rigid_mesh(self, lod, f):
+        data_type = unpack('4I', f)
+        bone = unpack('I', f)[0]
 
-        # Make sure our stuff is good!!
-        print ("Face Count Check: %d/%d" % (lod.face_count, len(lod.faces)))
-        assert(lod.face_count == len(lod.faces))
+        vertex_stream = self._read_mesh_streams(lod, data_type, 0, f)
+
+        # One bone per vertex
+        weights_per_vertex = 1 if vertex_stream is not None and 'location' in vertex_stream.dtype.names else 0
+        weight_count = lod.vert_count * weights_per_vertex
+        lod.weight_offsets = np.arange(lod.vert_count + 1, dtype=np.int64) * weights_per_vertex
+        lod.weight_node_indices = np.full(weight_count, bone, dtype=np.uint32)
+        lod.weight_locations = np.zeros((weight_count, 3), dtype=np.float32)
+        lod.weight_biases = np.ones(weight_count, dtype=np.float32)
 
         return lod
 
@@ -183,109 +197,28 @@ class PCLTBModelReader(object):
 
         print("Matrix Palette? %d" % matrix_palette)
 
-        # We need face vertex data alongside vertices!
-        face_vertex_list = []
-
-        for mask in data_type:
-            for _ in range(lod.vert_count):
-                vertex = abc.Vertex()
-                face_vertex = abc.FaceVertex()
-
-                # Dirty flags
-                is_vertex_used = False
-                is_face_vertex_used = False
-
-                if mask & VTX_Position:
-                    vertex.location = self._read_vector(f)
-                    is_vertex_used = True
-
-                    weights = []
-
-                    weight = abc.Weight()
-                    weight.bias = 1.0                    
-
-                    for i in range(lod.max_bones_per_face):
-                        # Skip the first one
-                        if i == 0:
-                            continue
-                        # End If
-
-                        # There's 3 additional blends, 
-                        # If ... max_bones_per_face >= 2,3,4
-                        if lod.max_bones_per_face >= (i+1):
-                            blend = unpack('f', f)[0]
-                            weight.bias -= blend
-
-                            blend_weight = abc.Weight()
-                            blend_weight.bias = blend
-                            weights.append(blend_weight)
-                        # End If
-                    # End For
-
-                    weights.append(weight)
-
-                    vertex.weights = weights
-                if mask & VTX_Normal:
-                    vertex.normal = self._read_vector(f)
-                    is_vertex_used = True
-                if mask & VTX_Colour:
-                    vertex.colour = unpack('i', f)[0]
-                    is_vertex_used = True
-                if mask & VTX_UV_Sets_1:
-                    face_vertex.texcoord.xy = unpack('2f', f)
-                    is_face_vertex_used = True
-                if mask & VTX_UV_Sets_2:
-                    face_vertex.extra_texcoords[0].xy = unpack('2f', f)
-                    is_face_vertex_used = True
-                if mask & VTX_UV_Sets_3:
-                    face_vertex.extra_texcoords[1].xy = unpack('2f', f)
-                    is_face_vertex_used = True
-                if mask & VTX_UV_Sets_4:
-                    face_vertex.extra_texcoords[2].xy = unpack('2f', f)
-                    is_face_vertex_used = True
-                if mask & VTX_BasisVector:
-                    vertex.s = self._read_vector(f)
-                    vertex.t = self._read_vector(f)
-                    is_vertex_used = True
-                # End If
-
-                if is_vertex_used:
-                    lod.vertices.append(vertex)
-
-                if is_face_vertex_used:
-                    face_vertex_list.append(face_vertex)
-                
-            # End For
-        # End For
-
-        # Make sure our stuff is good!!
-        print ("Vert Count Check: %d/%d" % (lod.vert_count, len(lod.vertices)))
-        assert(lod.vert_count == len(lod.vertices))
-
-        # We need a "global" face, we'll fill it and re-use it.
-        face = abc.Face()
-        for _ in range(lod.face_count * 3):
-            vertex_index = unpack('H', f)[0]
-
-            face_vertex = face_vertex_list[vertex_index]
-            face_vertex.vertex_index = vertex_index
-
-            # If we have room, append!
-            if len(face.vertices) < 3:
-                face.vertices.append(face_vertex)
-            # End If
-
-            # If we're now over, then flush!
-            if len(face.vertices) >= 3:
-                lod.faces.append(face)
-                # Make a new face, and append our face vertex
-                face = abc.Face()
-            # End If
-        # End For
+        # There's 3 additional blends,
+        # If ... max_bones_per_face >= 2,3,4
+        blend_count = max(lod.max_bones_per_face - 1, 0)
+
+        vertex_stream = self._read_mesh_streams(lod, data_type, blend_count, f)
+
+        # Each vertex has its blends followed by the main weight, which gets whatever's left over.
+        if vertex_stream is not None and 'location' in vertex_stream.dtype.names:
+            weights_per_vertex = blend_count + 1
+            biases = np.empty((lod.vert_count, weights_per_vertex), dtype=np.float64)
+            biases[:, -1] = 1.0
+            if blend_count > 0:
+                blends = vertex_stream['blends'].astype(np.float64).reshape(lod.vert_count, blend_count)
+                biases[:, :-1] = blends
+                for i in range(blend_count):
+                    biases[:, -1] -= blends[:, i]
+        else:
+            weights_per_vertex = 0
+            biases = np.zeros((lod.vert_count, 0), dtype=np.float64)
 
-        # Make sure our stuff is good!!
-        print ("Face Count Check: %d/%d" % (lod.face_count, len(lod.faces)))
-        assert(lod.face_count == len(lod.faces))
+        node_indices = np.zeros((lod.vert_count, weights_per_vertex), dtype=np.uint32)
+        keep = np.ones((lod.vert_count, weights_per_vertex), dtype=bool)
 
         bone_set_count = unpack('I', f)[0]
 
@@ -293,43 +226,33 @@ class PCLTBModelReader(object):
             index_start = unpack('H', f)[0]
             index_count = unpack('H', f)[0]
 
-            bone_list = unpack('4B', f)
+            bone_list = unpack('4B', f)[:weights_per_vertex]
 
             # ???
             _index_buffer_index = unpack('I', f)[0]
 
             # Okay, now we can fill up our node indexes!
-            for vertex_index in range(index_start, index_start + index_count):
-                vertex = lod.vertices[vertex_index]
-
-                # We need to re-build the weight list for our vertex
-                weights = []
-
-                for (index, bone_index) in enumerate(bone_list):
-                    # If we've got an invalid bone (255) then ignore it
-                    if bone_index == Invalid_Bone:
-                        continue
-                    # End If
-
-                    vertex.weights[index].node_index = bone_index
-                    # Keep this one!
-                    weights.append(vertex.weights[index])
-                # End For
-
-                total = 0.0
-                for weight in weights:
-                    total += weight.bias
-
-                assert(total != 0.0)
+            # If we've got an invalid bone (255) then drop that weight
+            index_end = index_start + index_count
+            for (index, bone_index) in enumerate(bone_list):
+                node_indices[index_start:index_end, index] = bone_index
+                keep[index_start:index_end, index] = bone_index != Invalid_Bone
+            # End For
 
-                vertex.weights = weights
-            #End For
+            assert(np.all(np.sum(biases[index_start:index_end] * keep[index_start:index_end], axis=1) != 0.0))
         # End For
 
+        weight_counts = np.count_nonzero(keep, axis=1)
+        lod.weight_offsets = np.zeros(lod.vert_count + 1, dtype=np.int64)
+        np.cumsum(weight_counts, out=lod.weight_offsets[1:])
+        lod.weight_node_indices = node_indices[keep]
+        lod.weight_biases = biases[keep].astype(np.float32)
+        lod.weight_locations = np.zeros((len(lod.weight_biases), 3), dtype=np.float32)
+
         return lod
 
     def _read_lod(self, f):
-        lod = abc.LOD()
+        lod = abc.ArrayLOD()
 
         lod.texture_count = unpack('I', f)[0]
         lod.textures = unpack('4I', f)
@@ -396,66 +319,74 @@ class PCLTBModelReader(object):
 
         return node_transforms
 
-    def _process_compressed_vector(self, compressed_vector):
-        return Vector( (compressed_vector[0] / 16.0, compressed_vector[1] / 16.0, compressed_vector[2] / 16.0) )
-
-    def _process_compressed_quat(self, compressed_quat):
-        return Quaternion( (compressed_quat[3] / 0x7FFF, compressed_quat[0] / 0x7FFF, compressed_quat[1] / 0x7FFF, compressed_quat[2] / 0x7FFF) )
+    # Reads every node's RLE compressed keys and expands them to a (node, keyframe, 7) array
+    # laid out as location xyz followed by rotation wxyz.
+    def _read_compressed_keyframes(self, compression_type, keyframe_count, f):
+        if compression_type == CMP_Relevant:
+            position_dtype, position_scale = np.dtype('<f4'), 1.0
+            rotation_dtype, rotation_scale = np.dtype('<f4'), 1.0
+        elif compression_type == CMP_Relevant_16:
+            position_dtype, position_scale = np.dtype('<i2'), 16.0
+            rotation_dtype, rotation_scale = np.dtype('<i2'), 0x7FFF
+        elif compression_type == CMP_Relevant_Rot16:
+            position_dtype, position_scale = np.dtype('<f4'), 1.0
+            rotation_dtype, rotation_scale = np.dtype('<i2'), 0x7FFF
+        else:
+            # Unknown compression, there's no key data we can read
+            position_dtype = rotation_dtype = None
+        # End If
 
-    def _read_compressed_transform(self, compression_type, keyframe_count, f):
-        
-        node_transforms = []
+        position_size = position_dtype.itemsize * 3 if position_dtype is not None else 0
+        rotation_size = rotation_dtype.itemsize * 4 if rotation_dtype is not None else 0
 
+        # First walk the key blocks to find where each node's keys are...
+        position_starts = []
+        position_counts = []
+        rotation_starts = []
+        rotation_counts = []
         for _ in range(self.node_count):
             # RLE!
             key_position_count = unpack('I', f)[0]
-
-            compressed_positions = []
-            if compression_type == CMP_Relevant or compression_type == CMP_Relevant_Rot16:
-                compressed_positions = [self._read_vector(f) for _ in range(key_position_count)]
-            elif compression_type == CMP_Relevant_16:
-                compressed_positions = [self._process_compressed_vector(unpack('3h', f)) for _ in range(key_position_count)]
-            # End If
+            position_starts.append(f.tell())
+            position_counts.append(key_position_count)
+            f.seek(key_position_count * position_size, 1)
 
             key_rotation_count = unpack('I', f)[0]
+            rotation_starts.append(f.tell())
+            rotation_counts.append(key_rotation_count)
+            f.seek(key_rotation_count * rotation_size, 1)
+        # End For
 
-            compressed_rotations = []
-            if compression_type == CMP_Relevant:
-                compressed_rotations = [self._read_quaternion(f) for _ in range(key_rotation_count)]
-            elif compression_type == CMP_Relevant_16 or compression_type == CMP_Relevant_Rot16:
-                compressed_rotations = [self._process_compressed_quat(unpack('4h', f)) for _ in range(key_rotation_count)]
-            # End If
-
-            transforms = []
-
-            previous_position = Vector( (0, 0, 0) )
-            previous_rotation = Quaternion( (1, 0, 0, 0) )
+        node_keyframes = np.zeros((self.node_count, keyframe_count, 7), dtype=np.float64)
 
-            # RLE animations, if it doesn't change in any additional keyframe,
-            # then it we can just use the last known pos/rot!
-            for i in range(keyframe_count):
-                transform = abc.Animation.Keyframe.Transform()
+        # Keyframes without any keys stay at the origin with no rotation
+        node_keyframes[:, :, 3] = 1.0
 
-                try:
-                    transform.location = compressed_positions[i]
-                except IndexError:
-                    transform.location = previous_position
+        if position_dtype is None or self.node_count == 0 or keyframe_count == 0:
+            return node_keyframes
 
-                try:
-                    transform.rotation = compressed_rotations[i]
-                except IndexError:
-                    transform.rotation = previous_rotation
+        # ...then gather all of them at once.
+        # RLE animations, if it doesn't change in any additional keyframe,
+        # then it we can just use the last known pos/rot!
+        view = np.frombuffer(f.view, dtype=np.uint8)
+        keyframe_indices = np.arange(keyframe_count)
 
-                previous_position = transform.location
-                previous_rotation = transform.rotation
+        counts = np.array(position_counts)
+        has_keys = counts > 0
+        key_indices = np.minimum(keyframe_indices[None, :], counts[:, None] - 1)
+        starts = np.array(position_starts)[:, None] + key_indices * position_size
+        positions = _gather(view, starts[has_keys].ravel(), position_size).view(position_dtype).reshape(-1, 3)
+        node_keyframes[has_keys, :, 0:3] = (positions / position_scale).reshape(-1, keyframe_count, 3)
 
-                transforms.append(transform)
-            # End For
+        counts = np.array(rotation_counts)
+        has_keys = counts > 0
+        key_indices = np.minimum(keyframe_indices[None, :], counts[:, None] - 1)
+        starts = np.array(rotation_starts)[:, None] + key_indices * rotation_size
+        rotations = _gather(view, starts[has_keys].ravel(), rotation_size).view(rotation_dtype).reshape(-1, 4)
+        # Stored as xyzw
+        node_keyframes[has_keys, :, 3:7] = (rotations[:, [3, 0, 1, 2]] / rotation_scale).reshape(-1, keyframe_count, 4)
 
-            node_transforms.append(transforms)
-        # End For
-
-        return node_transforms
+        return node_keyframes
 
     def _read_child_model(self, f):
         child_model = abc.ChildModel()
@@ -488,7 +419,8 @@ class PCLTBModelReader(object):
                 animation.node_keyframe_transforms.append(self._read_uncompressed_transform(animation.keyframe_count, f))
             # End For
         else:
-            animation.node_keyframe_transforms = self._read_compressed_transform(animation.compression_type, animation.keyframe_count, f)
+            # Transforms are built from the keyframe array when they're first needed
+            animation.node_keyframe_array = self._read_compressed_keyframes(animation.compression_type, animation.keyframe_count, f)
         # End If
 
         return animation
@@ -516,10 +448,10 @@ class PCLTBModelReader(object):
         weight_set.node_weights = [unpack('f', f)[0] for _ in range(node_count)]
         return weight_set
 
-    def from_file(self, path):
+    def from_file(self, path, use_mmap=False):
         model = abc.Model()
-        model.name = os.path.splitext(os.path.basename(path))[0]
-        with open(path, 'rb') as f:
+        model.name = os.path.splitext(os.path.basename(source_path(path)))[0]
+        with BinaryReader.from_file(path, use_mmap) as f:
 
             #
             # HEADER
@@ -1,11 +1,13 @@
 import os
+import json
 import struct
 
 from . import abc
-from .io import unpack
-from mathutils import Vector, Matrix, Quaternion
+from .io import unpack, BinaryReader, source_path
+from .vector_math import Vector, Matrix, Quaternion
 import math
 import copy
+import numpy as np
 from .hash_ps2 import HashLookUp
 
 #########################################################################################
@@ -71,7 +73,7 @@ class EndCommand(object):
 class LocalVertex(object):
     def __init__(self):
         self.id = 0
-        self.merge_string = ""
+        self.merge_key = None
         self.vertex = abc.Vertex()
         self.associated_ids = []
         
@@ -82,14 +84,28 @@ class LocalFace(object):
 
 # End Class
 
+# Offsets (relative to the current strip vertex) that make up a face,
+# indexed by [reversed][flip]
+STRIP_OFFSETS = np.array([
+    [ [0, -2, -1], [0, -1, -2] ],
+    [ [-2, 0, -1], [-1, 0, -2] ],
+])
+
 class VertexList(object):
-    def __init__(self):
+    # merge_epsilon: If set, vertices within this distance (per axis) of each other are merged.
+    # Otherwise only vertices whose positions print the same to 6 decimal places are merged.
+    def __init__(self, merge_epsilon=None):
         self.auto_increment = 0
-        self.groups = []
+        self.groups = set()
+        self.merge_epsilon = merge_epsilon
 
         # List of LocalVertex
         self.list = []
 
+        # Merge key -> index into self.list
+        # With merge_epsilon set this is a spatial hash instead: grid cell -> list of indices into self.list
+        self._merge_lookup = {}
+
         # List of LocalFace
         self.face_verts = []
 
@@ -103,7 +119,7 @@ class VertexList(object):
         local_vertex = LocalVertex()
         local_vertex.id = self.auto_increment
         local_vertex.vertex = vertex
-        local_vertex.merge_string = self.generate_merge_string(vertex.location)
+        local_vertex.merge_key = self.generate_merge_key(vertex.location)
         local_vertex.associated_ids.append(group_id)
 
         # Assign the list count as the vertex index (This will be overridden later if this vertex is a dupe)
@@ -112,7 +128,7 @@ class VertexList(object):
 
         # Check if the vertex is already in the list (dupe check)
         # If it is, we want the id
-        vertex_index = self.find_in_list(local_vertex.merge_string)
+        vertex_index = self.find_in_list(local_vertex)
 
         #print("Got Vertex ID: ",vertex_index)
 
@@ -124,6 +140,8 @@ class VertexList(object):
             # If the vert is not found, let's use our auto inc, and inc that after!
             vertex_index = self.auto_increment
             self.auto_increment += 1
+
+            self._add_to_lookup(local_vertex, vertex_index)
         else:
             self.list[vertex_index].associated_ids.append(group_id)
             
@@ -133,9 +151,7 @@ class VertexList(object):
         # Finally append the face vertex to the local face
         local_face.face_vertex = face_vertex
 
-        # Gross, but it'll do.
-        self.groups.append(group_id)
-        self.groups = list(set(self.groups))
+        self.groups.add(group_id)
 
         # Save the face vertex
         self.face_verts.append(local_face)
@@ -149,63 +165,77 @@ class VertexList(object):
 
         print("------------------------------------")
         print("Generating Faces :) ")
-        print("Groups: ",self.groups)
-        
-        for j in range( len(self.groups) ):
-            # Generate the faces with alternating order
-            flip = False
-            group_id = self.groups[j]
-            grouped_faces = []
+        groups = sorted(self.groups)
+        print("Groups: ",groups)
 
-            for i in range( len(self.face_verts) ):
-                face_vert = self.face_verts[i]
+        # Bucket the face verts by group in a single pass, keeping their order
+        grouped_faces = { group_id: [] for group_id in groups }
+        for face_vert in self.face_verts:
+            grouped_faces[face_vert.group_id].append(face_vert.face_vertex)
+        # End For
 
-                if face_vert.group_id != group_id:
-                    continue
+        for group_id in groups:
+            face_vertices = grouped_faces[group_id]
+            count = len(face_vertices)
+            if count < 3:
+                continue
 
-                grouped_faces.append(face_vert)
-            # End Face Verts
-            
-            for i in range( len(grouped_faces) ):
-                if i < 2:
-                    continue
+            # Each strip vertex past the second makes a face out of itself and the two before it.
+            # The winding alternates every face (flip), and reversed verts swap it again.
+            strip_index = np.arange(2, count)
+            flip = (strip_index & 1) == 1
+            reversed_flags = np.fromiter((face_vertex.reversed for face_vertex in face_vertices), dtype=bool, count=count)[2:]
 
-                face = abc.Face()
-
-                if grouped_faces[i].face_vertex.reversed:
-                    if flip:
-                        face.vertices = [ grouped_faces[i - 1].face_vertex, grouped_faces[i].face_vertex, grouped_faces[i - 2].face_vertex ]
-                    else:
-                        face.vertices = [ grouped_faces[i - 2].face_vertex, grouped_faces[i].face_vertex, grouped_faces[i - 1].face_vertex ]
-                else:
-                    if flip:
-                        face.vertices = [ grouped_faces[i].face_vertex, grouped_faces[i - 1].face_vertex, grouped_faces[i - 2].face_vertex ]
-                    else:
-                        face.vertices = [ grouped_faces[i].face_vertex, grouped_faces[i - 2].face_vertex, grouped_faces[i - 1].face_vertex ]
+            face_indices = strip_index[:, None] + STRIP_OFFSETS[reversed_flags.astype(int), flip.astype(int)]
 
+            for indices in face_indices.tolist():
+                face = abc.Face()
+                face.vertices = [ face_vertices[indices[0]], face_vertices[indices[1]], face_vertices[indices[2]] ]
                 faces.append(face)
-                flip = not flip
-            # End Grouped Faces
+            # End For
         # End Groups
 
-                
-        # End For
-
         self.faces = faces
     # End of Generate Faces
 
-    # Find the requested merge_string in a list
-    # Return the position if true,
-    # Return -1 if false.
-    def find_in_list(self, merge_string):
-        for i in range( len(self.list) ):
-            if merge_string == self.list[i].merge_string:
-                return i
+    # Find a vertex that the local vertex should merge with
+    # Return the position if found,
+    # Return -1 if not.
+    def find_in_list(self, local_vertex):
+        if self.merge_epsilon is None:
+            return self._merge_lookup.get(local_vertex.merge_key, -1)
+
+        # Anything within epsilon has to be in this cell, or one of its neighbours
+        location = local_vertex.vertex.location
+        cell_x, cell_y, cell_z = local_vertex.merge_key
+        for x in (cell_x - 1, cell_x, cell_x + 1):
+            for y in (cell_y - 1, cell_y, cell_y + 1):
+                for z in (cell_z - 1, cell_z, cell_z + 1):
+                    for index in self._merge_lookup.get((x, y, z), ()):
+                        other = self.list[index].vertex.location
+                        if abs(location.x - other.x) <= self.merge_epsilon and \
+                           abs(location.y - other.y) <= self.merge_epsilon and \
+                           abs(location.z - other.z) <= self.merge_epsilon:
+                            return index
+                # End For
+            # End For
+        # End For
 
         return -1
 
-    def generate_merge_string(self, vector):
-        return "%f/%f/%f" % (vector.x, vector.y, vector.z)
+    def _add_to_lookup(self, local_vertex, index):
+        if self.merge_epsilon is None:
+            self._merge_lookup[local_vertex.merge_key] = index
+        else:
+            self._merge_lookup.setdefault(local_vertex.merge_key, []).append(index)
+
+    # Exact merging quantizes the position, epsilon merging buckets it into a grid cell
+    def generate_merge_key(self, vector):
+        if self.merge_epsilon is None:
+            # Formatted rather than rounded, so -0.0 and 0.0 stay apart like they always have
+            return "%f/%f/%f" % (vector.x, vector.y, vector.z)
+
+        return ( math.floor(vector.x / self.merge_epsilon), math.floor(vector.y / self.merge_epsilon), math.floor(vector.z / self.merge_epsilon) )
 
 
     def get_vertex_list(self):
@@ -220,9 +250,90 @@ class VertexList(object):
         return self.faces
 # End Class
 
+# Every piece is preceded by a Vector3 of 0.8f that we search for
+HERO_EIGHTS = (0.8, 0.8, 0.8)
+
+# Piece offset indexes are saved next to the model with this extension
+PIECE_INDEX_EXTENSION = '.pieceindex.json'
+
+# Find the first 4-byte aligned (relative to start) run of floats that are close to `values`
+# Return the offset of the run if found,
+# Return -1 if not.
+def find_float_pattern(f, start, values, rel_tol=FLOAT_COMPARE):
+    count = len(values)
+    pattern = struct.pack('<%df' % count, *values)
+
+    # An exact match is the common case and lets us bound the search window,
+    # an earlier near match (within rel_tol) still wins though.
+    end = len(f)
+    offset = f.find(pattern, start)
+    while offset != -1:
+        if (offset - start) % 4 == 0:
+            end = offset + len(pattern)
+            break
+        offset = f.find(pattern, offset + 1)
+    # End While
+
+    float_count = (end - start) // 4
+    if float_count < count:
+        return -1
+
+    # Random bytes are full of nans, which are fine to skip over quietly
+    with np.errstate(invalid='ignore', over='ignore'):
+        floats = np.frombuffer(f.view, dtype='<f4', count=float_count, offset=start).astype(np.float64)
+        targets = np.array(values, dtype=np.float64)
+
+        # Same test as math.isclose, which never matches inf/nan
+        matches = np.ones(float_count - count + 1, dtype=bool)
+        for i in range(count):
+            window = floats[i:float_count - count + 1 + i]
+            matches &= np.isfinite(window) & (np.abs(window - targets[i]) <= rel_tol * np.maximum(np.abs(window), abs(targets[i])))
+        # End For
+
+    hits = np.flatnonzero(matches)
+    if len(hits) == 0:
+        return -1
+
+    return start + int(hits[0]) * 4
+
+# Piece offsets are found by searching the file, which is slow on big models.
+# The index keeps them next to the file, along with the file's size and modified time so we know when it's stale.
+def load_piece_index(path):
+    try:
+        with open(path + PIECE_INDEX_EXTENSION, 'r') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return []
+
+    stat = os.stat(path)
+    if index.get('size') != stat.st_size or index.get('mtime') != stat.st_mtime_ns:
+        return []
+
+    return index.get('piece_offsets', [])
+
+def save_piece_index(path, piece_offsets):
+    stat = os.stat(path)
+    index = {
+        'size': stat.st_size,
+        'mtime': stat.st_mtime_ns,
+        'piece_offsets': piece_offsets,
+    }
+
+    try:
+        with open(path + PIECE_INDEX_EXTENSION, 'w') as f:
+            json.dump(index, f)
+    except OSError as e:
+        print("Could not save piece index: ", e)
+
 class PS2LTBModelReader(object):
-    def __init__(self):
+    # merge_epsilon: Optional tolerance used when merging duplicate vertices, see VertexList
+    # use_piece_index: Load/save the piece offsets in a file next to the model, see load_piece_index
+    # hash_wordlists: Extra wordlists used to resolve hashed animation/socket names, see HashLookUp
+    def __init__(self, merge_epsilon=None, use_piece_index=False, hash_wordlists=None):
         self._file_type = 0
+        self._merge_epsilon = merge_epsilon
+        self._use_piece_index = use_piece_index
+        self._hash_wordlists = hash_wordlists
         self._version = 0
         self._node_count = 0
         self._lod_count = 0
@@ -235,6 +346,14 @@ class PS2LTBModelReader(object):
 
         self._hasher = None
 
+    # Options that change what we read, the parse cache keys on these
+    def cache_options(self):
+        return (self._merge_epsilon, self._use_piece_index, tuple(self._hash_wordlists or []))
+
+    # Files other than the model that change what we read, the parse cache hashes these too
+    def input_files(self):
+        return list(self._hash_wordlists or [])
+
     # Leftovers from ABC Model Reader
     def _read_matrix(self, f):
         data = unpack('16f', f)
@@ -418,11 +537,11 @@ class PS2LTBModelReader(object):
         return weight_set
 
     # Rough WIP
-    def from_file(self, path):
+    def from_file(self, path, use_mmap=False):
         model = abc.Model()
-        model.name = os.path.splitext(os.path.basename(path))[0]
+        model.name = os.path.splitext(os.path.basename(source_path(path)))[0]
 
-        with open(path, 'rb') as f:
+        with BinaryReader.from_file(path, use_mmap) as f:
 
             # Header
             self._file_type = unpack('i', f)[0]
@@ -482,7 +601,16 @@ class PS2LTBModelReader(object):
             # End Piece Header
 
             # Setup our hasher
-            self._hasher = HashLookUp(hash_magic_number)
+            self._hasher = HashLookUp(hash_magic_number, self._hash_wordlists)
+
+            # Where each piece's data starts, see the 0.8 hack below
+            piece_offsets = []
+            cached_piece_offsets = []
+
+            # Only files on disk can have an index next to them
+            use_piece_index = self._use_piece_index and isinstance(path, str)
+            if use_piece_index:
+                cached_piece_offsets = load_piece_index(path)
 
 
             # We can have multiple pieces!
@@ -501,29 +629,27 @@ class PS2LTBModelReader(object):
                 # Skip past the unknown value
                 f.seek(4, 1)
 
-                exit_piece_early = False
+                # The index (if we have one) saves us from searching the file again
+                if piece_index < len(cached_piece_offsets):
+                    piece_start = cached_piece_offsets[piece_index]
+                else:
+                    print ("HACK: Looking for Vector3 of 0.8f")
+                    piece_start = find_float_pattern(f, f.tell(), HERO_EIGHTS)
 
-                print ("HACK: Looking for Vector3 of 0.8f")
-                while True:
-                    try:
-                        hero_eights = [ unpack('f', f)[0], unpack('f', f)[0], unpack('f', f)[0] ]
+                    if piece_start != -1:
+                        print("Found 0.8,0.8,0.8")
+                        # Revert back to our original position
+                        piece_start -= 4 * 2
+                    # End If
 
-                        if math.isclose(hero_eights[0], 0.8, rel_tol=FLOAT_COMPARE) and math.isclose(hero_eights[1], 0.8, rel_tol=FLOAT_COMPARE) and math.isclose(hero_eights[2], 0.8, rel_tol=FLOAT_COMPARE):
-                            print("Found 0.8,0.8,0.8")
-                            break
+                    piece_offsets.append(piece_start)
+                # End If
 
-                        # We only want to move up one!
-                        f.seek(-4*2, 1)
-                    except struct.error:
-                        exit_piece_early = True
-                        print("Could not find Vector3 of 0.8f, reached end of file.")
-                        break
-                        
-                if exit_piece_early is True:
+                if piece_start == -1:
+                    print("Could not find Vector3 of 0.8f, reached end of file.")
                     break
 
-                # Revert back to our original position
-                f.seek(-(4*5), 1) 
+                f.seek(piece_start)
                 # End Hack !
                 #########################################################################
 
@@ -550,7 +676,7 @@ class PS2LTBModelReader(object):
                 finished_lods = False
     
                 lod = abc.LOD()
-                vertex_list = VertexList()
+                vertex_list = VertexList(self._merge_epsilon)
                 mesh_set_index = 1 # this gets multiplied
                 mesh_index = 0 # triangle_count + vertex_count
 
@@ -909,6 +1035,9 @@ class PS2LTBModelReader(object):
                 print("Piece verticies ", len(lod.vertices))
                 print("Piece faces ", len(lod.faces))
 
+            if use_piece_index and len(piece_offsets) > 0:
+                save_piece_index(path, cached_piece_offsets + piece_offsets)
+
             # Handle Nodes!
             f.seek(node_offset)
 
@@ -4,199 +4,130 @@ https://github.com/Benjamin-Dobell/s3tc-dxt-decompression
 https://github.com/tito/libsquish/blob/master/alpha.cpp#L74
 """
 
-from .io import unpack
+import numpy as np
 
 DXT1 = 0
 DXT3 = 1
 DXT5 = 2
 
+# One record per 4x4 block
+DXT1_BLOCK_DTYPE = np.dtype([('color0', '<u2'), ('color1', '<u2'), ('code', '<u4')])
+DXT3_BLOCK_DTYPE = np.dtype([('alpha', '<u8'), ('color0', '<u2'), ('color1', '<u2'), ('code', '<u4')])
+DXT5_BLOCK_DTYPE = DXT3_BLOCK_DTYPE
 
-def pack_rgba(r, g, b, a):
-    return (int(r) << 24) | (int(g) << 16) | (int(b) << 8) | int(a)
+BLOCK_DTYPES = {
+    DXT1: DXT1_BLOCK_DTYPE,
+    DXT3: DXT3_BLOCK_DTYPE,
+    DXT5: DXT5_BLOCK_DTYPE,
+}
 
+# Bit offsets of each of the 16 pixels (row by row) in a block's index tables
+PIXEL_INDEX = np.arange(16, dtype=np.uint64)
 
-def unpack_rgba(c):
-    return c >> 24, (c >> 16) & 0xff, (c >> 8) & 0xff, c & 0xff
 
+def block_count(width, height):
+    return ((width + 3) // 4) * ((height + 3) // 4)
 
-def unpack_bgra(c):
-    return (c >> 8) & 0xff, (c >> 16) & 0xff, c >> 24, c & 0xff
 
+def data_size(dxt_type, width, height):
+    return block_count(width, height) * BLOCK_DTYPES[dxt_type].itemsize
+
+
+def expand_565(color):
+    # Same rounding as the reference decoder, the results are truncated when they're written out
+    temp = (color >> 11).astype(np.float64) * 255 + 16
+    r = (temp / 32 + temp) / 32
+    temp = ((color & 0x07E0) >> 5).astype(np.float64) * 255 + 32
+    g = (temp / 64 + temp) / 64
+    temp = (color & 0x001F).astype(np.float64) * 255 + 16
+    b = (temp / 32 + temp) / 32
+    return np.stack((r, g, b), axis=-1)
+
+
+# Returns a (block, 16, 3) array of colours
+def decompress_colors(blocks, allow_one_bit_alpha):
+    c0 = expand_565(blocks['color0'])
+    c1 = expand_565(blocks['color1'])
+
+    palette = np.empty((len(blocks), 4, 3), dtype=np.float64)
+    palette[:, 0] = c0
+    palette[:, 1] = c1
+    palette[:, 2] = (2 * c0 + c1) / 3
+    palette[:, 3] = (c0 + 2 * c1) / 3
+
+    # DXT1 has a 3 colour + black mode when color0 <= color1
+    if allow_one_bit_alpha:
+        three_colour = blocks['color0'] <= blocks['color1']
+        palette[three_colour, 2] = (c0[three_colour] + c1[three_colour]) / 2
+        palette[three_colour, 3] = 0
+
+    codes = (blocks['code'].astype(np.uint64)[:, None] >> (PIXEL_INDEX * 2)) & 0x03
+    return palette.astype(np.uint8)[np.arange(len(blocks))[:, None], codes]
+
+
+# Returns a (block, 16) array of alpha values
+def decompress_alpha_dxt3(blocks):
+    # all the alpha is thrown in upfront, quantized to 4 bits
+    alpha = (blocks['alpha'][:, None] >> (PIXEL_INDEX * 4)) & 0x0F
+    return (alpha | (alpha << 4)).astype(np.uint8)
+
+
+def decompress_alpha_dxt5(blocks):
+    alpha0 = (blocks['alpha'] & 0xFF).astype(np.float64)
+    alpha1 = ((blocks['alpha'] >> 8) & 0xFF).astype(np.float64)
+
+    # Build every block's 8 entry alpha table
+    table = np.empty((len(blocks), 8), dtype=np.float64)
+    table[:, 0] = alpha0
+    table[:, 1] = alpha1
+
+    eight_alpha = alpha0 > alpha1
+    for alpha_code in range(2, 8):
+        eight = ((8 - alpha_code) * alpha0 + (alpha_code - 1) * alpha1) / 7
+        if alpha_code == 6:
+            six = 0
+        elif alpha_code == 7:
+            six = 255
+        else:
+            six = ((6 - alpha_code) * alpha0 + (alpha_code - 1) * alpha1) / 5
+        table[:, alpha_code] = np.where(eight_alpha, eight, six)
+    # End For
+
+    # 3 bit codes packed into the 48 bits after the two alpha values
+    codes = ((blocks['alpha'] >> 16)[:, None] >> (PIXEL_INDEX * 3)) & 0x07
+    return table.astype(np.uint8)[np.arange(len(blocks))[:, None], codes]
+
+
+# Decodes a whole DXT1/3/5 surface
+# Returns a contiguous (height, width, 4) uint8 RGBA array
+def decompress_array(dxt_type, width, height, data):
+    if dxt_type not in BLOCK_DTYPES:
+        raise ValueError('Invalid type (must be DXT1, DXT3 or DXT5')
+
+    block_count_x = (width + 3) // 4
+    block_count_y = (height + 3) // 4
+    blocks = np.frombuffer(data, dtype=BLOCK_DTYPES[dxt_type], count=block_count_x * block_count_y)
+
+    image = np.empty((len(blocks), 16, 4), dtype=np.uint8)
+    image[:, :, 0:3] = decompress_colors(blocks, dxt_type == DXT1)
 
-def decompress(dxt_type, width, height, f):
     if dxt_type == DXT1:
-        block_function = decompress_block_dxt1
+        image[:, :, 3] = 255
     elif dxt_type == DXT3:
-        block_function = decompress_block_dxt3
-    elif dxt_type == DXT5:
-        block_function = decompress_block_dxt5
+        image[:, :, 3] = decompress_alpha_dxt3(blocks)
     else:
+        image[:, :, 3] = decompress_alpha_dxt5(blocks)
+
+    # (block y, block x, pixel y, pixel x) -> (y, x), then crop off any partial blocks
+    image = image.reshape(block_count_y, block_count_x, 4, 4, 4).transpose(0, 2, 1, 3, 4)
+    image = image.reshape(block_count_y * 4, block_count_x * 4, 4)
+    return np.ascontiguousarray(image[:height, :width])
+
+
+# Reads and decodes a surface from `f`
+# Returns a flat uint8 RGBA buffer (width * height * 4)
+def decompress(dxt_type, width, height, f):
+    if dxt_type not in BLOCK_DTYPES:
         raise ValueError('Invalid type (must be DXT1, DXT3 or DXT5')
-    block_count_x = int((width + 3) / 4)
-    block_count_y = int((height + 3) / 4)
-    image = [0] * (width * height * 4)
-    for j in range(block_count_y):
-        for i in range(block_count_x):
-            block_function(i * 4, j * 4, width, f, image)
-    return image
-
-
-def decompress_block_dxt1(x, y, width, f, image):
-    color1, color2 = unpack('<2H', f)
-
-    temp = (color1 >> 11) * 255 + 16
-    r0 = (temp / 32 + temp) / 32
-    temp = ((color1 & 0x07E0) >> 5) * 255 + 32
-    g0 = (temp / 64 + temp) / 64
-    temp = (color1 & 0x001F) * 255 + 16
-    b0 = (temp / 32 + temp) / 32
-
-    temp = (color2 >> 11) * 255 + 16
-    r1 = (temp / 32 + temp) / 32
-    temp = ((color2 & 0x07E0) >> 5) * 255 + 32
-    g1 = (temp / 64 + temp) / 64
-    temp = (color2 & 0x001F) * 255 + 16
-    b1 = (temp / 32 + temp) / 32
-
-    code = unpack('I', f)[0]
-
-    for j in range(4):
-        for i in range(4):
-            color = 0
-            position_code = (code >> 2 * (4 * j + i)) & 0x03
-
-            if color1 > color2:
-                if position_code == 0:
-                    color = pack_rgba(r0, g0, b0, 255)
-                elif position_code == 1:
-                    color = pack_rgba(r1, g1, b1, 255)
-                elif position_code == 2:
-                    color = pack_rgba((2 * r0 + r1) / 3, (2 * g0 + g1) / 3, (2 * b0 + b1) / 3, 255)
-                elif position_code == 3:
-                    color = pack_rgba((r0 + 2 * r1) / 3, (g0 + 2 * g1) / 3, (b0 + 2 * b1) / 3, 255)
-            else:
-                if position_code == 0:
-                    color = pack_rgba(r0, g0, b0, 255)
-                elif position_code == 1:
-                    color = pack_rgba(r1, g1, b1, 255)
-                elif position_code == 2:
-                    color = pack_rgba((r0 + r1) / 2, (g0 + g1) / 2, (b0 + b1) / 2, 255)
-                elif position_code == 3:
-                    color = pack_rgba(0, 0, 0, 255)
-
-            if x + i < width:
-                b = ((y + j) * width + (x + i)) * 4
-                image[b:b+4] = unpack_rgba(color)
-
-
-def dxt3_decompress_alpha(alpha):
-    for a in alpha:
-        lo = a & 0x0f
-        hi = a & 0xf0
-        yield lo | (lo << 4)
-        yield hi | (hi >> 4)
-
-
-def decompress_block_dxt3(x, y, width, f, image):
-    # all the alpha is thrown in upfront, quantized to 4 bits
-    alpha = list(dxt3_decompress_alpha(unpack('8B', f)))
-    color0, color1 = unpack('2H', f)
-
-    temp = (color0 >> 11) * 255 + 16
-    r0 = (temp / 32 + temp) / 32
-    temp = ((color0 & 0x07E0) >> 5) * 255 + 32
-    g0 = (temp / 64 + temp) / 64
-    temp = (color0 & 0x001F) * 255 + 16
-    b0 = (temp / 32 + temp) / 32
-
-    temp = (color1 >> 11) * 255 + 16
-    r1 = ((temp/32 + temp)/32)
-    temp = ((color1 & 0x07E0) >> 5) * 255 + 32
-    g1 = ((temp/64 + temp)/64)
-    temp = (color1 & 0x001F) * 255 + 16
-    b1 = ((temp/32 + temp)/32)
-
-    code = unpack('I', f)[0]
-
-    for j in range(4):
-        for i in range(4):
-            final_alpha = alpha[j * 4 + i]
-            color_code = (code >> 2 * (4 * j + i)) & 0x03
-
-            if color_code == 0:
-                final_color = pack_rgba(r0, g0, b0, final_alpha)
-            elif color_code == 1:
-                final_color = pack_rgba(r1, g1, b1, final_alpha)
-            elif color_code == 2:
-                final_color = pack_rgba((2 * r0 + r1) / 3, (2 * g0 + g1) / 3, (2 * b0 + b1) / 3, final_alpha)
-            else:
-                final_color = pack_rgba((r0 + 2 * r1) / 3, (g0 + 2 * g1) / 3, (b0 + 2 * b1) / 3, final_alpha)
-
-            if x + i < width:
-                b = ((y + j) * width + (x + i)) * 4
-                image[b:b+4] = unpack_rgba(final_color)
-
-
-def decompress_block_dxt5(x, y, width, f, image):
-    alpha0, alpha1 = unpack('2B', f)
-    bits = unpack('6B', f)
-    alpha_code_1 = bits[2] | (bits[3] << 8) | (bits[4] << 16) | (bits[5] << 24)
-    alpha_code_2 = bits[0] | (bits[1] << 8)
-    color0, color1 = unpack('2H', f)
-
-    temp = (color0 >> 11) * 255 + 16
-    r0 = (temp / 32 + temp) / 32
-    temp = ((color0 & 0x07E0) >> 5) * 255 + 32
-    g0 = (temp / 64 + temp) / 64
-    temp = (color0 & 0x001F) * 255 + 16
-    b0 = (temp / 32 + temp) / 32
-
-    temp = (color1 >> 11) * 255 + 16
-    r1 = ((temp/32 + temp)/32)
-    temp = ((color1 & 0x07E0) >> 5) * 255 + 32
-    g1 = ((temp/64 + temp)/64)
-    temp = (color1 & 0x001F) * 255 + 16
-    b1 = ((temp/32 + temp)/32)
-
-    code = unpack('I', f)[0]
-
-    for j in range(4):
-        for i in range(4):
-            alpha_code_index = 3 * (4 * j + i)
-
-            if alpha_code_index <= 12:
-                alpha_code = (alpha_code_2 >> alpha_code_index) & 0x07
-            elif alpha_code_index == 15:
-                alpha_code = (alpha_code_2 >> 15) | ((alpha_code_1 << 1) & 0x06)
-            else:
-                alpha_code = (alpha_code_1 >> (alpha_code_index - 16)) & 0x07
-
-            if alpha_code == 0:
-                final_alpha = alpha0
-            elif alpha_code == 1:
-                final_alpha = alpha1
-            else:
-                if alpha0 > alpha1:
-                    final_alpha = ((8 - alpha_code) * alpha0 + (alpha_code - 1) * alpha1) / 7
-                else:
-                    if alpha_code == 6:
-                        final_alpha = 0
-                    elif alpha_code == 7:
-                        final_alpha = 255
-                    else:
-                        final_alpha = ((6 - alpha_code) * alpha0 + (alpha_code - 1) * alpha1) / 5
-
-            color_code = (code >> 2 * (4 * j + i)) & 0x03
-
-            if color_code == 0:
-                final_color = pack_rgba(r0, g0, b0, final_alpha)
-            elif color_code == 1:
-                final_color = pack_rgba(r1, g1, b1, final_alpha)
-            elif color_code == 2:
-                final_color = pack_rgba((2 * r0 + r1) / 3, (2 * g0 + g1) / 3, (2 * b0 + b1) / 3, final_alpha)
-            else:
-                final_color = pack_rgba((r0 + 2 * r1) / 3, (g0 + 2 * g1) / 3, (b0 + 2 * b1) / 3, final_alpha)
-
-            if x + i < width:
-                k = ((y + j) * width + (x + i)) * 4
-                image[k:k+4] = unpack_rgba(final_color)
+    data = f.read(data_size(dxt_type, width, height))
+    return decompress_array(dxt_type, width, height, data).reshape(-1)
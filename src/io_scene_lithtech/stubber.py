@@ -0,0 +1,87 @@
+'''
+Fills in the parts of a model that the PS2 LTB files don't have, so it can be written out as an LTA.
+Used by the PS2 converter operator and cli.py, so it must not depend on bpy.
+'''
+from . import abc
+
+
+class ModelStubber(object):
+    def execute(self, model):
+
+        # Set the first node as removable
+        model.nodes[0].is_removable = True
+
+        # First node seems to be off...
+        model.nodes[0].bind_matrix = abc.Matrix()
+
+        model.nodes[0].bind_matrix[0][0] = -1.0
+        model.nodes[0].bind_matrix[0][1] = 0.0
+        model.nodes[0].bind_matrix[0][2] = 0.0
+        model.nodes[0].bind_matrix[0][3] = 0.0
+
+        model.nodes[0].bind_matrix[1][0] = 0.0
+        model.nodes[0].bind_matrix[1][1] = -1.0
+        model.nodes[0].bind_matrix[1][2] = 0.0
+        model.nodes[0].bind_matrix[1][3] = -1.543487
+
+        model.nodes[0].bind_matrix[2][0] = 0.0
+        model.nodes[0].bind_matrix[2][1] = 0.0
+        model.nodes[0].bind_matrix[2][2] = 1.0
+        model.nodes[0].bind_matrix[2][3] = 0.0
+
+        model.nodes[0].bind_matrix[3][0] = 0.0
+        model.nodes[0].bind_matrix[3][1] = 0.0
+        model.nodes[0].bind_matrix[3][2] = 0.0
+        model.nodes[0].bind_matrix[3][3] = 1.0
+
+        # Fix specular power, scale, and lod weight
+        for i in range(len(model.pieces)):
+            model.pieces[i].specular_power = 5.0
+            model.pieces[i].specular_scale = 1.0
+            model.pieces[i].lod_weight = 1.0
+
+        '''
+        This function will just create fake parts of the model
+        Because LithTech needs at least something in every section!
+        '''
+        animation = abc.Animation()
+        animation.name = 'ConvertedFromPS2'
+        animation.extents = abc.Vector((0, 0, 0))
+        animation.keyframes.append(abc.Animation.Keyframe())
+        for node_index, (node) in enumerate(model.nodes):
+            transforms = list()
+            for _ in animation.keyframes:
+                transform = abc.Animation.Keyframe.Transform()
+                transform.matrix = node.bind_matrix
+                transforms.append(transform)
+            animation.node_keyframe_transforms.append(transforms)
+        model.animations.append(animation)
+
+        ''' ChildModels '''
+        child_model = abc.ChildModel()
+
+        for _ in model.nodes:
+            # This number seems to have no basis on reality, so therefore it's now a teapot.
+            child_model.build_number = 418
+            child_model.transforms.append(abc.Animation.Keyframe.Transform())
+        model.child_models.append(child_model)
+
+        ''' AnimBindings '''
+        anim_binding = abc.AnimBinding()
+        anim_binding.name = 'ConvertedFromPS2'
+        anim_binding.origin = abc.Vector((0, 0, 0))
+        model.anim_bindings.append(anim_binding)
+
+        # Save me some time renaming stuff..
+        # PS2 doesn't have names for sockets
+        human_socket_list = ["RightHand", "Head", "Eyes", "Back", "Nose", "Chin", "LeftHand", "LeftFoot", "RightFoot", "Snowmobile", "Motorcycle"]
+
+        print( len(model.sockets) , len(human_socket_list))
+
+        if len(model.sockets) == len(human_socket_list):
+            for i in range( len(model.sockets) ):
+                model.sockets[i].name = human_socket_list[i]
+            
+        print(model.sockets[0])
+
+        return model
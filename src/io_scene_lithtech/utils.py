@@ -1,7 +1,13 @@
-import bpy
-import bmesh
 from enum import Enum
 
+# The enums are also used by the writers outside of Blender (see cli.py)
+try:
+    import bpy
+    import bmesh
+except ImportError:
+    bpy = None
+    bmesh = None
+
 # Blender default: 25fps = frame 0-24 for our purposes
 def get_framerate():
     return (bpy.context.window.scene.render.fps) / 1000
@@ -0,0 +1,20 @@
+'''
+Vector, Quaternion and Matrix for the readers and writers.
+Inside Blender (or anywhere the real mathutils module is installed) these are mathutils' own types,
+otherwise the pure python versions from mathutils_shim are used so models can be converted without Blender.
+'''
+
+
+# fake-bpy-module ships a mathutils made of stubs, so check it actually works rather than just importing it
+def _has_mathutils():
+    try:
+        import mathutils
+        return mathutils.Vector((1.0, 2.0, 3.0)).y == 2.0
+    except Exception:
+        return False
+
+
+if _has_mathutils():
+    from mathutils import Vector, Quaternion, Matrix
+else:
+    from .mathutils_shim import Vector, Quaternion, Matrix
@@ -1,5 +1,5 @@
 import struct
-from mathutils import Vector
+from .vector_math import Vector
 
 class ABCV6ModelWriter(object):
     @staticmethod
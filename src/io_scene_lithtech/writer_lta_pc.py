@@ -1,6 +1,16 @@
-from mathutils import Vector, Quaternion, Matrix
+import io
+import numpy as np
+from .vector_math import Vector, Quaternion, Matrix
 from .utils import LTAVersion
 
+# Tabs for each depth, so they're only built once
+_indents = []
+
+def _indent(depth):
+    while len(_indents) <= depth:
+        _indents.append("\t" * len(_indents))
+    return _indents[depth]
+
 #
 # LithTech Ascii Format
 # ---------------------
@@ -19,6 +29,7 @@ from .utils import LTAVersion
 # And finally, nodes can have child nodes. 
 # An example/ (lt-model-0 (on-load-cmds ( ... ) ). "lt-model-0" is our depth=0 node, and "on-load-cmds" is our depth=1 node, and a child node of "lt-model-0". 
 #
+
 class LTANode(object):
 
     def __init__(self, name='unnamed-node', attribute=None):
@@ -46,41 +57,47 @@ class LTANode(object):
 
         return node
 
-    # Loop through all the children and write out their props and depth
+    # Many properties with the same layout, like a vertex list. See LTAPropertyBlock.
+    def create_property_block(self, rows, layout, wrapped=False):
+        # An empty block would still count as a child, and change how this node is written
+        if len(rows) == 0:
+            return None
+
+        block = LTAPropertyBlock(rows, layout, wrapped)
+        block._depth = self._depth + 1
+        self._children.append(block)
+        return block
+
     def serialize(self):
-        output_string = ""
+        output = io.StringIO()
+        self.write(output)
+        return output.getvalue()
 
-        # Add our current depth in tabs
-        output_string += self._write_depth()
+    # Loop through all the children and write out their props and depth, straight to a file (or anything with write.)
+    def write(self, f):
+        indent = self._write_depth()
 
-        output_string += "(%s " % self._name
+        output_string = "%s(%s " % (indent, self._name)
 
         if self._attribute is not None:
             output_string += self._resolve_type(self._attribute)
 
         # If we have no children, let's early out
         if len(self._children) == 0:
-            output_string += ")\n"
-            return output_string
+            f.write(output_string + ")\n")
+            return
 
         # Ok add a new line for our children!
-        output_string += "\n"
+        f.write(output_string + "\n")
 
         for child in self._children:
-            output_string += child.serialize()
+            child.write(f)
 
         # Once again...add our current depth in tabs
-        output_string += self._write_depth()
-
-        output_string += ")\n"
-
-        return output_string
+        f.write(indent + ")\n")
 
     def _write_depth(self):
-        output_string = ""
-        for _ in range(self._depth):
-            output_string += "\t"
-        return output_string
+        return _indent(self._depth)
 
     # Some handy private functions
     def _resolve_type(self, value):
@@ -119,37 +136,69 @@ class LTANode(object):
         return "%.6f %.6f %.6f %.6f" % (value.x, value.y, value.z, value.w)
 
     def _serialize_matrix(self, value):
-        output_string = ""
-
-        for row in value:
-            output_string += "\n"
-            output_string += self._write_depth()
-            output_string += "("
-            for column in row:
-                output_string += " "
-                output_string += self._serialize_float(column)
-            # End For
-            output_string += " )"
-        # End For
+        indent = self._write_depth()
 
-        output_string += "\n"
-        output_string += self._write_depth()
-
-        return output_string
+        values = [column for row in value for column in row]
+        row_format = "\n" + indent + "(" + " %.6f" * (len(values) // len(value)) + " )"
 
+        return (row_format * len(value)) % tuple(values) + "\n" + indent
 
     def _serialize_list(self, value):
-        output_string = ""
+        # Big lists (face indices, keyframe times) are usually all ints or all floats, so do those in one go
+        if all(type(item) is int for item in value):
+            return " ".join(map(str, value))
 
-        for i, item in enumerate(value):
-            output_string += self._resolve_type(item)
+        if all(type(item) is float for item in value):
+            return " ".join(["%.6f"] * len(value)) % tuple(value)
 
-            # If we're not the last item, add a space
-            if i != len(value) - 1:
-                output_string += " "
-        # End For
+        return " ".join([self._resolve_type(item) for item in value])
+# End Class
+
+#
+# A run of properties that all have the same layout, written as if each were its own property node.
+# Vertex lists and keyframes have hundreds of thousands of these, so they're kept in one array and formatted in bulk.
+# --
+# Layout is the number of floats in each property of a row, so a vertex is (3,) and a posquat keyframe is (3, 4).
+# If wrapped, each row is in its own container, like posquat keyframes are.
+#
+class LTAPropertyBlock(object):
+    # Rows formatted per write call
+    ROWS_PER_CHUNK = 4096
+
+    def __init__(self, rows, layout, wrapped=False):
+        self._rows = np.asarray(rows, dtype=np.float64).reshape(len(rows), sum(layout))
+        self._layout = layout
+        self._wrapped = wrapped
+        self._depth = 0
+
+    def _row_format(self):
+        depth = self._depth
+        row_format = ""
+
+        if self._wrapped:
+            row_format += _indent(depth) + "( \n"
+            depth += 1
+
+        for count in self._layout:
+            row_format += _indent(depth) + "( " + " ".join(["%.6f"] * count) + ")\n"
+
+        if self._wrapped:
+            row_format += _indent(self._depth) + ")\n"
+
+        return row_format
+
+    def serialize(self):
+        output = io.StringIO()
+        self.write(output)
+        return output.getvalue()
+
+    def write(self, f):
+        row_format = self._row_format()
 
-        return output_string
+        for start in range(0, len(self._rows), self.ROWS_PER_CHUNK):
+            rows = self._rows[start:start + self.ROWS_PER_CHUNK]
+            f.write((row_format * len(rows)) % tuple(rows.ravel().tolist()))
+        # End For
 # End Class
 
 # Nodes are nested for as many children they have
@@ -352,22 +401,30 @@ class LTAModelWriter(object):
             face_index_list = []
             uv_index_list = []
 
+            # These get big, so they're written as property blocks rather than a node per vertex
+            texcoords = []
+            locations = []
+            normals = []
+
             for lod in piece.lods:
                 for face in lod.faces:
                     for face_vertex in face.vertices:
-                        texcoords = [ face_vertex.texcoord.x, face_vertex.texcoord.y ]
-                        uv_container.create_property( texcoords )
+                        texcoords.append( (face_vertex.texcoord.x, face_vertex.texcoord.y) )
 
                         face_index_list.append( face_vertex.vertex_index )
                     # End For    
                 # End For
 
                 for vertex in lod.vertices:
-                    vertex_container.create_property( vertex.location )
-                    normal_container.create_property( vertex.normal )
+                    locations.append( (vertex.location.x, vertex.location.y, vertex.location.z) )
+                    normals.append( (vertex.normal.x, vertex.normal.y, vertex.normal.z) )
                 # End For
             # End For
 
+            uv_container.create_property_block( texcoords, (2,) )
+            vertex_container.create_property_block( locations, (3,) )
+            normal_container.create_property_block( normals, (3,) )
+
 
             # Okay this doesn't seem like the best way to do it, but it works..
             # We need a list filled with 0..Length of Face Index List.
@@ -442,14 +499,15 @@ class LTAModelWriter(object):
                 posquat_container = posquat_node.create_container()
 
                 # Unlike every other property, each transform is it's own prop
+                # and each transform seems to have its own empty wrapper
+                keyframe_rows = []
                 for keyframe_transform in node_keyframe_transform_list:
-
-                    # Each transform seems to have its own empty wrapper
-                    keyframe_container = posquat_container.create_container()
-
-                    keyframe_container.create_property( keyframe_transform.location )
-                    keyframe_container.create_property( keyframe_transform.rotation )
+                    location = keyframe_transform.location
+                    rotation = keyframe_transform.rotation
+                    keyframe_rows.append( (location.x, location.y, location.z, rotation.x, rotation.y, rotation.z, rotation.w) )
                 # End For
+
+                posquat_container.create_property_block( keyframe_rows, (3, 4), wrapped=True )
             # End For
         # End For
 
@@ -458,10 +516,10 @@ class LTAModelWriter(object):
         # WRITE TO FILE
         ##########################################################
         
-        with open(path, 'w') as f:
+        # Written straight to the file, LTA files can run to hundreds of MB
+        with open(path, 'w', buffering=1024 * 1024) as f:
             print("Serializing node list...")
-            s_root_node = root_node.serialize()
-            f.write(s_root_node)
+            root_node.write(f)
             print("Finished serializing node list!")
         # End With
     # End Def
@@ -0,0 +1,109 @@
+import random
+
+import pytest
+
+from io_scene_lithtech import abc
+from io_scene_lithtech.reader_ltb_ps2 import VertexList
+from io_scene_lithtech.vector_math import Vector
+
+
+def generate_faces_reference(vertex_list):
+    '''
+    The original per-vertex strip expansion from VertexList.generate_faces, kept to check the STRIP_OFFSETS version against.
+    The original iterated list(set(groups)), which for small group ids is ascending order.
+    '''
+    faces = []
+
+    for group_id in sorted(vertex_list.groups):
+        flip = False
+        grouped_faces = []
+
+        for i in range( len(vertex_list.face_verts) ):
+            face_vert = vertex_list.face_verts[i]
+
+            if face_vert.group_id != group_id:
+                continue
+
+            grouped_faces.append(face_vert)
+        # End Face Verts
+
+        for i in range( len(grouped_faces) ):
+            if i < 2:
+                continue
+
+            face = abc.Face()
+
+            if grouped_faces[i].face_vertex.reversed:
+                if flip:
+                    face.vertices = [ grouped_faces[i - 1].face_vertex, grouped_faces[i].face_vertex, grouped_faces[i - 2].face_vertex ]
+                else:
+                    face.vertices = [ grouped_faces[i - 2].face_vertex, grouped_faces[i].face_vertex, grouped_faces[i - 1].face_vertex ]
+            else:
+                if flip:
+                    face.vertices = [ grouped_faces[i].face_vertex, grouped_faces[i - 1].face_vertex, grouped_faces[i - 2].face_vertex ]
+                else:
+                    face.vertices = [ grouped_faces[i].face_vertex, grouped_faces[i - 2].face_vertex, grouped_faces[i - 1].face_vertex ]
+
+            faces.append(face)
+            flip = not flip
+        # End Grouped Faces
+    # End Groups
+
+    return faces
+
+
+def make_vertex_list(strip):
+    '''
+    strip is a list of (group_id, reversed) for each face vertex, in the order they're read.
+    '''
+    vertex_list = VertexList()
+    for i, (group_id, is_reversed) in enumerate(strip):
+        vertex = abc.Vertex()
+        vertex.location = Vector((float(i), 0.0, 0.0))
+
+        face_vertex = abc.FaceVertex()
+        face_vertex.reversed = is_reversed
+
+        vertex_list.append(vertex, group_id, face_vertex)
+    # End For
+    return vertex_list
+
+
+def face_vertex_ids(faces):
+    return [[id(face_vertex) for face_vertex in face.vertices] for face in faces]
+
+
+def assert_matches_reference(strip):
+    vertex_list = make_vertex_list(strip)
+    expected = face_vertex_ids(generate_faces_reference(vertex_list))
+
+    vertex_list.generate_faces()
+
+    assert face_vertex_ids(vertex_list.get_face_list()) == expected
+    return vertex_list
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_mixed_groups_and_winding(seed):
+    rng = random.Random(seed)
+    strip = [(rng.randrange(6), rng.random() < 0.3) for _ in range(rng.randrange(0, 400))]
+    assert_matches_reference(strip)
+
+
+@pytest.mark.parametrize('is_reversed', [False, True])
+def test_single_group(is_reversed):
+    vertex_list = assert_matches_reference([(0, is_reversed)] * 10)
+    assert len(vertex_list.faces) == 8
+
+
+def test_short_strips():
+    # Groups 1 and 2 are too short to make a face, group 0 makes two
+    strip = [(0, False), (1, False), (0, True), (2, False), (0, False), (2, True), (0, True)]
+    vertex_list = assert_matches_reference(strip)
+    assert len(vertex_list.faces) == 2
+
+
+@pytest.mark.parametrize('count', [0, 1, 2, 3])
+def test_tiny_strips(count):
+    vertex_list = assert_matches_reference([(0, False)] * count)
+    assert len(vertex_list.faces) == max(count - 2, 0)